@@ -0,0 +1,34 @@
+"""Change log value patches and filter indexes
+
+Revision ID: a6d2e8f4b915
+Revises: f3a9d6b0c812
+Create Date: 2026-10-19 14:05:22.407316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6d2e8f4b915'
+down_revision: Union[str, Sequence[str], None] = 'f3a9d6b0c812'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('change_logs', sa.Column('value_patch', sa.Text(), nullable=True))
+    op.create_index('ix_change_logs_import_log_id_id', 'change_logs', ['import_log_id', 'id'], unique=False)
+    op.create_index('ix_change_logs_record_id_id', 'change_logs', ['record_id', 'id'], unique=False)
+    op.create_index('ix_change_logs_field_changed_import_log_id', 'change_logs', ['field_changed', 'import_log_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_change_logs_field_changed_import_log_id', table_name='change_logs')
+    op.drop_index('ix_change_logs_record_id_id', table_name='change_logs')
+    op.drop_index('ix_change_logs_import_log_id_id', table_name='change_logs')
+    op.drop_column('change_logs', 'value_patch')
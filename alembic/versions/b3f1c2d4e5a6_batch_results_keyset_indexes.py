@@ -0,0 +1,67 @@
+"""Batch results keyset indexes and per-status counters
+
+Revision ID: b3f1c2d4e5a6
+Revises: 7a8e1658bcf4
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3f1c2d4e5a6'
+down_revision: Union[str, Sequence[str], None] = '7a8e1658bcf4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+STATUS_COUNTERS = {
+    'pending_count': 'PENDING',
+    'true_match_count': 'TRUE_MATCH',
+    'false_positive_count': 'FALSE_POSITIVE',
+    'no_match_count': 'NO_MATCH',
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for column in STATUS_COUNTERS:
+        op.add_column('screening_batches', sa.Column(column, sa.Integer(), nullable=True, server_default='0'))
+
+    op.create_index('ix_screening_results_batch_id_id', 'screening_results', ['batch_id', 'id'], unique=False)
+    op.create_index('ix_screening_results_batch_id_status_id', 'screening_results', ['batch_id', 'match_status', 'id'], unique=False)
+    op.create_index(op.f('ix_screening_matches_screening_result_id'), 'screening_matches', ['screening_result_id'], unique=False)
+
+    # Backfill counters for batches screened before this revision
+    for column, status in STATUS_COUNTERS.items():
+        op.execute(
+            f"UPDATE screening_batches SET {column} = ("
+            f"SELECT COUNT(*) FROM screening_results r "
+            f"WHERE r.batch_id = screening_batches.id AND r.match_status = '{status}')"
+        )
+
+    # Trigram index so ILIKE '%term%' on input_name does not scan the batch
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index(
+            'ix_screening_results_input_name_trgm',
+            'screening_results',
+            ['input_name'],
+            unique=False,
+            postgresql_using='gin',
+            postgresql_ops={'input_name': 'gin_trgm_ops'},
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_screening_results_input_name_trgm', table_name='screening_results')
+    op.drop_index(op.f('ix_screening_matches_screening_result_id'), table_name='screening_matches')
+    op.drop_index('ix_screening_results_batch_id_status_id', table_name='screening_results')
+    op.drop_index('ix_screening_results_batch_id_id', table_name='screening_results')
+    for column in reversed(list(STATUS_COUNTERS)):
+        op.drop_column('screening_batches', column)
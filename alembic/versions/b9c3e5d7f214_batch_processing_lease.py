@@ -0,0 +1,28 @@
+"""Batch processing lease heartbeat
+
+Revision ID: b9c3e5d7f214
+Revises: e2b7c5a9f046
+Create Date: 2026-10-19 14:20:37.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9c3e5d7f214'
+down_revision: Union[str, Sequence[str], None] = 'e2b7c5a9f046'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('screening_batches', sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('screening_batches', 'heartbeat_at')
@@ -0,0 +1,41 @@
+"""Batch checkpoint, stored upload and result idempotency key
+
+Revision ID: c41d7e9a2b10
+Revises: b3f1c2d4e5a6
+Create Date: 2026-10-19 10:02:11.540387
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7e9a2b10'
+down_revision: Union[str, Sequence[str], None] = 'b3f1c2d4e5a6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('screening_batches', sa.Column('checkpoint_offset', sa.Integer(), nullable=True, server_default='0'))
+    op.add_column('screening_results', sa.Column('row_index', sa.Integer(), nullable=True))
+    op.create_index('uq_screening_results_batch_id_row_index', 'screening_results', ['batch_id', 'row_index'], unique=True)
+    op.create_table('screening_batch_files',
+    sa.Column('batch_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(), nullable=True),
+    sa.Column('content', sa.LargeBinary(), nullable=True),
+    sa.Column('stored_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['batch_id'], ['screening_batches.id'], ),
+    sa.PrimaryKeyConstraint('batch_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('screening_batch_files')
+    op.drop_index('uq_screening_results_batch_id_row_index', table_name='screening_results')
+    op.drop_column('screening_results', 'row_index')
+    op.drop_column('screening_batches', 'checkpoint_offset')
@@ -0,0 +1,31 @@
+"""Cross-list cluster id on sanctions
+
+Revision ID: c8e4f1a7d203
+Revises: a6d2e8f4b915
+Create Date: 2026-10-19 15:31:47.902614
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e4f1a7d203'
+down_revision: Union[str, Sequence[str], None] = 'a6d2e8f4b915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Filled in by the next import (SanctionLoader._update_clusters)
+    op.add_column('sanctions', sa.Column('cluster_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_sanctions_cluster_id'), 'sanctions', ['cluster_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sanctions_cluster_id'), table_name='sanctions')
+    op.drop_column('sanctions', 'cluster_id')
@@ -0,0 +1,32 @@
+"""Per-source download/parse/load timings on import_logs
+
+Revision ID: d5e8a3f1c920
+Revises: c41d7e9a2b10
+Create Date: 2026-10-19 11:20:47.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e8a3f1c920'
+down_revision: Union[str, Sequence[str], None] = 'c41d7e9a2b10'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('import_logs', sa.Column('download_seconds', sa.Float(), nullable=True))
+    op.add_column('import_logs', sa.Column('parse_seconds', sa.Float(), nullable=True))
+    op.add_column('import_logs', sa.Column('load_seconds', sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('import_logs', 'load_seconds')
+    op.drop_column('import_logs', 'parse_seconds')
+    op.drop_column('import_logs', 'download_seconds')
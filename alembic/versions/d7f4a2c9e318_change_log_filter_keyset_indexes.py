@@ -0,0 +1,32 @@
+"""Change log field and change type keyset indexes
+
+Revision ID: d7f4a2c9e318
+Revises: b9c3e5d7f214
+Create Date: 2026-10-19 15:02:48.530914
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7f4a2c9e318'
+down_revision: Union[str, Sequence[str], None] = 'b9c3e5d7f214'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.drop_index('ix_change_logs_field_changed_import_log_id', table_name='change_logs')
+    op.create_index('ix_change_logs_field_changed_id', 'change_logs', ['field_changed', 'id'], unique=False)
+    op.create_index('ix_change_logs_change_type_id', 'change_logs', ['change_type', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_change_logs_change_type_id', table_name='change_logs')
+    op.drop_index('ix_change_logs_field_changed_id', table_name='change_logs')
+    op.create_index('ix_change_logs_field_changed_import_log_id', 'change_logs', ['field_changed', 'import_log_id'], unique=False)
@@ -0,0 +1,28 @@
+"""Per-stage timings and counters on import_logs
+
+Revision ID: e2b7c5a9f046
+Revises: c8e4f1a7d203
+Create Date: 2026-10-19 16:44:10.225871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7c5a9f046'
+down_revision: Union[str, Sequence[str], None] = 'c8e4f1a7d203'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('import_logs', sa.Column('stage_stats', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('import_logs', 'stage_stats')
@@ -0,0 +1,29 @@
+"""Content hash on sanctions for change detection
+
+Revision ID: f3a9d6b0c812
+Revises: e7b2c9d4a1f3
+Create Date: 2026-10-19 12:48:09.651320
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d6b0c812'
+down_revision: Union[str, Sequence[str], None] = 'e7b2c9d4a1f3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Left NULL: the next import diffs those rows field by field and fills it in
+    op.add_column('sanctions', sa.Column('content_hash', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('sanctions', 'content_hash')
@@ -1,8 +1,22 @@
 import json
 
+from src.etl.record_cache import RecordCache, latest_cache
+
+COLUMNS = ['id', 'unique_sanction_id', 'entity_type', 'main_name']
+
+
+def load_parsed(source):
+    # Record cache written by tools/parse_all.py (only the needed columns are decoded), else JSONL
+    cache_file = latest_cache('data/parsed', source, 'firestore')
+    if cache_file:
+        with RecordCache(cache_file) as cache:
+            return list(cache.records(COLUMNS))
+    return [json.loads(line) for line in open(f'data/parsed/{source}.jsonl')]
+
+
 # Check one of the overlapping entities
-sdn_data = [json.loads(line) for line in open('data/parsed/US_SDN_SIMPLE.jsonl')]
-nonsdn_data = [json.loads(line) for line in open('data/parsed/US_NON_SDN_SIMPLE.jsonl')]
+sdn_data = load_parsed('US_SDN_SIMPLE')
+nonsdn_data = load_parsed('US_NON_SDN_SIMPLE')
 
 # Find 'STAUT COMPANY LIMITED'
 sdn_staut = [r for r in sdn_data if 'STAUT' in r.get('main_name', '')]
@@ -59,16 +59,18 @@ export interface PaginatedBatchDetailResponse {
   batch: BatchResponse;
   results: ScreeningResultResponse[];
   total: number;
+  next_cursor?: number | null;
 }
 
 // Fetch paginated and filtered batch results
 export async function fetchBatchDetailPaginated(
   batchId: string,
-  params: { limit?: number; offset?: number; status?: string; search?: string }
+  params: { limit?: number; offset?: number; cursor?: number | null; status?: string; search?: string }
 ): Promise<PaginatedBatchDetailResponse> {
   const query = new URLSearchParams();
   if (params.limit) query.append("limit", params.limit.toString());
-  if (params.offset) query.append("offset", params.offset.toString());
+  if (params.cursor != null) query.append("cursor", params.cursor.toString());
+  else if (params.offset) query.append("offset", params.offset.toString());
   if (params.status) query.append("status", params.status);
   if (params.search) query.append("search", params.search);
   const res = await fetch(apiUrl(`/api/v1/batch/${batchId}?${query.toString()}`));
@@ -1,15 +1,24 @@
 import functions_framework
 import json
-from google.cloud import firestore
+import math
+import os
 from datetime import datetime
 from flask import jsonify
 import re
 import io
 import csv
-from openpyxl import load_workbook
-from matching import match_name
+import numpy as np
+from rapidfuzz import fuzz, process
+from firestore_clients import cloud_db
+from matching import get_matcher
+from search_index import get_index, postings_index, query_words
 
-db = firestore.Client()
+# Matches returned per screened name
+MAX_MATCHES = 5
+# Memory budget for one prefilter score matrix (names x index names, uint8)
+PREFILTER_MEMORY_MB = int(os.getenv('BATCH_SCREENING_MEMORY_MB', '128'))
+# rapidfuzz cdist threads; -1 uses all cores
+PREFILTER_WORKERS = int(os.getenv('BATCH_SCREENING_WORKERS', '-1'))
 
 @functions_framework.http
 def batch_screening(request):
@@ -80,11 +89,25 @@ def batch_screening(request):
                 'status': 'invalid_request'
             }), 400
         
-        # Screen each name against sanctions database
+        # Screen each name against the whole corpus, held in memory by the
+        # instance (search_index.py) instead of read from Firestore per name;
+        # a vectorized prefilter (_candidates) picks the records each name is
+        # scored against. Without a published snapshot each name is screened
+        # against the records the token postings rank best for it.
+        index = get_index(cloud_db())
+        matcher = get_matcher()
+        queries = [matcher.query_features(name.lower().strip(), entity_type) for name in names]
+        if index is not None:
+            candidates = _candidates(queries, threshold, index, index.candidates(entity_type=entity_type))
         results = []
         for idx, name in enumerate(names):
             try:
-                matches = _screen_name(name, entity_type, threshold)
+                if index is None:
+                    name_index = postings_index(cloud_db(), query_words(name))
+                    matches = _screen_name(queries[idx], threshold, name_index,
+                                           name_index.candidates(entity_type=entity_type))
+                else:
+                    matches = _screen_name(queries[idx], threshold, index, candidates[idx])
                 results.append({
                     'name': name,
                     'status': 'POTENTIAL_MATCH' if matches else 'CLEAR',
@@ -154,6 +177,7 @@ def _parse_file(file):
         
         elif filename.endswith(('.xlsx', '.xls')):
             # Parse Excel
+            from openpyxl import load_workbook  # only Excel uploads need it
             workbook = load_workbook(file, read_only=True)
             sheet = workbook.active
             for row in sheet.iter_rows(values_only=True):
@@ -185,27 +209,119 @@ def _parse_file(file):
     return unique_names
 
 
-def _screen_name(name, entity_type, threshold):
-    """Screen a single name against sanctions database"""
+def required_ratios(shorter, longer, alias, threshold):
+    """
+    The lowest fuzz.ratio (Indel similarity, 0-100) with which a clean
+    query name and a record name of these lengths (numpy arrays; `alias`
+    marks the record's aliases) can score `threshold` with
+    NameMatcher.score_features, 101 where they cannot. Above 75 a score
+    comes from an exact, Levenshtein or substring match:
+
+    - a Levenshtein ratio of r (x 0.95 for an alias) needs shorter/longer
+      >= r and allows d = (1 - r) * longer edits, longer - shorter of them
+      insertions, so an Indel distance of at most 2d - (longer - shorter)
+    - a substring (70, or 65 for an alias, + coverage / 5) has an Indel
+      distance of exactly longer - shorter
+    """
+    t = threshold - 0.005  # scores are rounded to 2 decimals
+    total = np.maximum(shorter + longer, 1)
+    coverage = np.where(longer > 0, shorter / np.maximum(longer, 1), 1.0)
+    ratio = np.where(alias, t / 95, t / 100)
+    edits = np.floor((1 - ratio) * longer + 1e-9)
+    by_levenshtein = np.where(coverage >= ratio, 100 * (1 - (2 * edits - (longer - shorter)) / total), 101)
+    by_substring = np.where(coverage >= np.where(alias, (t - 65) / 20, (t - 70) / 20),
+                            100 * 2 * shorter / total, 101)
+    return np.minimum(by_levenshtein, by_substring)
+
+
+def prefilter_cutoff(threshold):
+    """
+    The lowest required_ratios() over all lengths (a main name's Levenshtein
+    ratio, or its substring at the least coverage), less one for the uint8
+    rounding; None for thresholds of 75 and below, which the phonetic and
+    token scores reach whatever the spelling.
+    """
+    if threshold <= 75:
+        return None
+    t = threshold - 0.005
+    coverage = min((t - 70) / 20, 1.0)
+    return max(0, math.floor(min(t, 100 * 2 * coverage / (1 + coverage))) - 1)
+
+
+def _candidates(queries, threshold, index, positions):
+    """
+    For each query (NameMatcher.query_features), the index positions among
+    `positions` it can match at `threshold`, in corpus order: one
+    rapidfuzz process.cdist of the queries' clean names against the clean
+    names and aliases of those records (a uint8 matrix per chunk of queries,
+    within PREFILTER_MEMORY_MB) cut at prefilter_cutoff(), then each
+    remaining pair at the required_ratios() of its lengths, plus the records
+    with an alias equal to the query's normalized name. Only these are then
+    scored exactly.
+    """
+    cutoff = prefilter_cutoff(threshold)
+    if cutoff is None:
+        return [positions] * len(queries)
+
+    features = index.features
+    choices, owners, is_alias, by_alias = [], [], [], {}
+    for i in positions:
+        _, clean, aliases, _, _ = features[i]
+        choices.append(clean)
+        owners.append(i)
+        is_alias.append(False)
+        for alias in aliases:
+            choices.append(alias)
+            owners.append(i)
+            is_alias.append(True)
+            by_alias.setdefault(alias, []).append(i)
+    if not choices:
+        return [[] for _ in queries]
+    owners = np.asarray(owners)
+    is_alias = np.asarray(is_alias)
+    choice_lengths = np.fromiter((len(choice) for choice in choices), dtype=np.int64, count=len(choices))
+
+    found = []
+    chunk_size = max(1, PREFILTER_MEMORY_MB * 1024 * 1024 // len(choices))
+    for start in range(0, len(queries), chunk_size):
+        chunk = queries[start:start + chunk_size]
+        # Zero wherever the ratio is below the cutoff
+        matrix = process.cdist([query[1] for query in chunk], choices, scorer=fuzz.ratio,
+                               score_cutoff=cutoff, dtype=np.uint8, workers=PREFILTER_WORKERS)
+        rows, cols = np.nonzero(matrix >= cutoff)
+        scores = matrix[rows, cols]
+        del matrix
+        query_lengths = np.fromiter((len(query[1]) for query in chunk), dtype=np.int64, count=len(chunk))[rows]
+        required = required_ratios(np.minimum(query_lengths, choice_lengths[cols]),
+                                   np.maximum(query_lengths, choice_lengths[cols]), is_alias[cols], threshold)
+        keep = scores >= np.floor(required) - 1
+        hits = [set() for _ in chunk]
+        for row, position in zip(rows[keep].tolist(), owners[cols[keep]].tolist()):
+            hits[row].add(position)
+        for j, query in enumerate(chunk):
+            hits[j].update(by_alias.get(query[0], ()))
+            found.append(sorted(hits[j]))
+    return found
+
+
+def _screen_name(query, threshold, index, positions):
+    """
+    Screen one name (its NameMatcher.query_features) against the index
+    records at `positions`, scoring it against each record's stored
+    features; Levenshtein work is bounded by the threshold
+    (NameMatcher.score_features at_least), which leaves every score >=
+    threshold unchanged.
+    """
     matches = []
-    
-    # Normalize name for matching
-    name_normalized = name.lower().strip()
-    
-    # Query Firestore with limit to prevent timeouts
-    # Limit to 5000 documents per entity type for performance
-    query = db.collection('sanctions_entities')
-    query = query.where('entity_type', '==', entity_type)
-    query = query.limit(5000)
-    
-    docs = query.stream()
+    matcher = get_matcher()
+    features = index.features
     
     # Check each sanctions record
-    for doc in docs:
-        data = doc.to_dict()
-        score = _calculate_fuzzy_score(name_normalized, data, entity_type)
+    for i in positions:
+        score = matcher.score_features(query, features[i], use_phonetic=True, at_least=threshold)
         
         if score >= threshold:
+            data = index.records[i]
             matches.append({
                 'id': data.get('id'),
                 'source': data.get('sanction_source'),
@@ -221,18 +337,5 @@ def _screen_name(name, entity_type, threshold):
     matches.sort(key=lambda x: x['confidence'], reverse=True)
     
     # Return top 5 matches
-    return matches[:5]
-
-
-def _calculate_fuzzy_score(query_name, record, entity_type):
-    """
-    Calculate fuzzy match score (0-100) using advanced matching algorithm.
-    
-    Uses multiple techniques:
-    - Exact matching
-    - Levenshtein distance (edit distance)
-    - Phonetic matching (Soundex/Metaphone)
-    - Token-based matching
-    """
-    return match_name(query_name, record, entity_type=entity_type, use_phonetic=True)
+    return matches[:MAX_MATCHES]
 
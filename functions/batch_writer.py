@@ -0,0 +1,164 @@
+"""
+Batched, parallel Firestore writes for the importers.
+
+BatchWriter collects set/delete operations into write batches of up to 500
+(Firestore's limit per batch) and commits full batches on a small thread
+pool, so the caller keeps preparing the next batch while earlier ones are
+in flight. A batch that fails with a transient error (contention, deadline,
+quota, unavailable) is retried with exponential backoff and jitter;
+retrying is safe because every operation is a whole-document set or a
+delete. At most `workers * 2` batches are queued at once, which bounds
+memory.
+
+    with BatchWriter(db, timer=timer) as writer:
+        for record in records:
+            writer.set(coll.document(record['id']), record)
+    print(writer.stats())  # writes, batches, retries, seconds, writes_per_second
+
+Firestore's BulkWriter is not used: it throttles to 500 operations per
+second, ramping up only every 5 minutes, which caps a one-off import well
+below what concurrent batches reach.
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+try:
+    from google.api_core import exceptions as api_exceptions
+    RETRYABLE_ERRORS = (
+        api_exceptions.Aborted,
+        api_exceptions.DeadlineExceeded,
+        api_exceptions.InternalServerError,
+        api_exceptions.ResourceExhausted,
+        api_exceptions.ServiceUnavailable,
+    )
+except ImportError:  # google-cloud-firestore brings google-api-core; only missing outside the runtime
+    RETRYABLE_ERRORS = ()
+
+# Operations per batch (Firestore maximum)
+MAX_BATCH_SIZE = 500
+# Concurrent batch commits
+WRITE_WORKERS = int(os.getenv('IMPORT_WRITE_WORKERS', '8'))
+MAX_ATTEMPTS = int(os.getenv('IMPORT_WRITE_ATTEMPTS', '5'))
+BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 16.0
+
+
+class BatchWriter:
+    def __init__(self, db, batch_size=MAX_BATCH_SIZE, workers=WRITE_WORKERS, max_attempts=MAX_ATTEMPTS,
+                 timer=None, stage='db_write'):
+        self.db = db
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self.max_attempts = max_attempts
+        self.timer = timer
+        self.stage = stage
+        self.writes = 0
+        self.batches = 0
+        self.retries = 0
+        self._ops = []
+        self._pending = set()
+        self._max_pending = max(1, workers) * 2
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='firestore-write')
+        self._started = time.perf_counter()
+        self._finished = None
+
+    def set(self, ref, data):
+        self._add(('set', ref, data))
+
+    def delete(self, ref):
+        self._add(('delete', ref, None))
+
+    def _add(self, op):
+        self._ops.append(op)
+        if len(self._ops) >= self.batch_size:
+            self._submit()
+
+    def _submit(self):
+        ops, self._ops = self._ops, []
+        if not ops:
+            return
+        if len(self._pending) >= self._max_pending:
+            self._wait(FIRST_COMPLETED)
+        self._pending.add(self._pool.submit(self._commit, ops))
+
+    def _commit(self, ops):
+        for attempt in range(1, self.max_attempts + 1):
+            batch = self.db.batch()
+            for kind, ref, data in ops:
+                if kind == 'set':
+                    batch.set(ref, data)
+                else:
+                    batch.delete(ref)
+            try:
+                batch.commit()
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_attempts:
+                    raise
+                delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** (attempt - 1))
+                delay *= random.uniform(0.5, 1.0)
+                print(f"[{datetime.now()}] [WARN] Write batch of {len(ops)} failed ({type(e).__name__}: {e}); "
+                      f"retry {attempt}/{self.max_attempts - 1} in {delay:.1f}s")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(delay)
+                continue
+            with self._lock:
+                self.writes += len(ops)
+                self.batches += 1
+            return len(ops)
+
+    def _wait(self, return_when):
+        """Waits for in-flight batches; the first failure is raised here (time counts as the write stage)."""
+        if not self._pending:
+            return
+        if self.timer is not None:
+            with self.timer.stage(self.stage):
+                done, self._pending = wait(self._pending, return_when=return_when)
+        else:
+            done, self._pending = wait(self._pending, return_when=return_when)
+        for future in done:
+            future.result()
+
+    def flush(self):
+        """Commits the partial batch and waits for everything in flight."""
+        self._submit()
+        self._wait(ALL_COMPLETED)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self._pool.shutdown(wait=True)
+            self._finished = time.perf_counter()
+            if self.timer is not None:
+                self.timer.count('writes', self.writes)
+                self.timer.count('write_batches', self.batches)
+                if self.retries:
+                    self.timer.count('write_retries', self.retries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # Do not start the queued-up partial batch; let in-flight ones end
+            self._ops = []
+            self._pool.shutdown(wait=True)
+            self._finished = time.perf_counter()
+        return False
+
+    def stats(self):
+        seconds = (self._finished or time.perf_counter()) - self._started
+        return {
+            'writes': self.writes,
+            'batches': self.batches,
+            'retries': self.retries,
+            'seconds': round(seconds, 3),
+            'writes_per_second': round(self.writes / seconds, 1) if seconds > 0 else None,
+        }
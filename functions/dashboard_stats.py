@@ -0,0 +1,140 @@
+"""
+Pre-aggregated statistics for the admin dashboard.
+
+The importer keeps one document, dashboard_stats/current, up to date as it
+saves import sessions (record_session): current record count per source,
+the latest committed session and a summary of the last HISTORY_SIZE
+sessions. admin_dashboard_api serves it through get_dashboard_stats(),
+which keeps it in the instance for DASHBOARD_CACHE_SECONDS, so a dashboard
+refresh costs at most one document read (none within the TTL, and the
+response is a 304 when the client's ETag still matches).
+
+Without the document (before the first import that writes it) it is built
+once from the import_sessions collection and stored.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+STATS_COLLECTION = 'dashboard_stats'
+STATS_DOCUMENT = 'current'
+SESSIONS_COLLECTION = 'import_sessions'
+SOURCES = ['EU', 'UK', 'US_SDN_SIMPLE', 'US_NON_SDN_SIMPLE']
+HISTORY_SIZE = 10
+DASHBOARD_CACHE_SECONDS = int(os.getenv('DASHBOARD_CACHE_SECONDS', '30'))
+
+_cache = {'stats': None, 'loaded_at': 0.0}
+_lock = threading.Lock()
+
+
+def session_summary(session_data):
+    return {
+        'id': session_data.get('import_session_id'),
+        'timestamp': session_data.get('timestamp_end'),
+        'duration': session_data.get('duration_seconds'),
+        'status': session_data.get('status'),
+        'total_changes': session_data.get('total_changes', 0),
+        'statistics': session_data.get('statistics', {}),
+        'stage_timings': session_data.get('stage_timings', {}),
+    }
+
+
+def empty_stats():
+    return {
+        'source_counts': {source: 0 for source in SOURCES},
+        'latest_import': None,
+        'import_history': [],
+        'version': 0,
+        'updated_at': None,
+    }
+
+
+def apply_session(stats, session_data, latest=False):
+    """
+    Folds one saved import session into `stats`: its history summary and,
+    for a committed session (`latest`), the record counts of the lists it
+    imported (lists it skipped keep their previous count).
+    """
+    history = [s for s in stats.get('import_history', []) if s.get('id') != session_data.get('import_session_id')]
+    history.append(session_summary(session_data))
+    history.sort(key=lambda s: s.get('timestamp') or '', reverse=True)
+    stats['import_history'] = history[:HISTORY_SIZE]
+    if latest:
+        stats['latest_import'] = session_data
+        counts = stats.setdefault('source_counts', {})
+        for source, src_stats in (session_data.get('statistics') or {}).get('by_source', {}).items():
+            counts[source] = src_stats.get('after_update', 0)
+    stats['version'] = stats.get('version', 0) + 1
+    stats['updated_at'] = datetime.utcnow().isoformat()
+    return stats
+
+
+def _stats_ref(db):
+    return db.collection(STATS_COLLECTION).document(STATS_DOCUMENT)
+
+
+def build_stats(db):
+    """The statistics as the dashboard used to compute them on every load, from import_sessions."""
+    stats = empty_stats()
+    latest = db.collection(SESSIONS_COLLECTION).document('latest_import_session').get()
+    sessions = [doc.to_dict() for doc in db.collection(SESSIONS_COLLECTION).limit(20).stream()
+                if doc.id != 'latest_import_session']
+    for session_data in sorted(sessions, key=lambda x: x.get('timestamp_end') or ''):
+        apply_session(stats, session_data)
+    if latest.exists:
+        apply_session(stats, latest.to_dict(), latest=True)
+    return stats
+
+
+def record_session(db, session_data, latest=False):
+    """
+    Updates dashboard_stats/current with a saved session (read-modify-write;
+    the daily import is its only writer). `latest` marks a committed
+    session whose statistics are the new record counts.
+    """
+    ref = _stats_ref(db)
+    snap = ref.get()
+    stats = snap.to_dict() if snap.exists else build_stats(db)
+    apply_session(stats, session_data, latest)
+    ref.set(stats)
+    invalidate()
+    return stats
+
+
+def invalidate():
+    with _lock:
+        _cache['stats'] = None
+
+
+def get_dashboard_stats(db):
+    """dashboard_stats/current, from the instance cache when it is younger than DASHBOARD_CACHE_SECONDS"""
+    with _lock:
+        if _cache['stats'] is not None and time.monotonic() - _cache['loaded_at'] < DASHBOARD_CACHE_SECONDS:
+            return _cache['stats']
+    snap = _stats_ref(db).get()
+    if snap.exists:
+        stats = snap.to_dict()
+    else:
+        print(f"[{datetime.now()}] [>] No {STATS_COLLECTION}/{STATS_DOCUMENT} yet; building it from import sessions")
+        stats = build_stats(db)
+        _stats_ref(db).set(stats)
+    with _lock:
+        _cache['stats'] = stats
+        _cache['loaded_at'] = time.monotonic()
+    return stats
+
+
+def etag(*parts):
+    """Weak ETag of the JSON of `parts`"""
+    digest = hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def etag_matches(if_none_match, tag):
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(',')]
+    return '*' in candidates or tag in candidates or tag[2:] in candidates
@@ -0,0 +1,82 @@
+"""
+Lazily created Firestore clients for the Functions modules.
+
+Nothing here runs at import time: the client library is imported, the
+Firebase app initialized and the client created by the first call, so a
+cold start (or an OPTIONS/health request) pays only for the modules its
+entry point actually uses. Clients are created once per instance.
+
+    admin_db()   firebase_admin's client for the project (import, admin API)
+    cloud_db()   google-cloud-firestore client (search, batch screening)
+
+The importers call clear_emulator_env() first so that emulator variables
+leaking into the Cloud Functions runtime cannot redirect their writes
+(local harnesses opt out with SANCTIONS_USE_EMULATOR=1).
+"""
+import json
+import os
+import threading
+from datetime import datetime
+
+PROJECT_ID = 'sanction-defender-firebase'
+EMULATOR_VARS = ['FIRESTORE_EMULATOR_HOST', 'FIRESTORE_PROJECT_ID', 'GCLOUD_PROJECT']
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def clear_emulator_env():
+    if os.environ.get('SANCTIONS_USE_EMULATOR'):
+        return
+    for env_var in EMULATOR_VARS:
+        if os.environ.get(env_var):
+            print(f"[{datetime.now()}] [>] Clearing emulator env var {env_var}={os.environ.get(env_var)}")
+            os.environ.pop(env_var, None)
+
+
+def _credentials():
+    """A service account from GOOGLE_APPLICATION_CREDENTIALS, or None for Application Default Credentials"""
+    from firebase_admin import credentials
+
+    cred_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
+    if not cred_path:
+        return None
+    print(f"[>] Using GOOGLE_APPLICATION_CREDENTIALS: {cred_path}")
+    try:
+        with open(cred_path, 'r') as f:
+            cred_data = json.load(f)
+        if cred_data.get('type') == 'service_account':
+            return credentials.Certificate(cred_path)
+        print("[>] Detected user credentials, using ApplicationDefault")
+    except Exception as e:
+        print(f"[!] Error reading credentials file: {e}, falling back to ApplicationDefault")
+    return credentials.ApplicationDefault()
+
+
+def admin_db():
+    """firebase_admin's Firestore client, initializing the default app on first use"""
+    with _lock:
+        if 'admin' not in _clients:
+            import firebase_admin
+            from firebase_admin import firestore
+
+            if not firebase_admin._apps:
+                cred = _credentials()
+                if cred:
+                    firebase_admin.initialize_app(cred, options={'projectId': PROJECT_ID})
+                else:
+                    print("[>] Using Application Default Credentials (gcloud/CF runtime)")
+                    firebase_admin.initialize_app(options={'projectId': PROJECT_ID})
+            _clients['admin'] = firestore.client()
+            app = firebase_admin.get_app()
+            print(f"[{datetime.now()}] [OK] Connected to Firestore (project: {getattr(app, 'project_id', 'unknown')})")
+        return _clients['admin']
+
+
+def cloud_db():
+    """google-cloud-firestore client for the runtime's project"""
+    with _lock:
+        if 'cloud' not in _clients:
+            from google.cloud import firestore
+            _clients['cloud'] = firestore.Client()
+        return _clients['cloud']
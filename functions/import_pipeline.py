@@ -0,0 +1,311 @@
+"""
+Streaming import for the Cloud Function: each list goes from the HTTP body
+to Firestore through generator stages that hand bounded batches to the
+next one, so memory does not grow with the size of a list.
+
+    open_download    conditional GET; the body is read as a ByteStream
+    parse_records    records parsed while the body arrives
+    prepare_batches  validated, de-duplicated, tokenized records in batches
+    diff_batches     each batch checked against an id -> hash index of the
+                     stored records (the source manifest, source_manifest.py;
+                     without one, read from the stored documents); only
+                     added/updated records are kept (compressed) until commit
+    commit_source    writes in batches of BATCH_SIZE, committed concurrently
+                     with retries (batch_writer.py), fetching stored
+                     documents only for updates and removals, then
+                     stores the list's new manifest
+
+As in the file-based two-stage import (import_sanctions_two_stage.py, whose
+validator, record hash and session logger are reused), every list is
+validated before anything is written.
+
+Each list has a StageTimer (profiling.py): download, parse, prepare, diff,
+index_read, db_read, db_write and change_log seconds plus record counters
+(db_write is the time spent waiting for write batches; writes,
+write_batches and writes_per_second count the commit), saved as the import
+session's stage_timings.
+"""
+import io
+import json
+import os
+import zlib
+from datetime import datetime
+
+import requests
+
+import parse_eu
+import parse_uk
+import parse_us_simple
+from batch_writer import BatchWriter
+from profiling import StageTimer
+import search_index
+from source_manifest import mark_committing, write_manifest
+from xml_stream import ByteStream
+from import_sanctions_two_stage import ImportSessionLogger, SanctionsDataComparator
+
+# Records per stage batch; also the size of each Firestore write batch (max 500)
+BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '500'))
+DOWNLOAD_CHUNK_BYTES = 256 * 1024
+ENTITIES_COLLECTION = 'sanctions_entities'
+
+
+def batched(items, size=BATCH_SIZE):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def open_download(url, state, timeout=60, timer=None):
+    """
+    GET with If-None-Match / If-Modified-Since from the stored state.
+    Returns (stream, validators): stream is None on a 304, otherwise the
+    body is left unread for the parser. Call body_validators() once the
+    stream has been consumed. Time waiting for the server counts as the
+    timer's "download" stage.
+    """
+    timer = timer or StageTimer()
+    state = state if state and state.get('url') == url else {}
+    headers = {}
+    if state.get('etag'):
+        headers['If-None-Match'] = state['etag']
+    if state.get('last_modified'):
+        headers['If-Modified-Since'] = state['last_modified']
+
+    with timer.stage('download'):
+        response = requests.get(url, timeout=timeout, headers=headers, stream=True)
+    now = datetime.utcnow().isoformat()
+    if response.status_code == 304:
+        response.close()
+        validators = dict(state)
+        validators.update({
+            'etag': response.headers.get('ETag') or state.get('etag'),
+            'last_modified': response.headers.get('Last-Modified') or state.get('last_modified'),
+            'checked_at': now,
+        })
+        return None, validators
+    response.raise_for_status()
+
+    validators = {
+        'url': url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'checked_at': now,
+    }
+    return ByteStream(timer.iterate('download', response.iter_content(DOWNLOAD_CHUNK_BYTES))), validators
+
+
+def body_validators(stream, validators, state):
+    """Completes the validators with the body's SHA-256 and size; returns (validators, unchanged)."""
+    state = state or {}
+    sha256 = stream.hexdigest()
+    unchanged = sha256 == state.get('sha256')
+    validators = dict(validators)
+    validators.update({
+        'sha256': sha256,
+        'size_bytes': stream.size,
+        'changed_at': state.get('changed_at') if unchanged else validators['checked_at'],
+    })
+    return validators, unchanged
+
+
+def parse_records(source_name, xml_source):
+    if source_name == 'EU':
+        return parse_eu.iter_eu_records(xml_source)
+    if source_name == 'UK':
+        return parse_uk.iter_uk_records(xml_source)
+    return parse_us_simple.iter_us_simple_records(xml_source, source_name)
+
+
+class SourceRun:
+    """One list in the pipeline: counts, ids seen, and its added/updated records, compressed."""
+
+    def __init__(self, source, existing_hashes, timer=None, from_manifest=False):
+        self.source = source
+        self.timer = timer or StageTimer()
+        self.existing = existing_hashes  # stored id -> record hash
+        self.from_manifest = from_manifest
+        self.new_hashes = {}             # added/updated id -> record hash
+        self.seen = {}                   # accepted id -> line number
+        self.parsed = 0
+        self.counts = {'added': 0, 'updated': 0, 'removed': 0, 'unchanged': 0}
+        self._spill = io.BytesIO()
+        self._compressor = zlib.compressobj(6)
+
+    def keep(self, kind, record, record_hash):
+        self.counts[kind] += 1
+        self.new_hashes[record['id']] = record_hash
+        line = json.dumps([kind, record], ensure_ascii=False, separators=(',', ':')) + '\n'
+        self._spill.write(self._compressor.compress(line.encode('utf-8')))
+
+    def finish(self):
+        self._spill.write(self._compressor.flush())
+        self.counts['removed'] = sum(1 for rec_id in self.existing if rec_id not in self.seen)
+
+    def manifest(self):
+        """id -> record hash of the list once committed"""
+        return {rec_id: self.new_hashes.get(rec_id) or self.existing[rec_id] for rec_id in self.seen}
+
+    def removed_ids(self):
+        return (rec_id for rec_id in self.existing if rec_id not in self.seen)
+
+    def changes(self):
+        """Yields (kind, record) for the kept records, decompressing as it goes."""
+        self._spill.seek(0)
+        decompressor = zlib.decompressobj()
+        pending = b''
+        for chunk in iter(lambda: self._spill.read(64 * 1024), b''):
+            pending += decompressor.decompress(chunk)
+            *lines, pending = pending.split(b'\n')
+            for line in lines:
+                yield tuple(json.loads(line))
+        pending += decompressor.flush()
+        if pending.strip():
+            yield tuple(json.loads(pending))
+
+
+def prepare_batches(records, run, validator, size=BATCH_SIZE):
+    def prepared():
+        for line_num, record in enumerate(records, 1):
+            run.parsed += 1
+            record = validator.prepare_record(record, line_num, run.source, run.seen)
+            if record is not None:
+                yield record
+    return batched(prepared(), size)
+
+
+def diff_batches(batches, run, comparator):
+    """Classifies each batch against the stored hashes; yields the number of records handled."""
+    for batch in batches:
+        for record in batch:
+            old_hash = run.existing.get(record['id'])
+            new_hash = comparator.compute_record_hash(record)
+            if old_hash is None:
+                run.keep('added', record, new_hash)
+            elif old_hash != new_hash:
+                run.keep('updated', record, new_hash)
+            else:
+                run.counts['unchanged'] += 1
+        yield len(batch)
+
+
+def validate_source(db, source_name, xml_source, validator, comparator, timer=None):
+    """Runs one list through parse -> prepare -> diff; nothing is written."""
+    print(f"[{datetime.now()}] [>] Streaming {source_name}...")
+    timer = timer or StageTimer()
+    with timer.stage('index_read'):
+        hashes, from_manifest = comparator.get_existing_hashes(source_name)
+    timer.count('manifest_hit' if from_manifest else 'manifest_miss')
+    run = SourceRun(source_name, hashes, timer, from_manifest)
+    records = timer.iterate('parse', parse_records(source_name, xml_source))
+    batches = timer.iterate('prepare', prepare_batches(records, run, validator))
+    handled = 0
+    for count in timer.iterate('diff', diff_batches(batches, run, comparator)):
+        handled += count
+        if handled % (BATCH_SIZE * 10) < count:
+            print(f"    {source_name}: {handled} records checked...")
+    run.finish()
+    timer.count('parsed', run.parsed)
+    timer.count('accepted', len(run.seen))
+    for kind, n in run.counts.items():
+        timer.count(kind, n)
+    print(f"[{datetime.now()}] [OK] {source_name}: {run.parsed} parsed, {run.counts}")
+    return run
+
+
+def _stored_docs(db, coll, ids):
+    if not ids:
+        return {}
+    return {snap.id: snap.to_dict() for snap in db.get_all([coll.document(i) for i in ids]) if snap.exists}
+
+
+def commit_source(db, run, session_logger, size=BATCH_SIZE):
+    """
+    Writes one validated list through a BatchWriter (batches of `size`,
+    committed concurrently and retried on contention); returns the number
+    of documents written or deleted. Writes/s go to the run's timer.
+    """
+    coll = db.collection(ENTITIES_COLLECTION)
+    timer = run.timer
+    committed = 0
+    writer = BatchWriter(db, batch_size=size, timer=timer)
+    with writer:
+        for batch in batched(run.changes(), size):
+            with timer.stage('db_read'):
+                old_docs = _stored_docs(db, coll, [record['id'] for kind, record in batch if kind == 'updated'])
+            for kind, record in batch:
+                entity_id = record['id']
+                entity_name = record.get('main_name', entity_id)
+                writer.set(coll.document(entity_id), record)
+                if kind == 'added':
+                    session_logger.log_change('ADD', entity_id, entity_name, run.source,
+                                              reason='New entity in sanctions list')
+                else:
+                    old = old_docs.get(entity_id, {})
+                    changed_fields = SanctionsDataComparator._detect_changes(old, record)
+                    session_logger.log_change('UPDATE', entity_id, entity_name, run.source,
+                                              old_data=old, changed_fields=changed_fields,
+                                              reason=f"Updated fields: {list(changed_fields.keys())}")
+            committed += len(batch)
+
+        for ids in batched(run.removed_ids(), size):
+            with timer.stage('db_read'):
+                old_docs = _stored_docs(db, coll, ids)
+            for entity_id in ids:
+                record = old_docs.get(entity_id, {})
+                writer.delete(coll.document(entity_id))
+                session_logger.log_change('REMOVE', entity_id, record.get('main_name', entity_id), run.source,
+                                          old_data=record, reason='Entity no longer in sanctions list')
+            committed += len(ids)
+
+    stats = writer.stats()
+    if stats['writes']:
+        timer.count('writes_per_second', int(stats['writes_per_second']))
+        print(f"[{datetime.now()}] [OK] {run.source}: {stats['writes']} writes in {stats['batches']} batches, "
+              f"{stats['seconds']}s ({stats['writes_per_second']} writes/s, {stats['retries']} retries)")
+    return committed
+
+
+def commit_runs(db, runs, downloads, import_batch_id, profile=None):
+    """
+    Commits every validated list and saves the import session (statistics,
+    downloads, stage timings, entries). `profile` is the path of a profile
+    of this run, if one is being written.
+    """
+    session_logger = ImportSessionLogger(db)
+    for download in downloads or []:
+        session_logger.add_download_info(**download)
+    session_logger.set_statistics({run.source: run.counts for run in runs})
+
+    total_committed = 0
+    search_index.mark_committing(db, import_batch_id)
+    for run in runs:
+        print(f"\n[>] Committing {run.source}...")
+        mark_committing(db, run.source, import_batch_id)
+        total_committed += commit_source(db, run, session_logger)
+        with run.timer.stage('manifest_write'):
+            write_manifest(db, run.source, run.manifest(), run.existing if run.from_manifest else None,
+                           import_batch_id)
+
+    session_logger.stage_timings = {
+        'by_source': {run.source: run.timer.as_dict() for run in runs},
+        'profile': profile,
+    }
+    session_logger.save_import_session(import_batch_id)
+    print(f"[OK] Total changes committed: {total_committed}")
+    return session_logger
+
+
+def committed_changes(runs):
+    """
+    (kind, record) of every document commit_runs() wrote and ('removed',
+    {'id': id}) of every one it deleted, for search_index.publish_snapshot.
+    """
+    for run in runs:
+        yield from run.changes()
+        for rec_id in run.removed_ids():
+            yield 'removed', {'id': rec_id}
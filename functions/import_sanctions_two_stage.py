@@ -5,7 +5,8 @@ Two-stage sanctions data update with comprehensive audit logging.
 Stage 1: VALIDATION
 - Load new data from source files
 - Validate data integrity (no duplicates, required fields, etc.)
-- Compare with existing Firestore data
+- Compare with the stored record hashes (per-source manifest, see
+  source_manifest.py; stored documents are read only for changes)
 - Generate detailed change report (added, updated, removed)
 - Create audit log entries
 
@@ -29,69 +30,26 @@ from datetime import datetime
 from collections import defaultdict
 from typing import Dict, List, Set, Tuple
 import hashlib
-from matching import NameMatcher  # Import NameMatcher for token generation
+from batch_writer import BatchWriter
+from firestore_clients import admin_db, clear_emulator_env
+from dashboard_stats import record_session
+from source_manifest import load_manifest, mark_committing, write_manifest
+from session_entries import write_entries
+import search_index
 
-try:
-    import firebase_admin
-    from firebase_admin import credentials, firestore
+# Fields derived from the list data, not part of it: ignored by the record
+# hash and change detection (search_tokens is no longer written but older
+# documents still carry it until they change)
+DERIVED_FIELDS = {'search_tokens'}
 
-    print(f"[>] Current working directory: {os.getcwd()}")
-    print(f"[>] Script directory: {os.path.dirname(os.path.abspath(__file__))}")
 
-    # Clear emulator-related environment variables to avoid writing to emulator in CF runtime
-    for env_var in ['FIRESTORE_EMULATOR_HOST', 'FIRESTORE_PROJECT_ID', 'GCLOUD_PROJECT']:
-        if os.environ.get(env_var):
-            print(f"[>] Clearing emulator env var {env_var}={os.environ.get(env_var)}")
-            os.environ.pop(env_var, None)
-
-    # Initialize Firebase Admin SDK using the active project from the runtime
-    # to avoid accidentally pointing at a different project via local files.
-    if not firebase_admin._apps:
-        cred = None
-        cred_path = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS')
-
-        if cred_path:
-            print(f"[>] Using GOOGLE_APPLICATION_CREDENTIALS: {cred_path}")
-            try:
-                with open(cred_path, 'r') as f:
-                    cred_data = json.load(f)
-                    if cred_data.get('type') == 'service_account':
-                        cred = credentials.Certificate(cred_path)
-                    else:
-                        print("[>] Detected user credentials, using ApplicationDefault")
-                        cred = credentials.ApplicationDefault()
-            except Exception as e:
-                print(f"[!] Error reading credentials file: {e}, falling back to ApplicationDefault")
-                cred = credentials.ApplicationDefault()
-
-        if cred:
-            firebase_admin.initialize_app(cred, options={'projectId': 'sanction-defender-firebase'})
-        else:
-            print("[>] Using Application Default Credentials (gcloud/CF runtime)")
-            firebase_admin.initialize_app(options={'projectId': 'sanction-defender-firebase'})
-
-    db = firestore.client()
-    try:
-        app = firebase_admin.get_app()
-        print(f"[OK] Connected to Firestore (project: {getattr(app, 'project_id', 'unknown')})")
-    except Exception:
-        print("[OK] Connected to Firestore")
-
-    # Debug marker to confirm module init wrote to expected project
-    try:
-        db.collection('_debug_imports').document('module_init').set({
-            'ts': datetime.utcnow().isoformat(),
-            'source': 'import_sanctions_two_stage',
-            'project': getattr(firebase_admin.get_app(), 'project_id', 'unknown')
-        })
-        print("[OK] Wrote module_init debug marker")
-    except Exception as dbg_err:
-        print(f"[WARN] Could not write module_init debug marker: {dbg_err}")
-
-except Exception as e:
-    print(f"[X] Firebase initialization failed: {e}")
-    print(f"[X] Make sure GOOGLE_APPLICATION_CREDENTIALS env var is set or you have gcloud authenticated")
-    sys.exit(1)
+def get_db():
+    """
+    The importer's Firestore client, created on first use (nothing is
+    initialized or written when this module is imported).
+    """
+    clear_emulator_env()
+    return admin_db()
 
 
 class SanctionsDataValidator:
@@ -128,9 +86,38 @@ class SanctionsDataValidator:
         
         return True
     
+    def prepare_record(self, record: Dict, line_num: int, source_name: str, seen: Dict[str, int]):
+        """
+        Validates one parsed record. Returns None for records to skip
+        (parser errors, invalid, duplicate ids). `seen` maps the ids
+        accepted so far to their line numbers. Search tokens are not stored
+        on the record; they live in token_postings (see token_postings.py).
+        """
+        # Skip error records
+        if 'error' in record:
+            return None
+        
+        # Validate record
+        if not self.validate_record(record, line_num, source_name):
+            return None
+        
+        # Check for duplicate IDs within the file
+        rec_id = record.get('id')
+        if rec_id in seen:
+            self.warnings.append(
+                f"Duplicate ID in {source_name}: '{rec_id}' "
+                f"(line {line_num}, previously at line {seen[rec_id]})"
+            )
+            return None  # Skip duplicate
+        
+        record['_line_num'] = line_num
+        seen[rec_id] = line_num
+        return record
+
     def load_source_data(self, source_name: str, file_path: str) -> Dict[str, Dict]:
         """Load and validate data from a single source file"""
         records = {}
+        seen = {}
         
         if not os.path.exists(file_path):
             self.errors.append(f"File not found: {file_path}")
@@ -146,41 +133,9 @@ class SanctionsDataValidator:
                 
                 try:
                     record = json.loads(line)
-                    
-                    # Skip error records
-                    if 'error' in record:
-                        continue
-                    
-                    # Validate record
-                    if not self.validate_record(record, line_num, source_name):
-                        continue
-                    
-                    # Generate search tokens for indexed search
-                    main_name = record.get('main_name', '')
-                    aliases = record.get('aliases', [])
-                    
-                    # Collect all searchable text
-                    search_text = [main_name] + aliases
-                    all_tokens = set()
-                    
-                    for text in search_text:
-                        tokens = NameMatcher.generate_search_tokens(text)
-                        all_tokens.update(tokens)
-                    
-                    # Add tokens to record
-                    record['search_tokens'] = list(all_tokens)
-                    
-                    # Check for duplicate IDs within the file
-                    rec_id = record.get('id')
-                    if rec_id in records:
-                        self.warnings.append(
-                            f"Duplicate ID in {source_name}: '{rec_id}' "
-                            f"(line {line_num}, previously at line {records[rec_id].get('_line_num')})"
-                        )
-                        continue  # Skip duplicate
-                    
-                    record['_line_num'] = line_num
-                    records[rec_id] = record
+                    record = self.prepare_record(record, line_num, source_name, seen)
+                    if record is not None:
+                        records[record['id']] = record
                 
                 except json.JSONDecodeError as e:
                     self.errors.append(f"Line {line_num} ({source_name}): Invalid JSON: {e}")
@@ -195,11 +150,19 @@ class SanctionsDataComparator:
     def __init__(self, db):
         self.db = db
     
-    def get_existing_data(self, source: str) -> Dict[str, Dict]:
-        """Fetch all existing records for a source from Firestore"""
-        print(f"\n[>] Fetching existing {source} data from Firestore...")
+    def get_existing_hashes(self, source: str) -> Tuple[Dict[str, str], bool]:
+        """
+        id -> record hash of the stored records of a source, and whether it
+        came from the source manifest (no entity reads). Without a usable
+        manifest every stored document of the source is read.
+        """
+        hashes = load_manifest(self.db, source)
+        if hashes is not None:
+            print(f"   [OK] {len(hashes)} existing records in the {source} manifest")
+            return hashes, True
         
-        records = {}
+        print(f"\n[>] No usable manifest; fetching existing {source} data from Firestore...")
+        hashes = {}
         query = self.db.collection('sanctions_entities').where('sanction_source', '==', source)
         
         doc_count = 0
@@ -208,28 +171,42 @@ class SanctionsDataComparator:
             if doc_count % 500 == 0:
                 print(f"    Downloaded {doc_count} documents...")
             data = doc.to_dict()
-            doc_id = data.get('id')
-            records[doc_id] = data
+            hashes[data.get('id')] = self.compute_record_hash(data)
         
-        print(f"   [OK] Found {len(records)} existing records")
+        print(f"   [OK] Found {len(hashes)} existing records")
+        return hashes, False
+    
+    def fetch_records(self, ids) -> Dict[str, Dict]:
+        """Stored documents of the given ids, in batched reads"""
+        coll = self.db.collection('sanctions_entities')
+        ids = list(ids)
+        records = {}
+        for start in range(0, len(ids), 500):
+            refs = [coll.document(rec_id) for rec_id in ids[start:start + 500]]
+            records.update({snap.id: snap.to_dict() for snap in self.db.get_all(refs) if snap.exists})
         return records
     
     def compute_record_hash(self, record: Dict) -> str:
         """Compute hash of record content (excluding metadata fields)"""
         # Remove metadata fields from hash calculation
         fields_to_hash = {k: v for k, v in record.items() 
-                         if k not in ['_line_num', '_hash', '_imported_at', 'id']}
+                         if k not in ['_line_num', '_hash', '_imported_at', 'id'] and k not in DERIVED_FIELDS}
         
         content = json.dumps(fields_to_hash, sort_keys=True, default=str)
         return hashlib.sha256(content.encode()).hexdigest()[:16]
     
-    def compare(self, new_data: Dict, existing_data: Dict, source: str) -> Dict:
-        """Compare new data with existing data and generate change report"""
+    def compare(self, new_data: Dict, existing_hashes: Dict[str, str], source: str,
+                from_manifest: bool = False) -> Dict:
+        """
+        Compare new data with the stored hashes and generate the change
+        report. Stored documents are read only for updated and removed
+        records. report['hashes'] is the manifest after the commit.
+        """
         
         print(f"\n[>] Comparing {source} data...")
         
         new_ids = set(new_data.keys())
-        existing_ids = set(existing_data.keys())
+        existing_ids = set(existing_hashes.keys())
         
         report = {
             'source': source,
@@ -239,36 +216,45 @@ class SanctionsDataComparator:
             'updated': {},    # Modified records
             'unchanged': {},  # Same records
             'removed': {},    # Deleted records
+            'hashes': {},     # id -> hash once committed
+            'previous_hashes': existing_hashes if from_manifest else None,
         }
         
         # Find added records
         for rec_id in new_ids - existing_ids:
             report['added'][rec_id] = new_data[rec_id]
+            report['hashes'][rec_id] = self.compute_record_hash(new_data[rec_id])
         
         # Find updated and unchanged records
+        changed_ids = []
         for idx, rec_id in enumerate(new_ids & existing_ids, 1):
             if idx % 1000 == 0:
                 print(f"    Compared {idx} overlapping records...")
-            new_record = new_data[rec_id]
-            existing_record = existing_data[rec_id]
-            
-            new_hash = self.compute_record_hash(new_record)
-            existing_hash = self.compute_record_hash(existing_record)
-            
-            if new_hash != existing_hash:
-                report['updated'][rec_id] = {
-                    'old': existing_record,
-                    'new': new_record,
-                    'changed_fields': self._detect_changes(existing_record, new_record)
-                }
+            new_hash = self.compute_record_hash(new_data[rec_id])
+            report['hashes'][rec_id] = new_hash
+            if new_hash != existing_hashes[rec_id]:
+                changed_ids.append(rec_id)
             else:
-                report['unchanged'][rec_id] = existing_record
+                report['unchanged'][rec_id] = new_data[rec_id]
+        
+        # Only the changed and removed records are read
+        removed_ids = existing_ids - new_ids
+        old_records = self.fetch_records(changed_ids + list(removed_ids))
+        
+        for rec_id in changed_ids:
+            existing_record = old_records.get(rec_id, {})
+            new_record = new_data[rec_id]
+            report['updated'][rec_id] = {
+                'old': existing_record,
+                'new': new_record,
+                'changed_fields': self._detect_changes(existing_record, new_record)
+            }
         
         # Find removed records
-        for idx, rec_id in enumerate(existing_ids - new_ids, 1):
+        for idx, rec_id in enumerate(removed_ids, 1):
             if idx % 1000 == 0:
                 print(f"    Processed {idx} removals...")
-            report['removed'][rec_id] = existing_data[rec_id]
+            report['removed'][rec_id] = old_records.get(rec_id, {'id': rec_id})
         
         # Print summary
         print(f"\n   Summary for {source}:")
@@ -288,7 +274,7 @@ class SanctionsDataComparator:
         all_keys = set(old_record.keys()) | set(new_record.keys())
         
         for key in all_keys:
-            if key.startswith('_'):
+            if key.startswith('_') or key in DERIVED_FIELDS:
                 continue  # Skip metadata fields
             
             old_val = old_record.get(key)
@@ -321,6 +307,8 @@ class ImportSessionLogger:
             'by_source': {}
         }
         self.downloads = []
+        # Seconds and counters per stage ({'by_source': {...}, 'run_seconds': {...}}); see import_pipeline.py
+        self.stage_timings = {}
     
     def log_change(self, change_type: str, entity_id: str, entity_name: str, source: str, 
                    old_data: Dict = None, new_data: Dict = None, changed_fields: Dict = None, 
@@ -329,7 +317,7 @@ class ImportSessionLogger:
         Log a single entity change with optimized storage:
         - ADD: minimal fields (can query from database)
         - UPDATE: only changed field names (can query from database)
-        - DELETE: full record (for recovery/audit trail)
+        - DELETE: full record without derived fields (for recovery/audit trail)
         """
         entry = {
             'timestamp': datetime.utcnow().isoformat(),
@@ -343,8 +331,10 @@ class ImportSessionLogger:
         
         # Store data strategically
         if change_type == 'REMOVE':
-            # Store full deleted record for audit trail and recovery
-            entry['deleted_data'] = old_data
+            # Store full deleted record for audit trail and recovery;
+            # derived fields are rebuilt when a record is restored
+            entry['deleted_data'] = ({k: v for k, v in old_data.items() if k not in DERIVED_FIELDS}
+                                     if old_data else old_data)
         elif change_type == 'UPDATE':
             # Store only changed field names, not values
             if changed_fields:
@@ -367,6 +357,13 @@ class ImportSessionLogger:
     
     def calculate_statistics(self, reports: Dict):
         """Calculate aggregated statistics from reports"""
+        self.set_statistics({
+            source: {kind: len(report.get(kind, {})) for kind in ('added', 'updated', 'removed', 'unchanged')}
+            for source, report in reports.items()
+        })
+    
+    def set_statistics(self, counts_by_source: Dict[str, Dict[str, int]]):
+        """Aggregated statistics from per-source added/updated/removed/unchanged counts"""
         self.statistics['by_source'] = {}
         
         total_downloaded = 0
@@ -376,11 +373,11 @@ class ImportSessionLogger:
         total_deleted = 0
         total_unchanged = 0
         
-        for source, report in reports.items():
-            added = len(report.get('added', {}))
-            updated = len(report.get('updated', {}))
-            deleted = len(report.get('removed', {}))
-            unchanged = len(report.get('unchanged', {}))
+        for source, counts in counts_by_source.items():
+            added = counts['added']
+            updated = counts['updated']
+            deleted = counts['removed']
+            unchanged = counts['unchanged']
             
             before_update = updated + unchanged + deleted
             downloaded = added + updated + unchanged
@@ -425,17 +422,15 @@ class ImportSessionLogger:
         print(f"[DEBUG] Using Firestore client: {self.db}")
         
         try:
-            # First, test that Firestore is working by writing a debug marker
-            print(f"[DEBUG] Testing Firestore write...")
-            test_write = self.db.collection('_debug_imports').document('test').set({
-                'test': True,
-                'timestamp': datetime.utcnow().isoformat()
-            })
-            print(f"[DEBUG] Test write successful: {test_write}")
-            
             sessions_coll = self.db.collection('import_sessions')
             session_doc = sessions_coll.document(import_batch_id)
             
+            # Save the change entries first, packed and compressed into chunk
+            # documents (session_entries.py), so the session is complete when visible
+            print(f"   [*] Writing {len(self.log_entries)} change entries...")
+            entry_index = write_entries(self.db, session_doc, self.log_entries)
+            print(f"   [OK] {len(self.log_entries)} change entries written in {len(entry_index['chunks'])} chunks")
+            
             # Create session metadata with statistics
             session_data = {
                 'import_session_id': import_batch_id,
@@ -448,6 +443,8 @@ class ImportSessionLogger:
                 'downloads': self.downloads,
                 'total_changes': len(self.log_entries),
                 'change_types': self._count_entry_types(),
+                'entry_chunks': len(entry_index['chunks']),
+                'stage_timings': self.stage_timings,
             }
             
             print(f"   [*] Writing session document to 'import_sessions/{import_batch_id}'...")
@@ -460,15 +457,12 @@ class ImportSessionLogger:
             result2 = sessions_coll.document('latest_import_session').set(session_data)
             print(f"   [OK] Latest session updated: {result2}")
             
-            # Save individual change entries as subcollection
-            print(f"   [*] Writing {len(self.log_entries)} change entries...")
-            write_count = 0
-            for i, entry in enumerate(self.log_entries):
-                session_doc.collection('entries').document(str(i)).set(entry)
-                write_count += 1
-                if write_count % 100 == 0:
-                    print(f"      ... {write_count} entries written")
-            print(f"   [OK] All {len(self.log_entries)} change entries written")
+            # Keep the admin dashboard's pre-aggregated statistics current
+            try:
+                record_session(self.db, session_data, latest=True)
+                print(f"   [OK] Dashboard statistics updated")
+            except Exception as stats_err:
+                print(f"   [WARN] Could not update dashboard statistics: {stats_err}")
             
             print(f"\n[OK] Import session saved successfully to 'import_sessions/{import_batch_id}'")
             return import_batch_id
@@ -487,11 +481,17 @@ class ImportSessionLogger:
         return dict(counts)
 
 
-def stage_1_validation(db=None):
-    """STAGE 1: Validate new data and generate change report"""
-    
-    # Use provided db or fall back to module-level db
-    _db = db if db is not None else globals()['db']
+def stage_1_validation(db=None, sources=None, parsed_files=None):
+    """
+    STAGE 1: Validate new data and generate change report.
+    `sources` limits the run to those lists (e.g. the ones that changed);
+    unchanged lists are neither loaded nor compared. `parsed_files` maps a
+    source to its parsed JSONL file; by default
+    <parsed_dir>/<source>.jsonl is read.
+    """
+    
+    # Use provided db or fall back to the module's lazily created client
+    _db = db if db is not None else get_db()
     print(f"[DEBUG] stage_1_validation using db: {_db}")
     
     print("=" * 80)
@@ -501,7 +501,7 @@ def stage_1_validation(db=None):
     validator = SanctionsDataValidator()
     comparator = SanctionsDataComparator(_db)
     
-    sources = ['EU', 'UK', 'US_SDN_SIMPLE', 'US_NON_SDN_SIMPLE']
+    sources = sources or ['EU', 'UK', 'US_SDN_SIMPLE', 'US_NON_SDN_SIMPLE']
     
     # Determine parsed directory based on environment
     if os.environ.get('CLOUD_RUN_JOB') or os.path.exists('/workspace'):
@@ -520,7 +520,7 @@ def stage_1_validation(db=None):
     new_data_by_source = {}
     
     for source in sources:
-        file_path = os.path.join(parsed_dir, f"{source}.jsonl")
+        file_path = (parsed_files or {}).get(source) or os.path.join(parsed_dir, f"{source}.jsonl")
         new_data_by_source[source] = validator.load_source_data(source, file_path)
     
     # Check for validation errors
@@ -544,9 +544,9 @@ def stage_1_validation(db=None):
     for source in sources:
         try:
             print(f"[>] Checking {source}...")
-            existing_data = comparator.get_existing_data(source)
+            existing_hashes, from_manifest = comparator.get_existing_hashes(source)
             new_data = new_data_by_source[source]
-            report = comparator.compare(new_data, existing_data, source)
+            report = comparator.compare(new_data, existing_hashes, source, from_manifest)
             all_reports[source] = report
         except Exception as e:
             print(f"[ERROR] Failed to compare {source}: {e}")
@@ -591,11 +591,26 @@ def stage_1_validation(db=None):
     return all_reports
 
 
-def stage_2_commit(reports: Dict, db=None):
-    """STAGE 2: Commit changes to Firestore with optimized import session logging"""
-    
-    # Use provided db or fall back to module-level db
-    _db = db if db is not None else globals()['db']
+def _committed_changes(reports: Dict):
+    """(kind, record) of what stage_2_commit wrote, ('removed', {'id': id}) for deletions"""
+    for report in reports.values():
+        for record in report['added'].values():
+            yield 'added', record
+        for changes in report['updated'].values():
+            yield 'updated', changes['new']
+        for entity_id in report['removed']:
+            yield 'removed', {'id': entity_id}
+
+
+def stage_2_commit(reports: Dict, db=None, downloads: List[Dict] = None):
+    """
+    STAGE 2: Commit changes to Firestore with optimized import session logging.
+    `downloads` (source, url, status, file_size_bytes, downloaded_records) are
+    recorded on the import session, including lists skipped as unchanged.
+    """
+    
+    # Use provided db or fall back to the module's lazily created client
+    _db = db if db is not None else get_db()
     print(f"[DEBUG] stage_2_commit called with reports: {type(reports)}")
     print(f"[DEBUG] stage_2_commit using db: {_db}")
     
@@ -613,6 +628,8 @@ def stage_2_commit(reports: Dict, db=None):
     import_batch_id = f"import_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}"
     print(f"[DEBUG] Creating ImportSessionLogger with db type: {type(_db)}")
     session_logger = ImportSessionLogger(_db)
+    for download in downloads or []:
+        session_logger.add_download_info(**download)
     
     # Calculate statistics for admin dashboard
     print(f"[DEBUG] Calculating statistics...")
@@ -621,78 +638,80 @@ def stage_2_commit(reports: Dict, db=None):
     
     print(f"\n[>] Starting data commit with batch ID: {import_batch_id}")
     
-    # Commit changes
+    # Commit changes: batches of 500 committed concurrently, retried on contention
     coll = _db.collection('sanctions_entities')
     total_committed = 0
+    writer = BatchWriter(_db)
     
-    for source, report in reports.items():
-        print(f"\n[>] Committing {source}...")
-        
-        # Add new records
-        for idx, (entity_id, record) in enumerate(report['added'].items(), 1):
-            coll.document(entity_id).set(record, merge=False)
-            entity_name = record.get('main_name', entity_id)
-            session_logger.log_change('ADD', entity_id, entity_name, source,
-                                     reason='New entity in sanctions list')
-            total_committed += 1
-            if idx % 1000 == 0:
-                print(f"    Added {idx} records...")
-        
-        # Update modified records
-        for idx, (entity_id, changes) in enumerate(report['updated'].items(), 1):
-            coll.document(entity_id).set(changes['new'], merge=False)
-            entity_name = changes['new'].get('main_name', entity_id)
-            session_logger.log_change('UPDATE', entity_id, entity_name, source,
-                                     old_data=changes['old'],
-                                     changed_fields=changes['changed_fields'],
-                                     reason=f"Updated fields: {list(changes['changed_fields'].keys())}")
-            total_committed += 1
-            if idx % 1000 == 0:
-                print(f"    Updated {idx} records...")
-        
-        # Remove deleted records (with confirmation)
-        if report['removed']:
-            print(f"\n   [!] Removing {len(report['removed'])} entities from {source}...")
-            for idx, (entity_id, record) in enumerate(report['removed'].items(), 1):
-                coll.document(entity_id).delete()
+    # The manifests are not used again until they match the committed data
+    for source in reports:
+        mark_committing(_db, source, import_batch_id)
+    # Nor is the search index snapshot for building the next one on
+    search_index.mark_committing(_db, import_batch_id)
+    
+    with writer:
+        for source, report in reports.items():
+            print(f"\n[>] Committing {source}...")
+            
+            # Add new records
+            for idx, (entity_id, record) in enumerate(report['added'].items(), 1):
+                writer.set(coll.document(entity_id), record)
                 entity_name = record.get('main_name', entity_id)
-                session_logger.log_change('REMOVE', entity_id, entity_name, source, 
-                                         old_data=record,
-                                         reason='Entity no longer in sanctions list')
+                session_logger.log_change('ADD', entity_id, entity_name, source,
+                                         reason='New entity in sanctions list')
+                total_committed += 1
+                if idx % 1000 == 0:
+                    print(f"    Added {idx} records...")
+            
+            # Update modified records
+            for idx, (entity_id, changes) in enumerate(report['updated'].items(), 1):
+                writer.set(coll.document(entity_id), changes['new'])
+                entity_name = changes['new'].get('main_name', entity_id)
+                session_logger.log_change('UPDATE', entity_id, entity_name, source,
+                                         old_data=changes['old'],
+                                         changed_fields=changes['changed_fields'],
+                                         reason=f"Updated fields: {list(changes['changed_fields'].keys())}")
                 total_committed += 1
                 if idx % 1000 == 0:
-                    print(f"    Removed {idx} records...")
+                    print(f"    Updated {idx} records...")
+            
+            # Remove deleted records (with confirmation)
+            if report['removed']:
+                print(f"\n   [!] Removing {len(report['removed'])} entities from {source}...")
+                for idx, (entity_id, record) in enumerate(report['removed'].items(), 1):
+                    writer.delete(coll.document(entity_id))
+                    entity_name = record.get('main_name', entity_id)
+                    session_logger.log_change('REMOVE', entity_id, entity_name, source, 
+                                             old_data=record,
+                                             reason='Entity no longer in sanctions list')
+                    total_committed += 1
+                    if idx % 1000 == 0:
+                        print(f"    Removed {idx} records...")
+    
+    for source, report in reports.items():
+        write_manifest(_db, source, report['hashes'], report.get('previous_hashes'), import_batch_id)
+    
+    try:
+        # Search snapshot and token postings, built from the previous snapshot
+        search_index.publish_snapshot(_db, import_batch_id, _committed_changes(reports))
+    except Exception as index_err:
+        print(f"[WARNING] Could not publish the search index: {index_err}")
+    
+    write_stats = writer.stats()
+    session_logger.stage_timings = {'commit': write_stats}
+    print(f"\n[OK] {write_stats['writes']} writes in {write_stats['batches']} batches, "
+          f"{write_stats['seconds']}s ({write_stats['writes_per_second']} writes/s, {write_stats['retries']} retries)")
     
     # Save import session with statistics
     try:
-        # Write a pre-session marker to confirm we reach this point
-        try:
-            _db.collection('_debug_imports').document('pre_session_save').set({
-                'ts': datetime.utcnow().isoformat(),
-                'import_batch_probe': True
-            })
-            print(f"[DEBUG] Wrote pre_session_save marker")
-        except Exception as pre_marker_err:
-            print(f"[WARNING] Could not write pre_session_save marker: {pre_marker_err}")
-
         session_logger.save_import_session(import_batch_id)
-
-        # Write a post-session marker to confirm success
-        try:
-            _db.collection('_debug_imports').document('post_session_save').set({
-                'ts': datetime.utcnow().isoformat(),
-                'saved_session_id': import_batch_id
-            })
-            print(f"[DEBUG] Wrote post_session_save marker")
-        except Exception as post_marker_err:
-            print(f"[WARNING] Could not write post_session_save marker: {post_marker_err}")
     except Exception as session_err:
         print(f"\n[X] CRITICAL: Failed to save import session: {session_err}")
         import traceback
         traceback.print_exc()
         # Try to at least log failure status to Firebase
         try:
-            db.collection('import_sessions').document(import_batch_id).set({
+            _db.collection('import_sessions').document(import_batch_id).set({
                 'import_session_id': import_batch_id,
                 'status': 'completed_with_session_logging_failure',
                 'error': f'Session save failed: {str(session_err)}',
@@ -99,7 +99,8 @@ def _perform_download():
     print(f"[{datetime.now()}] Triggering two-stage import...")
     try:
         # Import the two-stage functions and get their module-level db
-        from import_sanctions_two_stage import stage_1_validation, stage_2_commit, db as module_db
+        from import_sanctions_two_stage import stage_1_validation, stage_2_commit, get_db
+        module_db = get_db()
         
         if not module_db:
             print(f"[{datetime.now()}] [ERROR] Module db is None!")
@@ -159,6 +159,49 @@ class NameMatcher:
             return 100.0
         return ((max_length - distance) / max_length) * 100
     
+    @staticmethod
+    def levenshtein_within(s1: str, s2: str, max_distance: int) -> int:
+        """
+        Levenshtein distance if it is at most max_distance, otherwise
+        max_distance + 1. Only the diagonal band |i - j| <= max_distance is
+        computed and it stops as soon as a whole row exceeds the bound.
+        """
+        if len(s1) < len(s2):
+            s1, s2 = s2, s1
+        over = max_distance + 1
+        if len(s1) - len(s2) > max_distance:
+            return over
+        if not s2:
+            return len(s1)
+        
+        previous_row = list(range(len(s2) + 1))
+        for i, c1 in enumerate(s1, 1):
+            current_row = [over] * (len(s2) + 1)
+            current_row[0] = min(i, over)
+            row_min = current_row[0]
+            for j in range(max(1, i - max_distance), min(len(s2), i + max_distance) + 1):
+                distance = min(previous_row[j] + 1, current_row[j - 1] + 1,
+                               previous_row[j - 1] + (c1 != s2[j - 1]), over)
+                current_row[j] = distance
+                if distance < row_min:
+                    row_min = distance
+            if row_min > max_distance:
+                return over
+            previous_row = current_row
+        return previous_row[-1]
+    
+    def _ratio_at_least(self, s1: str, s2: str, minimum: float):
+        """levenshtein_ratio(s1, s2) when it can be >= minimum, otherwise None"""
+        max_length = max(len(s1), len(s2))
+        if max_length == 0:
+            return 100.0
+        # One edit of slack so float rounding at the boundary never drops a ratio
+        max_distance = int(max_length * (100 - minimum) / 100) + 1
+        distance = self.levenshtein_within(s1, s2, max_distance)
+        if distance > max_distance:
+            return None
+        return ((max_length - distance) / max_length) * 100
+    
     # ============================================================================
     # SOUNDEX & PHONETIC MATCHING
     # ============================================================================
@@ -315,22 +358,50 @@ class NameMatcher:
         Returns:
             Confidence score 0-100
         """
-        scores = []
-        
-        # Normalize names
-        query_normalized = self.normalize_name(query_name)
-        query_clean = self.remove_prefixes_suffixes(query_normalized)
-        
-        main_name = record.get('main_name', '')
-        main_normalized = self.normalize_name(main_name)
-        main_clean = self.remove_prefixes_suffixes(main_normalized)
-        
-        # Apply entity-specific normalization
+        return self.score_features(self.query_features(query_name, entity_type),
+                                   self.record_features(record, entity_type),
+                                   use_phonetic)
+    
+    # ============================================================================
+    # PRECOMPUTED FEATURES
+    # Everything the score needs from one side, computed once: a query is
+    # normalized once per search instead of once per record, and the search
+    # index stores the features of every record (see search_index.py).
+    # ============================================================================
+    
+    def _clean(self, normalized: str, entity_type: str) -> str:
+        clean = self.remove_prefixes_suffixes(normalized)
         if entity_type == 'company':
-            query_clean = self.normalize_company_name(query_clean)
-            main_clean = self.normalize_company_name(main_clean)
+            clean = self.normalize_company_name(clean)
+        return clean
+    
+    def query_features(self, query_name: str, entity_type: str = 'company') -> Tuple:
+        """(normalized, clean, soundex, metaphone) of a query name"""
+        normalized = self.normalize_name(query_name)
+        clean = self._clean(normalized, entity_type)
+        return (normalized, clean, self.soundex(clean), self.metaphone(clean))
+    
+    def record_features(self, record: Dict, entity_type: str = 'company') -> Tuple:
+        """(normalized, clean, normalized aliases, soundex, metaphone) of a record's names"""
+        normalized = self.normalize_name(record.get('main_name') or '')
+        clean = self._clean(normalized, entity_type)
+        aliases = [self.normalize_name(a) for a in record.get('aliases') or []]
+        return (normalized, clean, aliases, self.soundex(clean), self.metaphone(clean))
+    
+    def score_features(self, query: Tuple, record: Tuple, use_phonetic: bool = True,
+                       at_least: float = 0) -> float:
+        """
+        Match score (0-100) from query_features() and record_features().
         
-        aliases = [self.normalize_name(a) for a in record.get('aliases', [])]
+        With at_least (a screening threshold), scores >= at_least are exact,
+        but any lower score may come back as some other value below it: the
+        Levenshtein distance is only computed up to the bound the threshold
+        allows, and the phonetic and token scores (75 at most) are skipped
+        when the threshold is above 75.
+        """
+        scores = []
+        query_normalized, query_clean, soundex_query, metaphone_query = query
+        main_normalized, main_clean, aliases, soundex_main, metaphone_main = record
         
         # -------- EXACT MATCH (Score: 100) --------
         if query_normalized == main_normalized:
@@ -381,28 +452,31 @@ class NameMatcher:
                     scores.append(min(85.0, 65.0 + substring_score * 0.2))
         
         # -------- LEVENSHTEIN DISTANCE (Score: 70-85) --------
-        lev_ratio = self.levenshtein_ratio(query_clean, main_clean)
-        if lev_ratio >= 75:  # Only count if reasonably similar
+        if at_least:
+            lev_ratio = self._ratio_at_least(query_clean, main_clean, max(75, at_least))
+        else:
+            lev_ratio = self.levenshtein_ratio(query_clean, main_clean)
+        if lev_ratio is not None and lev_ratio >= 75:  # Only count if reasonably similar
             scores.append(lev_ratio)
         
         # Check aliases
         for alias in aliases:
-            lev_ratio = self.levenshtein_ratio(query_clean, alias)
-            if lev_ratio >= 75:
+            if at_least:
+                lev_ratio = self._ratio_at_least(query_clean, alias, max(75, at_least / 0.95))
+            else:
+                lev_ratio = self.levenshtein_ratio(query_clean, alias)
+            if lev_ratio is not None and lev_ratio >= 75:
                 scores.append(lev_ratio * 0.95)  # Slightly lower for aliases
         
+        if at_least > 75:
+            return round(max(scores), 2) if scores else 0.0
+        
         # -------- PHONETIC MATCHING (Score: 65-80) --------
         if use_phonetic:
-            soundex_query = self.soundex(query_clean)
-            soundex_main = self.soundex(main_clean)
-            
             if soundex_query and soundex_main and soundex_query == soundex_main:
                 scores.append(75.0)
             
             # Also check Metaphone
-            metaphone_query = self.metaphone(query_clean)
-            metaphone_main = self.metaphone(main_clean)
-            
             if metaphone_query and metaphone_main and metaphone_query == metaphone_main:
                 scores.append(72.0)
         
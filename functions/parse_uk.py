@@ -1,14 +1,10 @@
 import os
 import json
-import xml.etree.ElementTree as ET
 
-
-def local_name(tag):
-    if tag is None:
-        return ''
-    if '}' in tag:
-        return tag.split('}', 1)[1]
-    return tag
+try:
+    from xml_stream import iter_elements, local_name
+except ImportError:  # imported as the `functions` package (tools/parse_all.py)
+    from functions.xml_stream import iter_elements, local_name
 
 
 def text_of(parent, child_name):
@@ -26,123 +22,122 @@ def first_text_in(elem, names):
     return None
 
 
-def parse_uk_to_jsonl(xml_path, out_path):
-    os.makedirs(os.path.dirname(out_path), exist_ok=True)
-    ctx = ET.iterparse(xml_path, events=('start', 'end'))
-    _, root = next(ctx)
-
-    # top-level DateGenerated
+def _parse_names(names_parent):
+    """(main_name, aliases) from a <Names> element; prefers NameType == Primary and Name6."""
+    main_name = None
+    aliases = []
+    for name_node in names_parent:
+        name_type = None
+        parts = {}
+        for nf in name_node:
+            ln = local_name(nf.tag).lower()
+            if ln == 'nametype':
+                name_type = (nf.text or '').strip()
+            else:
+                parts[ln] = (nf.text or '').strip()
+        # prefer Name6 for full-name (UK often stores full string in Name6)
+        full = parts.get('name6') or ' '.join([parts.get(f'name{i}', '') for i in range(1, 7)]).strip()
+        if full:
+            aliases.append(full)
+            if (name_type and name_type.lower() == 'primary') or main_name is None:
+                main_name = full
+    return main_name, aliases
+
+
+def iter_uk_records(xml_path, backend=None):
+    """Yields one record dict per entry (or {'error': ...} for an entry that failed)."""
+
+    # top-level DateGenerated precedes the designations, so it is known before the first record
     file_date = None
-    for ch in root:
-        if local_name(ch.tag).lower() == 'dategenerated':
-            file_date = (ch.text or '').strip()
-            break
-
-    with open(out_path, 'w', encoding='utf-8') as out_f:
-        for event, elem in ctx:
-            if event == 'end' and local_name(elem.tag).lower() == 'designation':
-                try:
-                    rec = {}
-                    rec['sanction_source'] = 'UK'
-
-                    unique_id = text_of(elem, 'UniqueID') or text_of(elem, 'UniqueId')
-                    rec['unique_sanction_id'] = unique_id
-                    rec['id'] = f"UK_{unique_id}" if unique_id else None
-
-                    # entity type
-                    ent = text_of(elem, 'IndividualEntityShip') or text_of(elem, 'IndividualEntity')
-                    if ent:
-                        rec['entity_type'] = 'company' if ent.strip().lower().startswith('entity') else 'individual'
-                    else:
-                        rec['entity_type'] = 'company'
-
-                    # Names: prefer Name with NameType == Primary, extract Name6 if present
-                    main_name = None
-                    aliases = []
-                    names_parent = None
-                    for ch in elem:
-                        if local_name(ch.tag).lower() == 'names':
-                            names_parent = ch
-                            break
-                    if names_parent is not None:
-                        for name_node in names_parent:
-                            # For each <Name>
-                            name_type = None
-                            parts = {}
-                            for nf in name_node:
-                                ln = local_name(nf.tag).lower()
-                                if ln == 'nametype':
-                                    name_type = (nf.text or '').strip()
-                                else:
-                                    parts[ln] = (nf.text or '').strip()
-                            # prefer Name6 for full-name (UK often stores full string in Name6)
-                            full = parts.get('name6') or ' '.join([parts.get(f'name{i}', '') for i in range(1,7)]).strip()
-                            if full:
-                                aliases.append(full)
-                                if (name_type and name_type.lower() == 'primary') or main_name is None:
-                                    main_name = full
-
-                    rec['main_name'] = main_name
-                    # dedupe aliases, keep order
-                    seen = set()
-                    deduped = []
-                    for a in aliases:
-                        if a and a not in seen:
-                            deduped.append(a)
-                            seen.add(a)
-                    rec['aliases'] = deduped
-
-                    # UK program / regime
-                    rec['details'] = {}
-                    regime = text_of(elem, 'RegimeName')
-                    if regime:
-                        rec['details']['program'] = regime
-                    # UK statement of reasons
-                    reason = text_of(elem, 'UKStatementofReasons') or text_of(elem, 'UKStatementOfReasons')
-                    if reason:
-                        rec['details']['remark'] = reason
-                    # file generation date
-                    if file_date:
-                        rec['details']['publish_date'] = file_date
-
+    for elem in iter_elements(xml_path, ('DateGenerated', 'Designation'), backend):
+        if local_name(elem.tag) == 'DateGenerated':
+            if file_date is None:
+                file_date = (elem.text or '').strip()
+            continue
+        try:
+            rec = {}
+            rec['sanction_source'] = 'UK'
+
+            # single pass over the designation's children; `first` keeps the
+            # text of the first child with each (lower-cased) local name
+            first = {}
+            names_parent = None
+            country = None
+            for ch in elem:
+                ln = local_name(ch.tag).lower()
+                if ln not in first:
+                    first[ln] = (ch.text or '').strip()
+                if ln == 'names':
+                    if names_parent is None:
+                        names_parent = ch
+                elif ln == 'addresses' and not country:
                     # country: first Address/AddressCountry
-                    country = None
-                    for ch in elem:
-                        if local_name(ch.tag).lower() == 'addresses':
-                            for addr in ch:
-                                c = text_of(addr, 'AddressCountry')
-                                if c:
-                                    country = c
-                                    break
-                            if country:
-                                break
-                    rec['country'] = country
-
-                    # gender: find <Gender> element anywhere under designation
-                    gender = None
-                    for sub in elem.iter():
-                        if local_name(sub.tag).lower() == 'gender' and (sub.text or '').strip():
-                            gender = (sub.text or '').strip()
+                    for addr in ch:
+                        c = text_of(addr, 'AddressCountry')
+                        if c:
+                            country = c
                             break
-                    rec['gender'] = gender
-
-                    # date of birth: look for <DateOfBirth> or <DateDesignated> (unlikely) or children under Name like DateOfBirth
-                    dob = None
-                    # try direct DateOfBirth
-                    dob = text_of(elem, 'DateOfBirth') or text_of(elem, 'DOB')
-                    if not dob:
-                        # search deeper
-                        for sub in elem.iter():
-                            if local_name(sub.tag).lower() in ('dateofbirth', 'dateofbirthitem') and (sub.text or '').strip():
-                                dob = (sub.text or '').strip()
-                                break
-                    rec['date_of_birth'] = dob
-
-                    out_f.write(json.dumps(rec, ensure_ascii=False) + '\n')
-                except Exception as e:
-                    out_f.write(json.dumps({'error': str(e)}) + '\n')
-                finally:
-                    elem.clear()
+
+            unique_id = first.get('uniqueid')
+            rec['unique_sanction_id'] = unique_id
+            rec['id'] = f"UK_{unique_id}" if unique_id else None
+
+            # entity type
+            ent = first.get('individualentityship') or first.get('individualentity')
+            if ent:
+                rec['entity_type'] = 'company' if ent.strip().lower().startswith('entity') else 'individual'
+            else:
+                rec['entity_type'] = 'company'
+
+            main_name, aliases = _parse_names(names_parent) if names_parent is not None else (None, [])
+            rec['main_name'] = main_name
+            # dedupe aliases, keep order
+            rec['aliases'] = [a for a in dict.fromkeys(aliases) if a]
+
+            # UK program / regime
+            rec['details'] = {}
+            regime = first.get('regimename')
+            if regime:
+                rec['details']['program'] = regime
+            # UK statement of reasons
+            reason = first.get('ukstatementofreasons')
+            if reason:
+                rec['details']['remark'] = reason
+            # file generation date
+            if file_date:
+                rec['details']['publish_date'] = file_date
+
+            rec['country'] = country
+
+            # gender and nested date of birth: one walk over the subtree
+            direct_dob = first.get('dateofbirth') or first.get('dob')
+            gender = None
+            nested_dob = None
+            for sub in elem.iter():
+                ln = local_name(sub.tag).lower()
+                if ln == 'gender':
+                    if gender is None and (sub.text or '').strip():
+                        gender = (sub.text or '').strip()
+                elif ln in ('dateofbirth', 'dateofbirthitem'):
+                    if nested_dob is None and (sub.text or '').strip():
+                        nested_dob = (sub.text or '').strip()
+                else:
+                    continue
+                if gender is not None and (direct_dob or nested_dob is not None):
+                    break
+            rec['gender'] = gender
+            rec['date_of_birth'] = nested_dob if not direct_dob and nested_dob is not None else direct_dob
+
+            yield rec
+        except Exception as e:
+            yield {'error': str(e)}
+
+
+def parse_uk_to_jsonl(xml_path, out_path, backend=None):
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, 'w', encoding='utf-8') as out_f:
+        for rec in iter_uk_records(xml_path, backend):
+            out_f.write(json.dumps(rec, ensure_ascii=False) + '\n')
     return out_path
 
 
@@ -1,25 +1,28 @@
 import functions_framework
 import json
-from google.cloud import firestore
-from google.cloud import logging
 from datetime import datetime
-from flask import jsonify
+from flask import Response, jsonify, stream_with_context
 import re
-import uuid
-import threading
-from matching import match_name, NameMatcher
+from firestore_clients import cloud_db
+from matching import match_name, get_matcher
+from search_index import corpus_size, get_index, loaded_index, match_category, postings_index, query_words
+from token_postings import POSTINGS_QUICK_CANDIDATES, quick_candidates
+
+# Candidates the quick phase scores from the in-memory index, best IDF first
+QUICK_CANDIDATES = 1000
+# Entity fields the quick phase reads from Firestore when it uses the postings
+QUICK_FIELDS = ['id', 'sanction_source', 'main_name', 'aliases', 'entity_type',
+                'country', 'gender', 'date_of_birth', 'details']
 
 # Setup logging
 def log_debug(message):
     print(f"[DEBUG] {message}")
 
-db = None
-
 def get_db():
-    global db
-    if db is None:
-        db = firestore.Client()
-    return db
+    return cloud_db()
+
+SEARCH_MODES = ('sync', 'stream', 'quick')
+
 
 @functions_framework.http
 def search_sanctions(request):
@@ -33,11 +36,16 @@ def search_sanctions(request):
     - program: Filter by program (EU, SDN, NS-PLC, etc)
     - limit: Max results (default 50, max 500)
     - source: Filter by source (EU, UK, US_SDN_SIMPLE, US_NON_SDN_SIMPLE)
+    - mode: 'sync' (default) returns the deep search results in one response;
+      'stream' sends newline-delimited JSON: the quick results first
+      ('status': 'partial'), then the deep results ('status': 'success');
+      'quick' returns only the quick results
     
     Returns:
     - matches: Array of matching sanctions records with confidence scores
     - count: Total number of matches
     - query_time_ms: Query execution time
+    - search_phase: 'quick' or 'deep'
     """
     
     start_time = datetime.now()
@@ -58,6 +66,7 @@ def search_sanctions(request):
     program = request.args.get('program', '').strip().upper()
     source = request.args.get('source', '').upper()
     limit = min(int(request.args.get('limit', 50)), 500)
+    mode = request.args.get('mode', 'sync').strip().lower()
     
     # Validate
     if not query and not country and not program and not source:
@@ -66,58 +75,64 @@ def search_sanctions(request):
             'status': 'invalid_request'
         }), 400
     
-    try:
-        # Generate unique request ID for this search
-        request_id = str(uuid.uuid4())
-        
-        # PHASE 1: Quick search - return immediately with basic matching
-        quick_results = _quick_search(query, entity_type, country, program, source, limit)
-        
-        # Calculate execution time for quick search
-        exec_time_ms = (datetime.now() - start_time).total_seconds() * 1000
-        
-        # Store initial results in Firestore for polling
-        search_doc_ref = get_db().collection('search_requests').document(request_id)
-        search_doc_ref.set({
-            'request_id': request_id,
-            'status': 'partial',
-            'created_at': datetime.now(),
-            'query_params': {
-                'q': query,
-                'type': entity_type,
-                'country': country,
-                'program': program,
-                'source': source,
-                'limit': limit
-            },
-            'quick_results': quick_results,
-            'quick_search_time_ms': round(exec_time_ms, 2)
-        })
-        
-        # PHASE 2: Deep search - start in background thread
-        thread = threading.Thread(
-            target=_deep_search_background,
-            args=(request_id, query, entity_type, country, program, source, limit)
-        )
-        thread.daemon = True
-        thread.start()
+    if mode not in SEARCH_MODES:
+        return jsonify({
+            'error': f"mode must be one of {', '.join(SEARCH_MODES)}",
+            'status': 'invalid_request'
+        }), 400
+    
+    params = (query, entity_type, country, program, source, limit)
+    query_info = {
+        'search': query,
+        'country': country if country else None,
+        'program': program if program else None,
+        'type': entity_type if entity_type else None,
+        'source': source if source else None
+    }
+    
+    def phase_response(phase):
+        phase_start = datetime.now()
+        if phase == 'quick':
+            matches = _quick_search(*params)
+        else:
+            matches = _deep_search(*params)
+        return {
+            'status': 'partial' if phase == 'quick' and mode == 'stream' else 'success',
+            'search_phase': phase,
+            'matches': matches,
+            'count': len(matches),
+            'phase_time_ms': round((datetime.now() - phase_start).total_seconds() * 1000, 2),
+            'query_time_ms': round((datetime.now() - start_time).total_seconds() * 1000, 2),
+            'query': query_info
+        }
+    
+    def error_response(e):
+        return {
+            'status': 'error',
+            'error': str(e),
+            'query_time_ms': round((datetime.now() - start_time).total_seconds() * 1000, 2)
+        }
+    
+    if mode == 'stream':
+        # Each phase is flushed as soon as it is ready; the connection stays
+        # open until the deep phase is done, so nothing is stored for polling
+        def phases():
+            try:
+                for phase in ('quick', 'deep'):
+                    yield json.dumps(phase_response(phase), ensure_ascii=False) + '\n'
+            except Exception as e:
+                yield json.dumps(error_response(e), ensure_ascii=False) + '\n'
         
-        # Return quick results immediately
-        response = {
-            'status': 'partial',
-            'request_id': request_id,
-            'matches': quick_results,
-            'count': len(quick_results),
-            'query_time_ms': round(exec_time_ms, 2),
-            'message': 'Quick search complete. Deep search running in background.',
-            'query': {
-                'search': query,
-                'country': country if country else None,
-                'program': program if program else None,
-                'type': entity_type if entity_type else None,
-                'source': source if source else None
-            }
+        headers = {
+            'Access-Control-Allow-Origin': '*',
+            'Content-Type': 'application/x-ndjson',
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
         }
+        return Response(stream_with_context(phases()), 200, headers)
+    
+    try:
+        response = phase_response('quick' if mode == 'quick' else 'deep')
         
         headers = {
             'Access-Control-Allow-Origin': '*',
@@ -127,49 +142,47 @@ def search_sanctions(request):
         return (json.dumps(response, ensure_ascii=False), 200, headers)
     
     except Exception as e:
-        exec_time_ms = (datetime.now() - start_time).total_seconds() * 1000
-        return jsonify({
-            'status': 'error',
-            'error': str(e),
-            'query_time_ms': round(exec_time_ms, 2)
-        }), 500
+        return jsonify(error_response(e)), 500
 
 
 def _quick_search(query, entity_type, country, program, source, limit):
     """
-    Phase 1: Quick search using indexed search tokens.
+    Phase 1: Quick search over the records that share words with the query.
     Returns results within 1-2 seconds for immediate user feedback.
+    Candidates are ranked by the summed IDF of the query words they contain
+    (so "Bank Rossiya" favours "rossiya" over "bank" without ignoring
+    either) and only the best QUICK_CANDIDATES are scored. Answered from
+    the instance's in-memory index (search_index.py), reloaded when a new
+    version is published; an instance that has not loaded it yet reads the
+    Firestore token postings instead.
     """
     results = []
+    words = query_words(query) if query else []
+    log_debug(f"Query='{query}', Words={words}")
     
-    # Build query with filters
-    q = get_db().collection('sanctions_entities')
-    
-    if source:
-        q = q.where('sanction_source', '==', source)
-    
-    if entity_type:
-        q = q.where('entity_type', '==', entity_type)
-    
-    # Use indexed search if query is present
-    if query:
-        # Generate tokens from query
-        tokens = NameMatcher.generate_search_tokens(query)
-        log_debug(f"Query='{query}', Tokens={tokens}")
-        if tokens:
-            # Use the longest token for array-contains query (most specific)
-            search_token = max(tokens, key=len)
-            log_debug(f"Using search_token='{search_token}'")
-            q = q.where('search_tokens', 'array_contains', search_token)
-    
-    # Limit to 1000 docs for quick scan
-    q = q.limit(1000)
-    
-    docs = list(q.stream())
-    log_debug(f"Found {len(docs)} docs in Firestore")
+    # A cold instance answers from the postings instead of loading the
+    # snapshot; a loaded one goes through get_index to pick up new versions
+    if loaded_index() is None and words:
+        records = quick_candidates(get_db(), words, corpus_size(get_db()), fields=QUICK_FIELDS,
+                                   limit=POSTINGS_QUICK_CANDIDATES)
+        records = [r for r in records
+                   if (not source or r.get('sanction_source') == source)
+                   and (not entity_type or r.get('entity_type') == entity_type)]
+        log_debug(f"Found {len(records)} candidates in token postings")
+    else:
+        # Without any published snapshot (and so without words) nothing is listed
+        index = get_index(get_db()) or postings_index(get_db(), words)
+        if words:
+            positions = index.rank(words, QUICK_CANDIDATES)
+            if source or entity_type:
+                allowed = set(index.candidates(source, entity_type))
+                positions = [i for i in positions if i in allowed]
+        else:
+            positions = index.candidates(source, entity_type)
+        records = [index.records[i] for i in positions]
+        log_debug(f"Found {len(records)} candidates in index {index.version}")
     
-    for doc in docs:
-        data = doc.to_dict()
+    for data in records:
         # Simple scoring for quick phase - just basic substring matching
         score = _simple_score(data, query, country, program)
         
@@ -234,78 +247,56 @@ def _simple_score(record, query, country, program):
     return score
 
 
-def _deep_search_background(request_id, query, entity_type, country, program, source, limit):
+def _deep_search(query, entity_type, country, program, source, limit):
     """
     Phase 2: Deep search with advanced fuzzy matching.
-    Runs in background thread and updates Firestore when complete.
+    Scores every record of the in-memory index that passes the filters,
+    using the index's precomputed name features. Without a published
+    snapshot only the records the token postings rank best for the query
+    are scored.
     """
-    try:
-        start_time = datetime.now()
-        results = []
-        
-        # Query with higher limit for comprehensive search
-        q = get_db().collection('sanctions_entities')
-        
-        if source:
-            q = q.where('sanction_source', '==', source)
-        
-        if entity_type:
-            q = q.where('entity_type', '==', entity_type)
-        
-        # Scan more documents for thorough search
-        q = q.limit(5000)
-        
-        docs = list(q.stream())
-        
-        # Use advanced matching for accurate scoring
-        for doc in docs:
-            data = doc.to_dict()
-            score = _calculate_score(data, query, country, program, source)
-            
-            # Standard threshold (50%) for deep search
-            if score >= 50:
-                results.append({
-                    'id': data.get('id'),
-                    'source': data.get('sanction_source'),
-                    'name': data.get('main_name'),
-                    'aliases': data.get('aliases', []),
-                    'entity_type': data.get('entity_type'),
-                    'country': data.get('country'),
-                    'gender': data.get('gender'),
-                    'dob': data.get('date_of_birth'),
-                    'programs': data.get('details', {}).get('programs', []),
-                    'confidence': round(score, 2)
-                })
-        
-        # Sort by confidence
-        results.sort(key=lambda x: x['confidence'], reverse=True)
-        results = results[:limit]
-        
-        exec_time_ms = (datetime.now() - start_time).total_seconds() * 1000
-        
-        # Update Firestore with deep search results
-        search_doc_ref = get_db().collection('search_requests').document(request_id)
-        search_doc_ref.update({
-            'status': 'success',
-            'deep_results': results,
-            'deep_search_time_ms': round(exec_time_ms, 2),
-            'completed_at': datetime.now(),
-            'total_found': len(results)
-        })
+    results = []
+    index = get_index(get_db()) or postings_index(get_db(), query_words(query) if query else [])
+    matcher = get_matcher()
+    query_features = {}
+    
+    # A record needs a name score of at least this to reach the 50% threshold
+    # with the country/program bonuses, which bounds the Levenshtein work
+    at_least = 50 - (15 if country else 0) - (15 if program else 0)
+    
+    # Use advanced matching for accurate scoring
+    for i in index.candidates(source, entity_type):
+        data = index.records[i]
+        name_score = None
+        if query:
+            category = match_category(data)
+            if category not in query_features:
+                query_features[category] = matcher.query_features(query, category)
+            name_score = matcher.score_features(query_features[category], index.features[i],
+                                                use_phonetic=True, at_least=at_least)
+        score = _calculate_score(data, query, country, program, source, name_score)
         
-    except Exception as e:
-        # Log error and update status
-        try:
-            get_db().collection('search_requests').document(request_id).update({
-                'status': 'error',
-                'error': str(e),
-                'completed_at': datetime.now()
+        # Standard threshold (50%) for deep search
+        if score >= 50:
+            results.append({
+                'id': data.get('id'),
+                'source': data.get('sanction_source'),
+                'name': data.get('main_name'),
+                'aliases': data.get('aliases', []),
+                'entity_type': data.get('entity_type'),
+                'country': data.get('country'),
+                'gender': data.get('gender'),
+                'dob': data.get('date_of_birth'),
+                'programs': data.get('details', {}).get('programs', []),
+                'confidence': round(score, 2)
             })
-        except:
-            pass  # If update fails, silently continue
+    
+    # Sort by confidence
+    results.sort(key=lambda x: x['confidence'], reverse=True)
+    return results[:limit]
 
 
-def _calculate_score(record, query, country, program, source):
+def _calculate_score(record, query, country, program, source, name_score=None):
     """
     Calculate match confidence score (0-100) using advanced fuzzy matching.
     
@@ -314,17 +305,16 @@ def _calculate_score(record, query, country, program, source):
     2. Country match: +10-15 points
     3. Program match: +10-15 points
     4. Source match: +5 points (implicit from filtering)
+    
+    name_score: the name match score if already computed (from precomputed features).
     """
     score = 0
     
     # Name matching (highest priority) - uses advanced fuzzy matching
     if query:
-        entity_type = record.get('entity_type', 'individual').lower()
-        # Determine if entity is company or individual for normalization
-        entity_category = 'company' if entity_type == 'company' else 'individual'
-        
-        # Use advanced matching algorithm
-        name_score = match_name(query, record, entity_type=entity_category, use_phonetic=True)
+        if name_score is None:
+            # Use advanced matching algorithm
+            name_score = match_name(query, record, entity_type=match_category(record), use_phonetic=True)
         score = name_score  # Base score from name matching
     
     # Country matching (bonus)
@@ -0,0 +1,339 @@
+"""
+In-memory sanctions index for the search functions.
+
+The import publishes a snapshot of the whole corpus after every import that
+changed something: the fields a search returns plus the precomputed match
+features of every record (matching.NameMatcher.record_features), gzipped
+JSON in Cloud Storage, and its version in Firestore (search_index/current).
+
+A commit marks the version document (mark_committing) before its first
+entity write, and the publish that follows applies the records it wrote and
+deleted to the previous snapshot. The whole collection is read only when
+there is no usable previous snapshot or it misses another commit as well
+(a publish failed, or the list was committed by hand).
+
+A function instance loads the snapshot into a module global on its first
+search and answers from memory while warm. At most every
+SEARCH_INDEX_CHECK_SECONDS it reads the version document and reloads when a
+newer snapshot has been published. Without a snapshot (before the first
+publish, or if the blob cannot be read) get_index() returns None and the
+searches score only the best-ranked records of the Firestore token postings
+(token_postings.py, postings_index()), which publishing also updates.
+"""
+import bisect
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from matching import NameMatcher, get_matcher
+from token_postings import idf, quick_candidates
+
+SNAPSHOT_BUCKET = os.getenv('SEARCH_INDEX_BUCKET', 'sanction-defender-firebase.appspot.com')
+SNAPSHOT_BLOB = os.getenv('SEARCH_INDEX_BLOB', 'search_index/snapshot.json.gz')
+VERSION_COLLECTION = 'search_index'
+VERSION_DOC = 'current'
+# How long a warm instance trusts its index before re-reading the version document
+VERSION_CHECK_SECONDS = int(os.getenv('SEARCH_INDEX_CHECK_SECONDS', '60'))
+ENTITIES_COLLECTION = 'sanctions_entities'
+# Records a search scores when it has to use the token postings (no snapshot)
+POSTINGS_INDEX_CANDIDATES = int(os.getenv('SEARCH_INDEX_POSTINGS_CANDIDATES', '500'))
+
+# Bumped when the snapshot layout or the match features change; older
+# snapshots are still loaded, with their features recomputed
+INDEX_FORMAT = 1
+FIELDS = ['id', 'sanction_source', 'main_name', 'aliases', 'entity_type',
+          'country', 'gender', 'date_of_birth', 'programs']
+
+
+def match_category(record):
+    """The entity_type the searches score a record as ('company' or 'individual')"""
+    return 'company' if (record.get('entity_type') or '').lower() == 'company' else 'individual'
+
+
+def _row(data):
+    """Snapshot row of a sanctions_entities document"""
+    row = [data.get(field) for field in FIELDS[:-1]]
+    row.append((data.get('details') or {}).get('programs', []))
+    return row
+
+
+def _record(row):
+    """The row as the document fields the searches read"""
+    record = dict(zip(FIELDS[:-1], row))
+    record['details'] = {'programs': row[-1]}
+    if record['aliases'] is None:
+        record['aliases'] = []
+    return record
+
+
+def _words(normalized):
+    """Words of a normalized name, as NameMatcher.generate_search_tokens splits it"""
+    cleaned = ''.join(c for c in normalized if c.isalnum() or c.isspace())
+    return [word for word in cleaned.split() if len(word) >= 2]
+
+
+def query_words(query):
+    """The distinct words of a search query, in order"""
+    return list(dict.fromkeys(_words(NameMatcher.normalize_name(query))))
+
+
+class SearchIndex:
+    """Records, their match features and a word index for the quick search."""
+
+    def __init__(self, rows, features=None, version=None):
+        self.version = version
+        self.records = [_record(row) for row in rows]
+        matcher = get_matcher()
+        if features is None:
+            features = [matcher.record_features(r, match_category(r)) for r in self.records]
+        self.features = features
+        self.loaded_at = datetime.utcnow()
+
+        positions = {}
+        for i, (normalized, _, aliases, _, _) in enumerate(features):
+            for name in [normalized] + list(aliases):
+                for word in _words(name):
+                    positions.setdefault(word, set()).add(i)
+        self._positions = positions
+        self._words = sorted(positions)
+
+    def __len__(self):
+        return len(self.records)
+
+    @classmethod
+    def from_documents(cls, docs, version=None):
+        return cls([_row(doc.to_dict()) for doc in docs], version=version)
+
+    @classmethod
+    def from_snapshot(cls, data):
+        snapshot = json.loads(gzip.decompress(data))
+        features = snapshot['features'] if snapshot.get('format') == INDEX_FORMAT else None
+        return cls(snapshot['records'], features, snapshot.get('version'))
+
+    def updated(self, changes, version=None):
+        """
+        This index with `changes` applied: (kind, document) pairs as the
+        import wrote them, kind 'removed' for a deleted id. Rows stay in id
+        order, as a scan of the collection returns them, and only the
+        changed records' features are computed.
+        """
+        rows = {record['id']: (_row(record), features)
+                for record, features in zip(self.records, self.features)}
+        for kind, data in changes:
+            if kind == 'removed':
+                rows.pop(data['id'], None)
+            else:
+                rows[data['id']] = (_row(data), None)
+
+        matcher = get_matcher()
+        kept, features = [], []
+        for record_id in sorted(rows):
+            row, record_features = rows[record_id]
+            if record_features is None:
+                record = _record(row)
+                record_features = matcher.record_features(record, match_category(record))
+            kept.append(row)
+            features.append(record_features)
+        return SearchIndex(kept, features, version)
+
+    def to_snapshot(self):
+        return gzip.compress(json.dumps({
+            'format': INDEX_FORMAT,
+            'version': self.version,
+            'created_at': datetime.utcnow().isoformat(),
+            'fields': FIELDS,
+            'records': [_row(r) for r in self.records],
+            'features': self.features,
+        }, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def token_positions(self, token):
+        """
+        Records whose search_tokens contain `token`: a word of one of their
+        names equals it or, for tokens of 3+ characters, starts with it.
+        """
+        if len(token) < 3:
+            return set(self._positions.get(token, ()))
+        found = set()
+        i = bisect.bisect_left(self._words, token)
+        while i < len(self._words) and self._words[i].startswith(token):
+            found.update(self._positions[self._words[i]])
+            i += 1
+        return found
+
+    def rank(self, words, limit):
+        """
+        Positions of the records containing any of `words` (as a word or,
+        for 3+ characters, a word prefix), by the summed IDF of the words
+        they contain, then corpus order; at most `limit`.
+        """
+        scores = {}
+        for word in words:
+            positions = self.token_positions(word)
+            weight = idf(len(self.records), len(positions))
+            for i in positions:
+                scores[i] = scores.get(i, 0.0) + weight
+        return sorted(scores, key=lambda i: (-scores[i], i))[:limit]
+
+    def postings(self):
+        """{word: sorted ids of the records with that word}, for token_postings"""
+        ids = [record.get('id') for record in self.records]
+        return {word: sorted(ids[i] for i in positions) for word, positions in self._positions.items()}
+
+    def candidates(self, source=None, entity_type=None, token=None):
+        """Positions (in corpus order) of the records matching the search's filters"""
+        positions = range(len(self.records)) if token is None else sorted(self.token_positions(token))
+        records = self.records
+        return [i for i in positions
+                if (not source or records[i].get('sanction_source') == source)
+                and (not entity_type or records[i].get('entity_type') == entity_type)]
+
+
+def _entity_docs(db):
+    return db.collection(ENTITIES_COLLECTION).select(FIELDS[:-1] + ['details']).stream()
+
+
+def _published(pointer):
+    return bool(pointer and pointer.get('version'))
+
+
+def mark_committing(db, import_batch_id=None):
+    """
+    Records, before a commit writes sanctions_entities, that the published
+    snapshot lacks it; the next publish_snapshot() builds on the snapshot
+    only when this is the one commit it lacks.
+    """
+    ref = db.collection(VERSION_COLLECTION).document(VERSION_DOC)
+    doc = ref.get()
+    committing = (doc.to_dict() or {}).get('committing', []) if doc.exists else []
+    ref.set({'committing': committing + [import_batch_id]}, merge=True)
+
+
+def publish_snapshot(db, version, changes=None, bucket=None):
+    """
+    Builds the snapshot, updates the token postings against the previous
+    one, uploads it and points search_index/current at it. Called by the
+    import after a commit with `changes`, the (kind, document) pairs it
+    wrote (SearchIndex.updated); without them, or without a previous
+    snapshot lacking only this commit, the snapshot is built from the whole
+    sanctions_entities collection. Returns the number of records.
+    """
+    from google.cloud import storage
+    import token_postings
+
+    started = time.perf_counter()
+    doc = db.collection(VERSION_COLLECTION).document(VERSION_DOC).get()
+    pointer = doc.to_dict() if doc.exists else None
+    previous = None
+    if _published(pointer):
+        try:
+            previous = SearchIndex.from_snapshot(_download_snapshot(pointer))
+        except Exception as e:
+            print(f"[{datetime.now()}] [WARN] Previous snapshot unreadable, building from the collection: {e}")
+
+    if previous is not None and changes is not None and pointer.get('committing') == [version]:
+        index = previous.updated(changes, version)
+        built_from = f"snapshot {pointer.get('version')}"
+    else:
+        index = SearchIndex.from_documents(_entity_docs(db), version)
+        built_from = ENTITIES_COLLECTION
+    previous_postings = previous.postings() if previous is not None and pointer.get('postings') else None
+    token_postings.write_postings(db, index.postings(), previous_postings, version)
+
+    data = index.to_snapshot()
+    blob = storage.Client().bucket(bucket or SNAPSHOT_BUCKET).blob(SNAPSHOT_BLOB)
+    blob.upload_from_string(data, content_type='application/gzip')
+    db.collection(VERSION_COLLECTION).document(VERSION_DOC).set({
+        'version': version,
+        'bucket': bucket or SNAPSHOT_BUCKET,
+        'blob': SNAPSHOT_BLOB,
+        'records': len(index),
+        'bytes': len(data),
+        'postings': True,
+        'published_at': datetime.utcnow().isoformat(),
+    })
+    print(f"[{datetime.now()}] [OK] Search index {version} published from {built_from}: {len(index)} records, "
+          f"{len(data)} bytes in {time.perf_counter() - started:.1f}s")
+    return len(index)
+
+
+def _download_snapshot(pointer):
+    from google.cloud import storage
+    blob = storage.Client().bucket(pointer.get('bucket') or SNAPSHOT_BUCKET).blob(pointer.get('blob') or SNAPSHOT_BLOB)
+    return blob.download_as_bytes()
+
+
+_index = None
+_checked_at = None
+_lock = threading.Lock()
+
+
+def loaded_index():
+    """The instance's index if one has been loaded, without loading or checking it"""
+    return _index
+
+
+def corpus_size(db):
+    """Records in the published index (for IDF without a loaded index)"""
+    doc = db.collection(VERSION_COLLECTION).document(VERSION_DOC).get()
+    return (doc.to_dict() or {}).get('records') if doc.exists else None
+
+
+def postings_index(db, words, limit=POSTINGS_INDEX_CANDIDATES):
+    """
+    An index of only the records the token postings rank best for `words`
+    (token_postings.quick_candidates), for searches while get_index() has
+    no snapshot to load.
+    """
+    if not words:
+        return SearchIndex([], version='postings')
+    records = quick_candidates(db, words, corpus_size(db), fields=FIELDS[:-1] + ['details'], limit=limit)
+    return SearchIndex([_row(record) for record in records], version='postings')
+
+
+def _load(db, pointer):
+    """The published snapshot, or None when there is none or it cannot be read"""
+    version = pointer.get('version') if pointer else None
+    if not _published(pointer):
+        print(f"[{datetime.now()}] [WARN] No search index snapshot published, searching the token postings")
+        return None
+    started = time.perf_counter()
+    try:
+        index = SearchIndex.from_snapshot(_download_snapshot(pointer))
+    except Exception as e:
+        print(f"[{datetime.now()}] [WARN] Could not load search index snapshot {version}: {e}")
+        return None
+    index.version = version
+    print(f"[{datetime.now()}] [OK] Search index {version} loaded from snapshot: "
+          f"{len(index)} records in {time.perf_counter() - started:.1f}s")
+    return index
+
+
+def get_index(db):
+    """
+    The instance's index, reloaded when a newer version has been published.
+    None while no snapshot could be loaded; the callers then search
+    postings_index(). A newer snapshot that cannot be read leaves the
+    loaded one in use until the next check.
+    """
+    global _index, _checked_at
+    if _checked_at is not None and time.monotonic() - _checked_at < VERSION_CHECK_SECONDS:
+        return _index
+    with _lock:
+        if _checked_at is not None and time.monotonic() - _checked_at < VERSION_CHECK_SECONDS:
+            return _index
+        doc = db.collection(VERSION_COLLECTION).document(VERSION_DOC).get()
+        pointer = doc.to_dict() if doc.exists else None
+        version = pointer.get('version') if pointer else None
+        if _index is None or version != _index.version:
+            _index = _load(db, pointer) or _index
+        _checked_at = time.monotonic()
+        return _index
+
+
+if __name__ == '__main__':
+    # Publish a snapshot of the current collection, e.g. before the first import
+    from google.cloud import firestore
+    publish_snapshot(firestore.Client(), f"manual_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}")
@@ -0,0 +1,154 @@
+"""
+Change entries of an import session (ImportSessionLogger.log_entries),
+stored packed and compressed:
+
+    import_sessions/{id}/entries/{n}       {'chunk', 'first_entry', 'count',
+                                            'encoding', 'data'}
+    import_sessions/{id}/entries/index     {'format', 'encoding', 'total',
+                                            'chunks': [{'chunk', 'first_entry', 'count',
+                                                        'counts': {source: {change_type: n}}}]}
+
+'data' is the zlib-compressed JSON list of up to ENTRY_CHUNK_SIZE entries
+in log order, below ENTRY_CHUNK_BYTES (a chunk that would not fit is split).
+The index is written last and lists, per chunk, its entry counts by source
+and change type, so read_entries() serves a page (optionally of one change
+type or source) with the index plus only the chunk documents holding it.
+
+Sessions saved before the index existed have no index document; their
+entries (chunks of plain 'entries' lists, or one document per entry) are
+read in full and paged in memory.
+"""
+import json
+import os
+import zlib
+
+from batch_writer import BatchWriter
+
+ENTRIES_COLLECTION = 'entries'
+INDEX_DOCUMENT = 'index'
+ENTRIES_FORMAT = 1
+ENCODING = 'zlib+json'
+ENTRY_CHUNK_SIZE = int(os.getenv('SESSION_ENTRY_CHUNK_SIZE', '500'))
+# Compressed bytes per chunk document (Firestore's limit is 1 MiB)
+ENTRY_CHUNK_BYTES = 900 * 1024
+MAX_PAGE_SIZE = 1000
+
+
+def encode(entries):
+    return zlib.compress(json.dumps(entries, ensure_ascii=False, default=str).encode('utf-8'), 6)
+
+
+def decode(chunk_data):
+    """The entries of a stored chunk document, compressed or not"""
+    if 'data' in chunk_data:
+        return json.loads(zlib.decompress(bytes(chunk_data['data'])).decode('utf-8'))
+    return chunk_data.get('entries', [])
+
+
+def _packed(entries, first_entry):
+    """(first_entry, entries, data) groups whose compressed data fits a document"""
+    data = encode(entries)
+    if len(data) <= ENTRY_CHUNK_BYTES:
+        return [(first_entry, entries, data)]
+    if len(entries) == 1:
+        raise ValueError(f"Change entry {first_entry} is {len(data)} bytes compressed, "
+                         f"above the {ENTRY_CHUNK_BYTES} bytes of a chunk")
+    half = len(entries) // 2
+    return _packed(entries[:half], first_entry) + _packed(entries[half:], first_entry + half)
+
+
+def pack(entries):
+    """Chunk documents and the index document for `entries`"""
+    groups = []
+    for start in range(0, len(entries), ENTRY_CHUNK_SIZE):
+        groups.extend(_packed(entries[start:start + ENTRY_CHUNK_SIZE], start))
+
+    chunks = []
+    summaries = []
+    for n, (first_entry, group, data) in enumerate(groups):
+        counts = {}
+        for entry in group:
+            by_type = counts.setdefault(str(entry.get('source')), {})
+            change_type = str(entry.get('change_type'))
+            by_type[change_type] = by_type.get(change_type, 0) + 1
+        chunks.append({'chunk': n, 'first_entry': first_entry, 'count': len(group),
+                       'encoding': ENCODING, 'data': data})
+        summaries.append({
+            'chunk': n,
+            'first_entry': first_entry,
+            'count': len(group),
+            'counts': counts,
+        })
+    index = {'format': ENTRIES_FORMAT, 'encoding': ENCODING, 'total': len(entries), 'chunks': summaries}
+    return chunks, index
+
+
+def write_entries(db, session_ref, entries):
+    """Stores `entries` under `session_ref`; returns the index document"""
+    chunks, index = pack(entries)
+    entries_coll = session_ref.collection(ENTRIES_COLLECTION)
+    with BatchWriter(db) as writer:
+        for chunk in chunks:
+            writer.set(entries_coll.document(str(chunk['chunk'])), chunk)
+    # The index makes the chunks visible to read_entries(), so it goes last
+    entries_coll.document(INDEX_DOCUMENT).set(index)
+    return index
+
+
+def _matches(entry, change_type, source):
+    return ((change_type is None or entry.get('change_type') == change_type)
+            and (source is None or entry.get('source') == source))
+
+
+def _legacy_entries(session_ref):
+    entries = []
+    for doc in session_ref.collection(ENTRIES_COLLECTION).stream():
+        data = doc.to_dict()
+        if 'entries' in data or 'data' in data:
+            entries.extend((data.get('first_entry', 0), i, e) for i, e in enumerate(decode(data)))
+        else:
+            entries.append((0, 0, data))
+    entries.sort(key=lambda item: (item[0], item[1], item[2].get('timestamp') or ''))
+    return [entry for _, _, entry in entries]
+
+
+def read_entries(db, session_ref, offset=0, limit=100, change_type=None, source=None):
+    """
+    One page of a session's change entries, in log order, optionally only
+    of one change type ('ADD', 'UPDATE', 'REMOVE') and/or source:
+    {'entries', 'total', 'offset', 'limit', 'chunks_read'}. 'total' counts
+    the matching entries.
+    """
+    offset = max(0, int(offset))
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    entries_coll = session_ref.collection(ENTRIES_COLLECTION)
+    index = entries_coll.document(INDEX_DOCUMENT).get()
+
+    if not index.exists:
+        matching = [e for e in _legacy_entries(session_ref) if _matches(e, change_type, source)]
+        return {'entries': matching[offset:offset + limit], 'total': len(matching),
+                'offset': offset, 'limit': limit, 'chunks_read': None}
+
+    # Matching entries per chunk, from the index alone
+    wanted = []
+    total = 0
+    for summary in index.to_dict().get('chunks', []):
+        count = sum(n for chunk_source, by_type in summary.get('counts', {}).items()
+                    if source is None or chunk_source == source
+                    for chunk_type, n in by_type.items()
+                    if change_type is None or chunk_type == change_type)
+        if count and total + count > offset and total < offset + limit:
+            wanted.append((summary['chunk'], total))
+        total += count
+
+    page = []
+    if wanted:
+        refs = [entries_coll.document(str(chunk)) for chunk, _ in wanted]
+        chunks = {snap.id: snap.to_dict() for snap in db.get_all(refs) if snap.exists}
+        skip = offset - wanted[0][1]
+        for chunk, _ in wanted:
+            matching = [e for e in decode(chunks.get(str(chunk), {})) if _matches(e, change_type, source)]
+            page.extend(matching[skip:])
+            skip = 0
+    return {'entries': page[:limit], 'total': total, 'offset': offset, 'limit': limit,
+            'chunks_read': len(wanted)}
@@ -0,0 +1,138 @@
+"""
+Per-source manifests of the stored sanctions_entities: id -> record hash
+(SanctionsDataComparator.compute_record_hash), so an import can diff a list
+without reading every stored document of it.
+
+    source_manifests/{source}               {'format', 'state', 'count', 'shards',
+                                             'import_batch_id', 'updated_at'}
+    source_manifests/{source}/shards/{n}    {'source', 'hashes': {id: hash}}
+
+An id lives in shard crc32(id) % shards, with about MANIFEST_SHARD_SIZE ids
+per shard, so a commit that changes a few records rewrites only the shards
+holding them.
+
+The manifest is written by the commit of the list, after its entity writes:
+the header is set to state 'committing' before the first entity write and
+back to 'ready' with the new shards. A manifest that is missing, of another
+format or not 'ready' (an interrupted commit) is not used; the import then
+reads the stored documents as before and writes a fresh manifest.
+
+Anything that writes sanctions_entities outside the two importers must
+rebuild the manifest of the lists it touched:
+    python functions/source_manifest.py EU UK
+"""
+import math
+import os
+import sys
+import zlib
+from datetime import datetime
+
+from batch_writer import BatchWriter
+
+MANIFESTS_COLLECTION = 'source_manifests'
+SHARDS_COLLECTION = 'shards'
+ENTITIES_COLLECTION = 'sanctions_entities'
+# Ids per shard document (about 45 bytes each, well below the 1 MiB limit)
+MANIFEST_SHARD_SIZE = int(os.getenv('SOURCE_MANIFEST_SHARD_SIZE', '4000'))
+MANIFEST_FORMAT = 1
+
+
+def shard_count(count):
+    return max(1, math.ceil(count / MANIFEST_SHARD_SIZE))
+
+
+def shard_of(record_id, shards):
+    return zlib.crc32(record_id.encode('utf-8')) % shards
+
+
+def split(hashes, shards):
+    parts = [{} for _ in range(shards)]
+    for record_id, record_hash in hashes.items():
+        parts[shard_of(record_id, shards)][record_id] = record_hash
+    return parts
+
+
+def load_manifest(db, source):
+    """id -> hash of the stored records of `source`, or None when there is no usable manifest."""
+    header_ref = db.collection(MANIFESTS_COLLECTION).document(source)
+    header = header_ref.get()
+    if not header.exists:
+        return None
+    meta = header.to_dict()
+    if meta.get('format') != MANIFEST_FORMAT or meta.get('state') != 'ready':
+        print(f"[{datetime.now()}] [WARN] Manifest of {source} not usable "
+              f"(format {meta.get('format')}, state {meta.get('state')})")
+        return None
+
+    refs = [header_ref.collection(SHARDS_COLLECTION).document(str(n)) for n in range(meta.get('shards', 0))]
+    hashes = {}
+    for snap in db.get_all(refs) if refs else []:
+        if not snap.exists:
+            print(f"[{datetime.now()}] [WARN] Manifest of {source} is missing shard {snap.id}")
+            return None
+        hashes.update(snap.to_dict().get('hashes', {}))
+    if len(hashes) != meta.get('count'):
+        print(f"[{datetime.now()}] [WARN] Manifest of {source} has {len(hashes)} ids, header says {meta.get('count')}")
+        return None
+    return hashes
+
+
+def mark_committing(db, source, import_batch_id=None):
+    """Invalidates the manifest until write_manifest() completes for this commit."""
+    db.collection(MANIFESTS_COLLECTION).document(source).set(
+        {'state': 'committing', 'import_batch_id': import_batch_id,
+         'updated_at': datetime.utcnow().isoformat()}, merge=True)
+
+
+def write_manifest(db, source, hashes, previous=None, import_batch_id=None):
+    """
+    Stores `hashes` (id -> hash of every stored record of `source`) as the
+    manifest. `previous` is the manifest the diff was loaded from; shards
+    whose ids and hashes did not change are then not rewritten. Returns the
+    number of documents written.
+    """
+    header_ref = db.collection(MANIFESTS_COLLECTION).document(source)
+    header = header_ref.get()
+    old_shards = header.to_dict().get('shards', 0) if header.exists else 0
+    shards = shard_count(len(hashes))
+    parts = split(hashes, shards)
+    old_parts = split(previous, shards) if previous is not None and old_shards == shards else None
+
+    with BatchWriter(db) as writer:
+        for n, part in enumerate(parts):
+            if old_parts is None or old_parts[n] != part:
+                writer.set(header_ref.collection(SHARDS_COLLECTION).document(str(n)),
+                           {'source': source, 'hashes': part})
+        for n in range(shards, old_shards):
+            writer.delete(header_ref.collection(SHARDS_COLLECTION).document(str(n)))
+    header_ref.set({
+        'format': MANIFEST_FORMAT,
+        'state': 'ready',
+        'count': len(hashes),
+        'shards': shards,
+        'import_batch_id': import_batch_id,
+        'updated_at': datetime.utcnow().isoformat(),
+    })
+    writes = writer.writes + 1
+    print(f"[{datetime.now()}] [OK] Manifest of {source}: {len(hashes)} ids in {shards} shards, "
+          f"{writes} documents written")
+    return writes
+
+
+def rebuild_manifest(db, source, comparator):
+    """Recomputes the manifest of `source` from its stored documents."""
+    query = db.collection(ENTITIES_COLLECTION).where('sanction_source', '==', source)
+    hashes = {}
+    for doc in query.stream():
+        data = doc.to_dict()
+        hashes[data.get('id')] = comparator.compute_record_hash(data)
+    mark_committing(db, source)
+    return write_manifest(db, source, hashes)
+
+
+if __name__ == '__main__':
+    # Rebuild the manifests of the given lists from sanctions_entities
+    from import_sanctions_two_stage import SanctionsDataComparator, get_db
+    module_db = get_db()
+    for name in sys.argv[1:] or ['EU', 'UK', 'US_SDN_SIMPLE', 'US_NON_SDN_SIMPLE']:
+        rebuild_manifest(module_db, name, SanctionsDataComparator(module_db))
@@ -0,0 +1,75 @@
+"""
+Tests for the batch screening prefilter: every record a name scores the
+threshold or more against survives it, so the screening results equal
+scoring each name against every record.
+"""
+
+import os
+import random
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from batch_screening_api import _candidates, _screen_name, prefilter_cutoff
+from matching import get_matcher
+from search_index import SearchIndex, _row
+
+WORDS = ['ivan', 'petrov', 'sber', 'bank', 'rossiya', 'al', 'rashid', 'oil', 'trading', 'llc',
+         'ooo', 'kim', 'jong', 'haddad', 'shipping', 'garcia', 'jose', 'holdings', 'ltd', 'of']
+
+
+def _name(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+
+
+def _variant(rng, name):
+    """The name with a few edits, words dropped or added"""
+    chars = list(name)
+    for _ in range(rng.randint(0, 3)):
+        chars[rng.randrange(len(chars))] = rng.choice('aeiou ')
+    variant = ''.join(chars).strip() or name
+    if rng.random() < 0.3:
+        variant = f"{variant} {rng.choice(WORDS)}"
+    return variant
+
+
+def _index(rng, count):
+    records = []
+    for i in range(count):
+        name = _name(rng)
+        records.append({'id': f'R{i}', 'sanction_source': 'EU', 'main_name': name,
+                        'entity_type': rng.choice(['company', 'individual']),
+                        'aliases': [_variant(rng, name) for _ in range(rng.randint(0, 3))],
+                        'details': {'programs': []}})
+    return SearchIndex([_row(r) for r in records]), records
+
+
+def test_cutoff():
+    assert prefilter_cutoff(75) is None and prefilter_cutoff(60) is None
+    cutoffs = [prefilter_cutoff(t) for t in range(76, 101)]
+    assert cutoffs == sorted(cutoffs) and all(0 < c < 100 for c in cutoffs)
+    print("PASS | cutoff")
+
+
+def test_same_matches():
+    rng = random.Random(7)
+    index, records = _index(rng, 300)
+    matcher = get_matcher()
+    for entity_type in ['company', 'individual']:
+        positions = index.candidates(entity_type=entity_type)
+        names = [_variant(rng, rng.choice(records)['main_name']) for _ in range(60)]
+        aliases = [alias for record in records for alias in record['aliases']]
+        names += [rng.choice(aliases) for _ in range(10)]
+        queries = [matcher.query_features(name, entity_type) for name in names]
+        for threshold in [70, 80, 85, 90, 95]:
+            candidates = _candidates(queries, threshold, index, positions)
+            for query, kept in zip(queries, candidates):
+                every = [i for i in positions
+                         if matcher.score_features(query, index.features[i], at_least=threshold) >= threshold]
+                assert set(every) <= set(kept), (query, threshold)
+                assert _screen_name(query, threshold, index, kept) == _screen_name(query, threshold, index, positions)
+    print("PASS | same matches")
+
+
+if __name__ == '__main__':
+    test_cutoff()
+    test_same_matches()
@@ -0,0 +1,95 @@
+"""
+Tests for BatchWriter: batches of at most 500, every operation committed,
+transient failures retried and other errors raised to the caller.
+"""
+
+import os
+import sys
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import batch_writer
+from batch_writer import BatchWriter
+
+
+class _Conflict(Exception):
+    pass
+
+
+class _Batch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref, data):
+        self.ops.append((ref, data))
+
+    def delete(self, ref):
+        self.ops.append((ref, None))
+
+    def commit(self):
+        assert len(self.ops) <= 500
+        with self.db.lock:
+            self.db.commits += 1
+            if self.db.fail_every and (self.db.commits - 1) % self.db.fail_every == 0:
+                raise self.db.error('contention')
+            for ref, data in self.ops:
+                if data is None:
+                    self.db.store.pop(ref, None)
+                else:
+                    self.db.store[ref] = data
+
+
+class _DB:
+    def __init__(self, fail_every=0, error=_Conflict):
+        self.store = {}
+        self.commits = 0
+        self.fail_every = fail_every
+        self.error = error
+        self.lock = threading.Lock()
+
+    def batch(self):
+        return _Batch(self)
+
+
+def test_batches():
+    db = _DB()
+    db.store['gone'] = {}
+    with BatchWriter(db, workers=4) as writer:
+        for i in range(1201):
+            writer.set(str(i), {'i': i})
+        writer.delete('gone')
+    stats = writer.stats()
+    assert len(db.store) == 1201 and 'gone' not in db.store
+    assert stats['writes'] == 1202 and stats['batches'] == 3 and stats['retries'] == 0
+    print("PASS | batches")
+
+
+def test_retry():
+    batch_writer.RETRYABLE_ERRORS = (_Conflict,)
+    batch_writer.BACKOFF_SECONDS = 0.001
+    db = _DB(fail_every=2)
+    with BatchWriter(db, workers=2) as writer:
+        for i in range(1500):
+            writer.set(str(i), {'i': i})
+    assert len(db.store) == 1500
+    assert writer.stats()['retries'] >= 1
+    print("PASS | retry")
+
+
+def test_error_raised():
+    db = _DB(fail_every=1, error=ValueError)
+    try:
+        with BatchWriter(db) as writer:
+            for i in range(10):
+                writer.set(str(i), {'i': i})
+    except ValueError:
+        print("PASS | error raised")
+        return
+    raise AssertionError('ValueError not raised')
+
+
+if __name__ == '__main__':
+    test_batches()
+    test_retry()
+    test_error_raised()
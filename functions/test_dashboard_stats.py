@@ -0,0 +1,47 @@
+"""
+Tests for the pre-aggregated dashboard statistics: counts and history
+folded in per session, and ETag matching.
+"""
+
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dashboard_stats import HISTORY_SIZE, apply_session, empty_stats, etag, etag_matches
+
+
+def _session(n, by_source=None, status='completed_successfully'):
+    return {'import_session_id': f'import_{n:02d}', 'timestamp_end': f'2025-01-{n:02d}T04:00:00',
+            'status': status, 'total_changes': n, 'statistics': {'by_source': by_source or {}}}
+
+
+def test_apply_session():
+    stats = empty_stats()
+    apply_session(stats, _session(1, {'EU': {'after_update': 10}, 'UK': {'after_update': 5}}), latest=True)
+    # A later import of only EU keeps the UK count
+    apply_session(stats, _session(2, {'EU': {'after_update': 12}}), latest=True)
+    apply_session(stats, _session(3, status='SKIPPED_UNCHANGED'))
+    assert stats['source_counts']['EU'] == 12 and stats['source_counts']['UK'] == 5
+    assert stats['latest_import']['import_session_id'] == 'import_02'
+    assert [s['id'] for s in stats['import_history']] == ['import_03', 'import_02', 'import_01']
+    assert stats['version'] == 3
+    for n in range(4, 20):
+        apply_session(stats, _session(n))
+    assert len(stats['import_history']) == HISTORY_SIZE
+    assert stats['import_history'][0]['id'] == 'import_19'
+    print("PASS | apply session")
+
+
+def test_etag():
+    tag = etag(1, '2025-01-01')
+    assert tag == etag(1, '2025-01-01') and tag != etag(2, '2025-01-01')
+    assert etag_matches(tag, tag)
+    assert etag_matches(f'"other", {tag}', tag)
+    assert etag_matches(tag[2:], tag)
+    assert not etag_matches(None, tag) and not etag_matches('"other"', tag)
+    print("PASS | etag")
+
+
+if __name__ == '__main__':
+    test_apply_session()
+    test_etag()
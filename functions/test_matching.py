@@ -270,6 +270,37 @@ def test_edge_cases():
             print(f"FAIL | {test['description']}: ERROR - {str(e)}")
 
 
+def test_threshold_scoring():
+    """Scores at or above a screening threshold are unchanged by the bounded scorer"""
+    matcher = NameMatcher()
+    
+    print("\n=== THRESHOLD SCORING ===")
+    for s1, s2 in [("kitten", "sitting"), ("putin", "putim"), ("", "abc"), ("sberbank", "sbernak")]:
+        distance = matcher.levenshtein_distance(s1, s2)
+        for bound in range(5):
+            expected = distance if distance <= bound else bound + 1
+            result = matcher.levenshtein_within(s1, s2, bound)
+            status = "PASS" if result == expected else "FAIL"
+            print(f"{status} | within('{s1}', '{s2}', {bound}) = {result} (expected: {expected})")
+    
+    records = [
+        {'main_name': 'Sberbank', 'aliases': ['Sberbank of Russia']},
+        {'main_name': 'Vladimir Putin', 'aliases': ['Vladimir Vladimirovich Putin']},
+        {'main_name': 'Rosneft Oil Company', 'aliases': []},
+    ]
+    for query in ['Sbernak', 'Vladimir Putim', 'Rosneft', 'Putin', 'Gazprom']:
+        for record in records:
+            for entity_type in ['company', 'individual']:
+                features = (matcher.query_features(query, entity_type), matcher.record_features(record, entity_type))
+                full = matcher.score_features(*features)
+                for threshold in [50, 75, 80, 90]:
+                    bounded = matcher.score_features(*features, at_least=threshold)
+                    ok = bounded == full if full >= threshold else bounded < threshold
+                    if not ok:
+                        print(f"FAIL | '{query}' vs '{record['main_name']}' at {threshold}: {bounded} (full: {full})")
+    print("PASS | bounded scores checked")
+
+
 def run_all_tests():
     """Run all test suites"""
     print("=" * 60)
@@ -285,6 +316,7 @@ def run_all_tests():
     test_token_overlap()
     test_comprehensive_matching()
     test_edge_cases()
+    test_threshold_scoring()
     
     print("\n" + "=" * 60)
     print("TEST SUITE COMPLETE")
@@ -0,0 +1,114 @@
+"""
+Tests for the in-memory search index: token lookup as search_tokens
+array-contains, snapshot round trip, snapshots updated with an import's
+changes, and scores from precomputed features.
+"""
+
+import gzip
+import json
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from matching import NameMatcher, get_matcher, match_name
+from search_index import SearchIndex, match_category, query_words
+from token_postings import rank
+
+
+class _Doc:
+    def __init__(self, data):
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+DOCS = [
+    {'id': 'EU-1', 'sanction_source': 'EU', 'main_name': 'Sberbank', 'entity_type': 'company',
+     'aliases': ['Sberbank of Russia'], 'country': 'Russia', 'details': {'programs': ['UKR']}},
+    {'id': 'UK-2', 'sanction_source': 'UK', 'main_name': 'José García', 'entity_type': 'individual',
+     'aliases': [], 'country': 'Spain', 'details': {}},
+    {'id': 'US-3', 'sanction_source': 'US_SDN_SIMPLE', 'main_name': 'Rosneft Oil Company',
+     'entity_type': 'company', 'aliases': None, 'country': '', 'details': {'programs': []}},
+]
+
+
+def _payload(index):
+    snapshot = json.loads(gzip.decompress(index.to_snapshot()))
+    snapshot.pop('created_at')
+    return snapshot
+
+
+def test_token_lookup():
+    """A record is a candidate exactly when its search_tokens contain the token"""
+    index = SearchIndex.from_documents(_Doc(d) for d in DOCS)
+    for token in ['sber', 'sberbank', 'of', 'gar', 'garcia', 'jo', 'oil', 'rus', 'russian', 'xyz']:
+        expected = set()
+        for i, doc in enumerate(DOCS):
+            tokens = set()
+            for text in [doc['main_name']] + (doc['aliases'] or []):
+                tokens.update(NameMatcher.generate_search_tokens(text))
+            if token in tokens:
+                expected.add(i)
+        assert index.token_positions(token) == expected, token
+    assert index.candidates(source='EU', token='sber') == [0]
+    assert index.candidates(entity_type='company') == [0, 2]
+    print("PASS | token lookup")
+
+
+def test_snapshot_round_trip():
+    index = SearchIndex.from_documents((_Doc(d) for d in DOCS), version='v1')
+    loaded = SearchIndex.from_snapshot(index.to_snapshot())
+    assert loaded.version == 'v1'
+    assert loaded.records == index.records
+    assert [list(f[:2]) + [list(f[2])] + list(f[3:]) for f in index.features] == loaded.features
+    print("PASS | snapshot round trip")
+
+
+def test_updated_snapshot():
+    """A snapshot updated with the committed changes equals one built from the changed collection"""
+    changed = dict(DOCS[0], main_name='Sberbank PJSC')
+    added = {'id': 'EU-0', 'sanction_source': 'EU', 'main_name': 'Bank Rossiya', 'entity_type': 'company',
+             'aliases': ['Rossiya'], 'country': 'Russia', 'details': {'programs': ['UKR']}}
+    previous = SearchIndex.from_snapshot(SearchIndex.from_documents((_Doc(d) for d in DOCS), version='v1').to_snapshot())
+    updated = previous.updated([('updated', changed), ('removed', {'id': 'UK-2'}), ('added', added)], 'v2')
+    rebuilt = SearchIndex.from_documents((_Doc(d) for d in [added, changed, DOCS[2]]), version='v2')
+    assert [r['id'] for r in updated.records] == ['EU-0', 'EU-1', 'US-3']
+    assert _payload(updated) == _payload(rebuilt)
+    assert updated.postings() == rebuilt.postings()
+    print("PASS | updated snapshot")
+
+
+def test_feature_scores():
+    """Scores from the stored features equal match_name on the record"""
+    index = SearchIndex.from_snapshot(SearchIndex.from_documents(_Doc(d) for d in DOCS).to_snapshot())
+    matcher = get_matcher()
+    for query in ['sberbank', 'Sbernak', 'jose garcia', 'Garcia', 'rosneft', 'Resneft oil']:
+        for record, features in zip(index.records, index.features):
+            category = match_category(record)
+            expected = match_name(query, record, entity_type=category)
+            assert matcher.score_features(matcher.query_features(query, category), features) == expected
+    print("PASS | feature scores")
+
+
+def test_idf_ranking():
+    """Records with the rarer query word come first; postings rank the same ids"""
+    docs = [{'id': f'B-{i}', 'main_name': f'Bank {i}', 'entity_type': 'company'} for i in range(5)]
+    docs.append({'id': 'R-1', 'main_name': 'Bank Rossiya', 'entity_type': 'company'})
+    docs.append({'id': 'R-2', 'main_name': 'Rossiya Airlines', 'entity_type': 'company'})
+    index = SearchIndex.from_documents(_Doc(d) for d in docs)
+    words = query_words('Bank Rossiya')
+    assert words == ['bank', 'rossiya']
+    ranked = [index.records[i]['id'] for i in index.rank(words, 3)]
+    assert ranked == ['R-1', 'R-2', 'B-0'], ranked
+    postings = {word: ids for word, ids in index.postings().items() if word in words}
+    assert rank(postings, len(docs), 3) == ranked
+    print("PASS | IDF ranking")
+
+
+if __name__ == '__main__':
+    test_token_lookup()
+    test_snapshot_round_trip()
+    test_updated_snapshot()
+    test_feature_scores()
+    test_idf_ranking()
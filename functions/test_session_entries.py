@@ -0,0 +1,160 @@
+"""
+Tests for the packed session entries: chunks compressed below the document
+limit, pages (filtered or not) equal to slicing the full log while reading
+only the chunks holding them, and sessions stored before the index.
+"""
+
+import os
+import random
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import session_entries
+from session_entries import decode, pack, read_entries, write_entries
+
+
+class _Snap:
+    def __init__(self, path, data):
+        self.id = path.rsplit('/', 1)[-1]
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _Ref:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def collection(self, name):
+        return _Coll(self.db, f'{self.path}/{name}')
+
+    def set(self, data):
+        self.db.store[self.path] = data
+
+    def get(self):
+        self.db.reads += 1
+        return _Snap(self.path, self.db.store.get(self.path))
+
+
+class _Coll:
+    def __init__(self, db, path):
+        self.db = db
+        self.path = path
+
+    def document(self, doc_id):
+        return _Ref(self.db, f'{self.path}/{doc_id}')
+
+    def stream(self):
+        for path, data in list(self.db.store.items()):
+            if path.rsplit('/', 1)[0] == self.path:
+                self.db.reads += 1
+                yield _Snap(path, data)
+
+
+class _Batch:
+    def __init__(self, db):
+        self.db = db
+        self.ops = []
+
+    def set(self, ref, data):
+        self.ops.append((ref, data))
+
+    def commit(self):
+        for ref, data in self.ops:
+            ref.set(data)
+
+
+class _DB:
+    def __init__(self):
+        self.store = {}
+        self.reads = 0
+
+    def collection(self, name):
+        return _Coll(self, name)
+
+    def batch(self):
+        return _Batch(self)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+
+def _entries(n, seed=0):
+    rng = random.Random(seed)
+    entries = []
+    for i in range(n):
+        change_type = rng.choice(['ADD', 'ADD', 'UPDATE', 'REMOVE'])
+        entry = {'timestamp': f'2025-01-01T04:00:{i:06d}', 'change_type': change_type,
+                 'entity_id': f'E{i}', 'entity_name': f'Name {i}',
+                 'source': rng.choice(['EU', 'UK', 'US_SDN_SIMPLE'])}
+        if change_type == 'REMOVE':
+            entry['deleted_data'] = {'id': f'E{i}', 'aliases': [f'Alias {i} {j}' for j in range(5)]}
+        entries.append(entry)
+    return entries
+
+
+def test_pack():
+    entries = _entries(1234)
+    chunks, index = pack(entries)
+    assert len(chunks) == 3 and index['total'] == 1234
+    assert [e for chunk in chunks for e in decode(chunk)] == entries
+    assert sum(n for c in index['chunks'] for by_type in c['counts'].values() for n in by_type.values()) == 1234
+
+    # A chunk above the byte limit is split
+    limit = session_entries.ENTRY_CHUNK_BYTES
+    session_entries.ENTRY_CHUNK_BYTES = 2000
+    try:
+        chunks, index = pack(entries)
+    finally:
+        session_entries.ENTRY_CHUNK_BYTES = limit
+    assert len(chunks) > 3 and all(len(chunk['data']) <= 2000 for chunk in chunks)
+    assert [e for chunk in chunks for e in decode(chunk)] == entries
+    assert [c['first_entry'] for c in index['chunks']] == [chunk['first_entry'] for chunk in chunks]
+    print("PASS | pack")
+
+
+def test_pages():
+    db = _DB()
+    entries = _entries(2600, seed=1)
+    session = db.collection('import_sessions').document('import_1')
+    write_entries(db, session, entries)
+    assert len(db.store) == 7  # 6 chunks and the index
+
+    for change_type, source in [(None, None), ('REMOVE', None), (None, 'UK'), ('UPDATE', 'EU')]:
+        matching = [e for e in entries
+                    if change_type in (None, e['change_type']) and source in (None, e['source'])]
+        for offset, limit in [(0, 100), (480, 50), (len(matching) - 10, 100), (len(matching) + 5, 10)]:
+            db.reads = 0
+            page = read_entries(db, session, offset, limit, change_type, source)
+            assert page['total'] == len(matching)
+            assert page['entries'] == matching[offset:offset + limit], (change_type, source, offset)
+            assert db.reads == 1 + page['chunks_read']
+    db.reads = 0
+    read_entries(db, session, 480, 50)
+    assert db.reads == 3  # the index and chunks 0 and 1
+    print("PASS | pages")
+
+
+def test_legacy_sessions():
+    db = _DB()
+    entries = _entries(30, seed=2)
+    session = db.collection('import_sessions').document('import_old')
+    for i, entry in enumerate(entries):
+        session.collection('entries').document(f'auto{i:03d}').set(entry)
+    page = read_entries(db, session, 5, 10, change_type='ADD')
+    assert page['entries'] == [e for e in entries if e['change_type'] == 'ADD'][5:15]
+
+    session = db.collection('import_sessions').document('import_chunked')
+    session.collection('entries').document('0').set({'chunk': 0, 'first_entry': 0, 'count': 20, 'entries': entries[:20]})
+    session.collection('entries').document('1').set({'chunk': 1, 'first_entry': 20, 'count': 10, 'entries': entries[20:]})
+    assert read_entries(db, session, 15, 10)['entries'] == entries[15:25]
+    print("PASS | legacy sessions")
+
+
+if __name__ == '__main__':
+    test_pack()
+    test_pages()
+    test_legacy_sessions()
@@ -0,0 +1,127 @@
+"""
+Token postings in Firestore for the quick search of a cold instance.
+
+Every word of a record's normalized names (as search_index splits them) has
+a document token_postings/{token} with its document frequency and shard
+count, and the ids of the records containing it in
+token_postings/{token}/shards/{n} (at most POSTING_SHARD_SIZE ids each).
+They replace the search_tokens array every entity document used to carry
+with all word prefixes, and its array-contains index.
+
+The postings are written when the search index snapshot is published
+(search_index.publish_snapshot), only for the tokens whose ids changed
+since the previous snapshot.
+
+A quick search without a loaded index reads the postings of all query
+words in one batched get, ranks ids by the summed IDF of the words they
+contain and fetches only the best POSTINGS_QUICK_CANDIDATES documents.
+"""
+import math
+import os
+from datetime import datetime
+
+POSTINGS_COLLECTION = 'token_postings'
+SHARDS_COLLECTION = 'shards'
+ENTITIES_COLLECTION = 'sanctions_entities'
+# Ids per shard document (kept well below Firestore's 1 MiB document limit)
+POSTING_SHARD_SIZE = int(os.getenv('TOKEN_POSTINGS_SHARD_SIZE', '5000'))
+# Entity documents a postings-based quick search fetches
+POSTINGS_QUICK_CANDIDATES = int(os.getenv('POSTINGS_QUICK_CANDIDATES', '200'))
+# Writes per batch (Firestore maximum)
+WRITE_BATCH_SIZE = 500
+
+
+def idf(total, df):
+    return math.log(1 + total / df) if df else 0.0
+
+
+def rank(postings, total, limit):
+    """
+    postings: {token: ids}. Ids ordered by the summed IDF of the tokens
+    that contain them (ties by id), at most `limit`.
+    """
+    scores = {}
+    for token, ids in postings.items():
+        weight = idf(total, len(ids))
+        for record_id in ids:
+            scores[record_id] = scores.get(record_id, 0.0) + weight
+    return sorted(scores, key=lambda record_id: (-scores[record_id], record_id))[:limit]
+
+
+def _shards(ids):
+    return [ids[i:i + POSTING_SHARD_SIZE] for i in range(0, len(ids), POSTING_SHARD_SIZE)] or [[]]
+
+
+def write_postings(db, postings, previous=None, version=None):
+    """
+    Writes the token documents and shards of `postings` ({token: sorted ids})
+    whose ids differ from `previous` (the postings of the last publish; None
+    writes everything) and deletes the tokens that disappeared. Returns the
+    number of document writes.
+    """
+    previous = previous or {}
+    coll = db.collection(POSTINGS_COLLECTION)
+    writes = 0
+    batch, pending = db.batch(), 0
+
+    def add(op, ref, data=None):
+        nonlocal batch, pending, writes
+        if op == 'set':
+            batch.set(ref, data)
+        else:
+            batch.delete(ref)
+        pending += 1
+        writes += 1
+        if pending >= WRITE_BATCH_SIZE:
+            batch.commit()
+            batch, pending = db.batch(), 0
+
+    for token, ids in postings.items():
+        old_ids = previous.get(token)
+        if old_ids == ids:
+            continue
+        token_ref = coll.document(token)
+        shards = _shards(ids)
+        add('set', token_ref, {'df': len(ids), 'shards': len(shards), 'version': version})
+        for n, shard in enumerate(shards):
+            add('set', token_ref.collection(SHARDS_COLLECTION).document(str(n)), {'token': token, 'ids': shard})
+        for n in range(len(shards), len(_shards(old_ids or []))):
+            add('delete', token_ref.collection(SHARDS_COLLECTION).document(str(n)))
+
+    for token in previous.keys() - postings.keys():
+        token_ref = coll.document(token)
+        for n in range(len(_shards(previous[token]))):
+            add('delete', token_ref.collection(SHARDS_COLLECTION).document(str(n)))
+        add('delete', token_ref)
+
+    if pending:
+        batch.commit()
+    print(f"[{datetime.now()}] [OK] Token postings: {writes} documents written "
+          f"({len(postings)} tokens, {len(previous)} before)")
+    return writes
+
+
+def quick_candidates(db, words, total, fields=None, limit=None):
+    """
+    Entity documents (dicts) of the best-ranked ids for the query `words`:
+    one batched get for the token documents, one for their shards, one for
+    the entities. `total` is the corpus size the IDF is computed against.
+    """
+    coll = db.collection(POSTINGS_COLLECTION)
+    token_docs = {snap.id: snap.to_dict() for snap in db.get_all([coll.document(w) for w in set(words)])
+                  if snap.exists}
+    shard_refs = [coll.document(token).collection(SHARDS_COLLECTION).document(str(n))
+                  for token, doc in token_docs.items() for n in range(doc.get('shards', 1))]
+    postings = {}
+    for snap in db.get_all(shard_refs) if shard_refs else []:
+        if snap.exists:
+            data = snap.to_dict()
+            postings.setdefault(data['token'], []).extend(data.get('ids', []))
+
+    ids = rank(postings, total or sum(len(ids) for ids in postings.values()), limit or POSTINGS_QUICK_CANDIDATES)
+    if not ids:
+        return []
+    entities = db.collection(ENTITIES_COLLECTION)
+    snaps = db.get_all([entities.document(record_id) for record_id in ids], field_paths=fields)
+    by_id = {snap.id: snap.to_dict() for snap in snaps if snap.exists}
+    return [by_id[record_id] for record_id in ids if record_id in by_id]
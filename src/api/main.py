@@ -12,6 +12,8 @@ from src.api.routes import decision
 from src.api.routes import search_log
 from src.api.routes import single_screening
 from src.api.routes import kpi
+from src.api.routes import bulk_screening
+from src.api.routes import change_log
 from src.services.updater import run_daily_update
 import logging
 
@@ -40,6 +42,13 @@ async def lifespan(app: FastAPI):
         name="Update Sanctions from Official Sources",
         replace_existing=True
     )
+    # Pick up batches interrupted by a previous shutdown (runs once, now)
+    scheduler.add_job(
+        batch.resume_incomplete_batches,
+        id="resume_incomplete_batches",
+        name="Resume interrupted batch screenings",
+        replace_existing=True
+    )
     scheduler.start()
     logger.info("Scheduler started. Daily update scheduled for 03:00 AM.")
 
@@ -67,6 +76,8 @@ app.include_router(decision.router, prefix="/api/v1", tags=["Decision"])
 app.include_router(search_log.router, prefix="/api/v1", tags=["SearchLog"])
 app.include_router(single_screening.router, prefix="/api/v1", tags=["SingleScreening"])
 app.include_router(kpi.router, prefix="/api/v1/kpi", tags=["KPI"])
+app.include_router(bulk_screening.router, prefix="/api/v1/screen", tags=["BulkScreening"])
+app.include_router(change_log.router, prefix="/api/v1", tags=["ChangeLog"])
 
 @app.post("/api/v1/admin/trigger-update")
 async def trigger_update(background_tasks: BackgroundTasks):
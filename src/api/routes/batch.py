@@ -1,14 +1,17 @@
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session
 from src.db.session import get_db, SessionLocal
-from src.db.models import ScreeningBatch, ScreeningResult, ScreeningMatch, MatchStatus
+from src.db.models import ScreeningBatch, ScreeningBatchFile, ScreeningResult, ScreeningMatch, MatchStatus
 from src.api.services.engine import search_engine
 import pandas as pd
 import io
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional, Any
+from sqlalchemy import or_
 from pydantic import BaseModel
+from collections import Counter
 import logging
+import os
 import traceback
 
 logger = logging.getLogger(__name__)
@@ -82,95 +85,175 @@ def read_csv_robust(content: bytes) -> pd.DataFrame:
         
     raise last_error or Exception("Could not read CSV file")
 
-def process_batch_task(batch_id: int, file_content: bytes, filename: str):
+def extract_names(file_content: bytes, filename: str) -> List[str]:
+    """
+    Reads the uploaded file and returns the names to screen, in file order.
+    """
+    if filename.endswith(".csv"):
+        df = read_csv_robust(file_content)
+    else:
+        df = pd.read_excel(io.BytesIO(file_content))
+    
+    # Assume the column with names is the first one or named Name/name
+    # Normalize column names to lower case for search
+    cols_lower = [str(c).lower() for c in df.columns]
+    
+    name_col_idx = 0
+    if "name" in cols_lower:
+        name_col_idx = cols_lower.index("name")
+    elif "naziv" in cols_lower: # Slovenian/Croatian for Name
+        name_col_idx = cols_lower.index("naziv")
+    elif "ime" in cols_lower:   # Slovenian/Croatian for Name
+        name_col_idx = cols_lower.index("ime")
+        
+    name_col = df.columns[name_col_idx]
+    return df[name_col].astype(str).tolist()
+
+# Rows screened and committed per checkpoint
+CHECKPOINT_CHUNK_SIZE = 2000
+
+# A PROCESSING batch whose heartbeat is older than this is considered abandoned
+# and may be claimed by another worker (keep it well above the time of one chunk)
+BATCH_LEASE_SECONDS = int(os.getenv("BATCH_LEASE_SECONDS", "600"))
+
+def claim_batch(db: Session, batch_id: int, include_failed: bool = False) -> bool:
+    """
+    Atomically takes the processing lease of a batch: a single conditional UPDATE
+    that only succeeds while the batch is PROCESSING with a stale (or no)
+    heartbeat, or FAILED when `include_failed`. Returns whether this worker got it;
+    concurrent claimers of the same batch see zero rows updated.
+    """
+    now = datetime.utcnow()
+    claimable = (ScreeningBatch.status == "PROCESSING") & or_(
+        ScreeningBatch.heartbeat_at.is_(None),
+        ScreeningBatch.heartbeat_at < now - timedelta(seconds=BATCH_LEASE_SECONDS)
+    )
+    if include_failed:
+        claimable = claimable | (ScreeningBatch.status == "FAILED")
+    claimed = db.query(ScreeningBatch).filter(ScreeningBatch.id == batch_id, claimable).update(
+        {"status": "PROCESSING", "heartbeat_at": now}, synchronize_session=False
+    )
+    db.commit()
+    return claimed == 1
+
+def _save_chunk(db: Session, batch: ScreeningBatch, offset: int, results: List[dict]):
+    """
+    Writes the results of one chunk (starting at file row `offset`), advances
+    the batch checkpoint and renews its lease. The caller commits, so results, counters and checkpoint
+    land in the same transaction.
+    """
+    # Idempotency: skip rows already stored for this batch (e.g. a chunk that was
+    # committed just before a crash, before the checkpoint could be read back)
+    done = {
+        r[0] for r in db.query(ScreeningResult.row_index).filter(
+            ScreeningResult.batch_id == batch.id,
+            ScreeningResult.row_index >= offset,
+            ScreeningResult.row_index < offset + len(results)
+        )
+    }
+
+    status_counts = Counter()
+    
+    # 1. Prepare all Result objects
+    pending = []
+    for i, res in enumerate(results):
+        if offset + i in done:
+            continue
+        status = res["match_status"]
+        status_counts[status] += 1
+        
+        db_result = ScreeningResult(
+            batch_id=batch.id,
+            row_index=offset + i,
+            input_name=res["input_name"],
+            match_status=status
+        )
+        pending.append((db_result, res))
+    
+    # 2. Bulk insert Results and flush to get IDs
+    db.add_all([r for r, _ in pending])
+    db.flush() 
+    
+    # 3. Prepare all Match objects using the new IDs
+    db_matches = []
+    for db_result, res in pending:
+        if res.get("matches"):
+            for m in res["matches"]:
+                db_match = ScreeningMatch(
+                    screening_result_id=db_result.id,
+                    sanction_id=m["record"].id,
+                    match_score=m["score"],
+                    match_name=m["matched_name"]
+                )
+                db_matches.append(db_match)
+    
+    # 4. Bulk insert Matches
+    if db_matches:
+        db.bulk_save_objects(db_matches)
+
+    flagged = sum(n for status, n in status_counts.items() if status != MatchStatus.NO_MATCH)
+    batch.flagged_count = (batch.flagged_count or 0) + flagged
+    batch.increment_status_counts(status_counts)
+    batch.checkpoint_offset = offset + len(results)
+    batch.heartbeat_at = datetime.utcnow()
+
+def process_batch_task(batch_id: int, file_content: Optional[bytes] = None, filename: Optional[str] = None):
     """
     Background task to process the file and save results.
     Creates its own DB session to avoid using a closed request session.
+
+    Results are committed chunk by chunk together with the batch checkpoint, so a
+    batch interrupted by a crash or restart continues from its last committed
+    chunk. Called without file content, the file stored at upload is used. The
+    caller holds the batch's lease (see claim_batch); each checkpoint renews it.
     """
     db = SessionLocal()
     try:
         logger.info(f"Starting background processing for batch {batch_id}")
         
-        # 1. Read File
-        if filename.endswith(".csv"):
-            df = read_csv_robust(file_content)
-        else:
-            df = pd.read_excel(io.BytesIO(file_content))
-        
-        # Assume the column with names is the first one or named Name/name
-        # Normalize column names to lower case for search
-        cols_lower = [str(c).lower() for c in df.columns]
-        
-        name_col_idx = 0
-        if "name" in cols_lower:
-            name_col_idx = cols_lower.index("name")
-        elif "naziv" in cols_lower: # Slovenian/Croatian for Name
-            name_col_idx = cols_lower.index("naziv")
-        elif "ime" in cols_lower:   # Slovenian/Croatian for Name
-            name_col_idx = cols_lower.index("ime")
-            
-        name_col = df.columns[name_col_idx]
-        names = df[name_col].astype(str).tolist()
-
-        # 2. Run Search
-        results = search_engine.batch_search(names)
-
-        # 3. Save Results
         # Re-query batch to attach to session
         batch = db.query(ScreeningBatch).filter(ScreeningBatch.id == batch_id).first()
         if not batch:
             logger.error(f"Batch {batch_id} not found in background task")
             return
 
-        flagged_count = 0
-        
-        # 1. Prepare all Result objects
-        db_results = []
-        for res in results:
-            status = res["match_status"]
-            if status != MatchStatus.NO_MATCH:
-                flagged_count += 1
-            
-            db_result = ScreeningResult(
-                batch_id=batch.id,
-                input_name=res["input_name"],
-                match_status=status
-            )
-            db_results.append(db_result)
-        
-        # 2. Bulk insert Results and flush to get IDs
-        db.add_all(db_results)
-        db.flush() 
-        
-        # 3. Prepare all Match objects using the new IDs
-        db_matches = []
-        for i, res in enumerate(results):
-            # db_results[i] corresponds to results[i]
-            parent_id = db_results[i].id
-            
-            if res.get("matches"):
-                for m in res["matches"]:
-                    db_match = ScreeningMatch(
-                        screening_result_id=parent_id,
-                        sanction_id=m["record"].id,
-                        match_score=m["score"],
-                        match_name=m["matched_name"]
-                    )
-                    db_matches.append(db_match)
-        
-        # 4. Bulk insert Matches
-        if db_matches:
-            db.bulk_save_objects(db_matches)
+        # 1. Keep the upload until the batch completes so it can be resumed
+        stored = db.query(ScreeningBatchFile).filter(ScreeningBatchFile.batch_id == batch_id).first()
+        if file_content is None:
+            if not stored:
+                raise ValueError(f"No stored file for batch {batch_id}; cannot resume")
+            file_content, filename = stored.content, stored.filename
+        elif not stored:
+            db.add(ScreeningBatchFile(batch_id=batch_id, filename=filename or batch.filename, content=file_content))
+            db.commit()
+        filename = filename or batch.filename
+
+        # 2. Read File
+        names = extract_names(file_content, filename)
+
+        start = batch.checkpoint_offset or 0
+        if start:
+            logger.info(f"Resuming batch {batch_id} at row {start} of {len(names)}")
+
+        # 3. Run Search and Save Results, one committed chunk at a time
+        for offset in range(start, len(names), CHECKPOINT_CHUNK_SIZE):
+            chunk = names[offset:offset + CHECKPOINT_CHUNK_SIZE]
+            results = search_engine.batch_search(chunk)
+            _save_chunk(db, batch, offset, results)
+            db.commit()
+            logger.info(f"Batch {batch_id}: checkpoint at row {batch.checkpoint_offset}")
         
         batch.status = "COMPLETED"
-        batch.flagged_count = flagged_count
+        batch.flagged_count = batch.flagged_count or 0
+        db.query(ScreeningBatchFile).filter(ScreeningBatchFile.batch_id == batch_id).delete(synchronize_session=False)
         db.commit()
-        logger.info(f"Batch {batch_id} completed. Flagged: {flagged_count}")
+        logger.info(f"Batch {batch_id} completed. Flagged: {batch.flagged_count}")
         
     except Exception as e:
         logger.error(f"Error processing batch {batch_id}: {e}")
-        # Re-query to avoid detached instance issues
+        # Roll back the partial chunk and keep the checkpoint so the batch can be resumed
         try:
+            db.rollback()
             batch = db.query(ScreeningBatch).filter(ScreeningBatch.id == batch_id).first()
             if batch:
                 batch.status = "FAILED"
@@ -180,6 +263,31 @@ def process_batch_task(batch_id: int, file_content: bytes, filename: str):
     finally:
         db.close()
 
+def resume_incomplete_batches():
+    """
+    Resumes batches left PROCESSING by a previous run (process died mid-batch).
+    Scheduled once at startup, after the search engine has loaded. Every worker
+    runs it, so each batch is claimed first (claim_batch): batches another
+    worker is still processing, or claims first, are left alone.
+    """
+    db = SessionLocal()
+    try:
+        batch_ids = [
+            b.id for b in db.query(ScreeningBatch.id)
+            .join(ScreeningBatchFile, ScreeningBatchFile.batch_id == ScreeningBatch.id)
+            .filter(ScreeningBatch.status == "PROCESSING")
+        ]
+        for batch_id in batch_ids:
+            # Claimed one at a time, just before processing, so batches this
+            # worker has not reached yet stay claimable by the others
+            if not claim_batch(db, batch_id):
+                logger.info(f"Batch {batch_id} is being processed by another worker; not resuming")
+                continue
+            logger.info(f"Resuming interrupted batch {batch_id}")
+            process_batch_task(batch_id)
+    finally:
+        db.close()
+
 @router.post("/upload", response_model=BatchResponse)
 async def upload_batch(
     background_tasks: BackgroundTasks,
@@ -197,7 +305,8 @@ async def upload_batch(
         batch = ScreeningBatch(
             filename=file.filename,
             total_records=0,
-            status="PROCESSING"
+            status="PROCESSING",
+            heartbeat_at=datetime.utcnow()  # this worker holds the lease
         )
         db.add(batch)
         db.commit()
@@ -238,6 +347,22 @@ async def upload_batch(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/{batch_id}/resume", response_model=BatchResponse)
+def resume_batch(batch_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """Re-runs a FAILED or interrupted batch from its last checkpoint."""
+    batch = db.query(ScreeningBatch).filter(ScreeningBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if batch.status == "COMPLETED":
+        raise HTTPException(status_code=409, detail="Batch already completed")
+    if not db.query(ScreeningBatchFile).filter(ScreeningBatchFile.batch_id == batch_id).first():
+        raise HTTPException(status_code=409, detail="Uploaded file is no longer stored; re-upload the batch")
+    if not claim_batch(db, batch_id, include_failed=True):
+        raise HTTPException(status_code=409, detail="Batch is being processed")
+    db.refresh(batch)
+    background_tasks.add_task(process_batch_task, batch.id)
+    return batch
+
 @router.get("/", response_model=List[BatchResponse])
 def list_batches(db: Session = Depends(get_db)):
     return db.query(ScreeningBatch).order_by(ScreeningBatch.uploaded_at.desc()).all()
@@ -245,12 +370,13 @@ def list_batches(db: Session = Depends(get_db)):
 
 # Paginated and filtered batch results
 from fastapi import Query
-from sqlalchemy import or_
+from sqlalchemy.orm import selectinload
 
 class PaginatedBatchDetailResponse(BaseModel):
     batch: BatchResponse
     results: List[ScreeningResultResponse]
     total: int
+    next_cursor: Optional[int] = None
 
 @router.get("/{batch_id}", response_model=PaginatedBatchDetailResponse)
 def get_batch_results(
@@ -258,23 +384,89 @@ def get_batch_results(
     db: Session = Depends(get_db),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
+    cursor: Optional[int] = Query(None, ge=0, description="Return results with id > cursor (keyset pagination)"),
     status: Optional[str] = Query(None),
     search: Optional[str] = Query(None)
 ):
+    """
+    Returns one page of results for a batch.
+
+    Pass `cursor` (the `next_cursor` of the previous page) to page by keyset over
+    (batch_id, id); this costs the same at any depth. `offset` is kept for
+    existing clients and is ignored when a cursor is given.
+    """
     batch = db.query(ScreeningBatch).filter(ScreeningBatch.id == batch_id).first()
     if not batch:
         raise HTTPException(status_code=404, detail="Batch not found")
 
+    if status:
+        try:
+            status = MatchStatus(status)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
+
     q = db.query(ScreeningResult).filter(ScreeningResult.batch_id == batch_id)
     if status:
         q = q.filter(ScreeningResult.match_status == status)
     if search:
+        # Backed by the pg_trgm GIN index on Postgres (see alembic migrations)
         q = q.filter(ScreeningResult.input_name.ilike(f"%{search}%"))
-    total = q.count()
-    results = q.order_by(ScreeningResult.id).offset(offset).limit(limit).all()
+
+    # Totals come from the per-batch counters; only free-text search needs a COUNT.
+    if search:
+        total = q.count()
+    elif status:
+        total = batch.status_count(status)
+    else:
+        total = batch.total_records or 0
+
+    q = q.options(selectinload(ScreeningResult.matches)).order_by(ScreeningResult.id)
+    if cursor is not None:
+        q = q.filter(ScreeningResult.id > cursor)
+    else:
+        q = q.offset(offset)
+    results = q.limit(limit).all()
+    next_cursor = results[-1].id if len(results) == limit else None
 
     return {
         "batch": batch,
         "results": results,
-        "total": total
+        "total": total,
+        "next_cursor": next_cursor
     }
+
+
+# Streaming exports
+from fastapi.responses import StreamingResponse
+from src.api.services.batch_export import stream_csv, stream_xlsx, XLSX_MEDIA_TYPE
+
+def _export_batch(batch_id: int, status: Optional[str], db: Session):
+    batch = db.query(ScreeningBatch).filter(ScreeningBatch.id == batch_id).first()
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    if status:
+        try:
+            status = MatchStatus(status)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid status: {status}")
+    return batch, status
+
+@router.get("/{batch_id}/export/csv")
+def export_batch_csv(batch_id: int, status: Optional[str] = Query(None), db: Session = Depends(get_db)):
+    """Streams all results of a batch, joined with matches and sanction details, as CSV."""
+    batch, status = _export_batch(batch_id, status, db)
+    return StreamingResponse(
+        stream_csv(batch.id, status),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=batch_{batch.id}_results.csv"}
+    )
+
+@router.get("/{batch_id}/export/xlsx")
+def export_batch_xlsx(batch_id: int, status: Optional[str] = Query(None), db: Session = Depends(get_db)):
+    """Streams all results of a batch, joined with matches and sanction details, as XLSX."""
+    batch, status = _export_batch(batch_id, status, db)
+    return StreamingResponse(
+        stream_xlsx(batch.id, status),
+        media_type=XLSX_MEDIA_TYPE,
+        headers={"Content-Disposition": f"attachment; filename=batch_{batch.id}_results.xlsx"}
+    )
@@ -0,0 +1,266 @@
+from fastapi import APIRouter, Request, Query
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from src.db.session import SessionLocal
+from src.db.models import MatchStatus
+from src.api.services.engine import search_engine
+from src.api.services.search_logs import create_search_log
+from src.api.search_log_schemas import SearchLogCreate
+from typing import AsyncIterator, Dict, List, Optional
+import codecs
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Names screened per batch_search call; also the most input held in memory at once
+BULK_CHUNK_SIZE = 500
+
+# Largest input item (NDJSON line or array element), in characters; a longer
+# or unterminated one ends the stream instead of being buffered further
+BULK_MAX_ITEM_CHARS = 64 * 1024
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body generator keeps reading the request body.
+
+    Starlette normally listens for disconnects on `receive` while streaming,
+    which would swallow the request body messages the generator is waiting for.
+    Here a disconnect surfaces instead as ClientDisconnect from request.stream()
+    or as OSError on send.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+
+
+class BulkItemError(ValueError):
+    """An input item that could not be parsed; reported inline, does not stop the stream."""
+
+
+def _to_item(raw, index: int) -> Dict:
+    """Accepts either a bare name string or {"name", "type", "dob", "country", "id"}."""
+    if isinstance(raw, str):
+        raw = {"name": raw}
+    if not isinstance(raw, dict) or not str(raw.get("name") or "").strip():
+        raise BulkItemError(f"Item {index}: expected a name string or an object with a 'name'")
+    entity_type = (raw.get("type") or "").strip().lower() or None
+    if entity_type and entity_type not in ("individual", "company"):
+        raise BulkItemError(f"Item {index}: type must be 'individual' or 'company'")
+    return {
+        "index": index,
+        "id": raw.get("id"),
+        "name": str(raw["name"]).strip(),
+        "type": entity_type,
+        "dob": (str(raw.get("dob")).strip() or None) if raw.get("dob") else None,
+        "country": (str(raw.get("country")).strip() or None) if raw.get("country") else None,
+    }
+
+
+async def _iter_ndjson(request: Request) -> AsyncIterator:
+    """Yields one decoded JSON value per non-empty line of the request body."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for data in request.stream():
+        buffer += decoder.decode(data)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                yield line
+        if len(buffer) > BULK_MAX_ITEM_CHARS:
+            raise BulkItemError(f"Line longer than {BULK_MAX_ITEM_CHARS} characters near: {buffer[:40]!r}")
+    buffer += decoder.decode(b"", final=True)
+    if buffer.strip():
+        yield buffer
+
+
+async def _iter_json_array(request: Request) -> AsyncIterator:
+    """
+    Yields the elements of a top-level JSON array as they arrive, without
+    buffering the whole body. Each element is yielded as a decoded value.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    json_decoder = json.JSONDecoder()
+    buffer = ""
+    pos = 0
+    started = False
+    finished = False
+    stream = request.stream()
+    eof = False
+
+    while not finished:
+        # Skip whitespace and separators
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != "[":
+                    raise BulkItemError("Request body must be a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                finished = True
+                break
+            try:
+                value, end = json_decoder.raw_decode(buffer, pos)
+                # A number could be cut mid-token; only trust it once followed by more input
+                if end == len(buffer) and not eof and not isinstance(value, (dict, list, str)):
+                    raise json.JSONDecodeError("incomplete", buffer, pos)
+                yield value
+                pos = end
+                continue
+            except json.JSONDecodeError:
+                if eof:
+                    raise BulkItemError(f"Malformed JSON near: {buffer[pos:pos + 40]!r}")
+                # Incomplete so far; a malformed element would otherwise buffer the rest of the body
+                if len(buffer) - pos > BULK_MAX_ITEM_CHARS:
+                    raise BulkItemError(f"Malformed JSON or element longer than {BULK_MAX_ITEM_CHARS} "
+                                        f"characters near: {buffer[pos:pos + 40]!r}")
+        elif eof:
+            raise BulkItemError("Unexpected end of JSON array")
+
+        # Need more input: drop what is consumed, then read the next body chunk
+        buffer = buffer[pos:]
+        pos = 0
+        try:
+            data = await stream.__anext__()
+            buffer += decoder.decode(data)
+        except StopAsyncIteration:
+            buffer += decoder.decode(b"", final=True)
+            eof = True
+
+
+def _corroborates(expected: Optional[str], actual: Optional[str]) -> Optional[bool]:
+    """True/False when both sides are known, None otherwise (case-insensitive containment)."""
+    if not expected or not actual:
+        return None
+    expected, actual = expected.lower(), actual.lower()
+    return expected in actual or actual in expected
+
+
+def _screen_chunk(items: List[Dict], threshold: int) -> List[Dict]:
+    """Runs one vectorized batch_search for the chunk and shapes the output rows."""
+    # The type filter runs inside batch_search, before the top hit per list is kept
+    results = search_engine.batch_search([item["name"] for item in items], threshold=threshold,
+                                         entity_types=[item["type"] for item in items])
+    rows = []
+    for item, res in zip(items, results):
+        matches = []
+        for m in res["matches"]:
+            record = m["record"]
+            matches.append({
+                "sanction_id": record.id,
+                "list_type": record.list_type,
+                "name": record.original_name,
+                "matched_name": m["matched_name"],
+                "score": round(m["score"], 2),
+                "entity_type": record.entity_type,
+                "birth_date": record.birth_date,
+                "nationality": record.nationality,
+                "dob_match": _corroborates(item["dob"], record.birth_date),
+                "country_match": _corroborates(item["country"], record.nationality),
+                # Same value on the hits of other lists for the same entity
+                "cluster_id": m["cluster_id"],
+            })
+        rows.append({
+            "index": item["index"],
+            "id": item["id"],
+            "input_name": item["name"],
+            "match_status": (MatchStatus.PENDING if matches else MatchStatus.NO_MATCH).value,
+            "matches": matches,
+        })
+    return rows
+
+
+def _log_bulk_search(screened: int, flagged: int, user_id: Optional[str], company_id: Optional[str]):
+    db = SessionLocal()
+    try:
+        create_search_log(db, SearchLogCreate(
+            search_term=f"BULK ({screened} names)",
+            search_type="BULK",
+            result_count=flagged,
+            user_id=user_id or "unknown",
+            company_id=company_id or "unknown",
+        ))
+    except Exception as e:
+        logger.warning(f"Could not write bulk search log: {e}")
+    finally:
+        db.close()
+
+
+@router.post("/bulk")
+async def screen_bulk(
+    request: Request,
+    threshold: int = Query(85, ge=0, le=100),
+    user_id: Optional[str] = Query(None),
+    company_id: Optional[str] = Query(None),
+):
+    """
+    Screens many names in one request.
+
+    Body: a JSON array, or NDJSON (Content-Type: application/x-ndjson), of
+    names or objects {"name", "type", "dob", "country", "id"}. The response is
+    NDJSON: one result line per input, emitted as each chunk of BULK_CHUNK_SIZE
+    names is screened, then a final {"summary": ...} line. Every line carries
+    the input `index`; unparseable items get an {"index", "error"} line as
+    soon as they are read.
+
+    Input is read only as fast as output is consumed, so at most one chunk is
+    held in memory and slow clients apply backpressure to the upload.
+    """
+    content_type = request.headers.get("content-type", "")
+    is_ndjson = "ndjson" in content_type or "jsonlines" in content_type or "jsonl" in content_type
+
+    async def generate():
+        screened = flagged = errors = 0
+        chunk: List[Dict] = []
+        index = 0
+
+        async def flush():
+            nonlocal screened, flagged
+            rows = await run_in_threadpool(_screen_chunk, chunk, threshold)
+            screened += len(rows)
+            flagged += sum(1 for r in rows if r["matches"])
+            return "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+
+        try:
+            source = _iter_ndjson(request) if is_ndjson else _iter_json_array(request)
+            async for raw in source:
+                try:
+                    if is_ndjson:
+                        raw = json.loads(raw)
+                    chunk.append(_to_item(raw, index))
+                except ValueError as e:  # JSONDecodeError and BulkItemError
+                    errors += 1
+                    yield json.dumps({"index": index, "error": str(e)}) + "\n"
+                index += 1
+                if len(chunk) >= BULK_CHUNK_SIZE:
+                    yield await flush()
+                    chunk = []
+            if chunk:
+                yield await flush()
+                chunk = []
+        except BulkItemError as e:
+            errors += 1
+            yield json.dumps({"index": index, "error": str(e)}) + "\n"
+
+        await run_in_threadpool(_log_bulk_search, screened, flagged, user_id, company_id)
+        yield json.dumps({"summary": {
+            "received": index,
+            "screened": screened,
+            "flagged": flagged,
+            "errors": errors,
+            "threshold": threshold,
+        }}) + "\n"
+
+    return DuplexStreamingResponse(generate(), media_type=NDJSON_MEDIA_TYPE)
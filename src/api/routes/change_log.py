@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+from src.db.session import get_db
+from src.db.models import ChangeLog
+from pydantic import BaseModel
+from typing import List, Optional
+from datetime import datetime
+
+router = APIRouter()
+
+class ChangeLogResponse(BaseModel):
+    id: int
+    import_log_id: Optional[int] = None
+    timestamp: Optional[datetime] = None
+    record_id: Optional[str] = None
+    change_type: Optional[str] = None
+    field_changed: Optional[str] = None
+    old_value: Optional[str] = None
+    new_value: Optional[str] = None
+    # JSON [position, removed, inserted] edits for large values (see src/etl/change_log.py)
+    value_patch: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+class ChangeLogPage(BaseModel):
+    items: List[ChangeLogResponse]
+    next_cursor: Optional[int] = None
+
+@router.get("/change-logs", response_model=ChangeLogPage)
+def list_change_logs(
+    db: Session = Depends(get_db),
+    import_log_id: Optional[int] = Query(None, description="Changes of one source import"),
+    record_id: Optional[str] = Query(None),
+    field: Optional[str] = Query(None, description="field_changed, e.g. original_name"),
+    change_type: Optional[str] = Query(None, description="ADDED, UPDATED or REMOVED"),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[int] = Query(None, ge=0, description="Return changes with id > cursor (keyset pagination)"),
+):
+    """
+    Change log rows filtered by import, record and/or field, oldest first.
+
+    Each filter is backed by an index whose trailing column keeps the keyset
+    order ((import_log_id, id), (record_id, id), (field_changed, id),
+    (change_type, id)), so a page filtered by one of them costs the same at
+    any depth. Combined filters walk the index of one of them and check the
+    others per row.
+    """
+    q = db.query(ChangeLog)
+    if import_log_id is not None:
+        q = q.filter(ChangeLog.import_log_id == import_log_id)
+    if record_id:
+        q = q.filter(ChangeLog.record_id == record_id)
+    if field:
+        q = q.filter(ChangeLog.field_changed == field)
+    if change_type:
+        q = q.filter(ChangeLog.change_type == change_type.upper())
+    if cursor is not None:
+        q = q.filter(ChangeLog.id > cursor)
+    items = q.order_by(ChangeLog.id).limit(limit).all()
+    next_cursor = items[-1].id if len(items) == limit else None
+    return {"items": items, "next_cursor": next_cursor}
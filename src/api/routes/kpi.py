@@ -119,3 +119,62 @@ def get_sanction_lists_kpi(days: int = 1, db: Session = Depends(get_db)):
         results.append(kpi)
         
     return results
+
+
+class ImportStageReport(BaseModel):
+    import_log_id: int
+    source: str
+    timestamp: Optional[datetime] = None
+    status: Optional[str] = None
+    records_added: int = 0
+    records_updated: int = 0
+    records_removed: int = 0
+    # Seconds per stage of this source: download, parse, normalize, diff, db_write, change_log
+    stage_seconds: Dict[str, float] = {}
+    # Stages shared by the run's sources: removals, clusters, engine_reload
+    run_seconds: Dict[str, float] = {}
+    counters: Dict[str, int] = {}
+    total_seconds: Optional[float] = None
+    profile: Optional[str] = None
+
+@router.get("/import-stages", response_model=List[ImportStageReport])
+def get_import_stages(days: int = 7, source: Optional[str] = None, limit: int = 100, db: Session = Depends(get_db)):
+    """
+    Per-source stage timings and counters of the imports of the last N days,
+    newest first (ImportLog.stage_stats, written by SanctionLoader).
+    """
+    import json
+    from datetime import timedelta
+
+    threshold = datetime.utcnow() - timedelta(days=days)
+    q = db.query(ImportLog).filter(ImportLog.timestamp >= threshold)
+    if source:
+        q = q.filter(ImportLog.source == source)
+
+    results = []
+    for log in q.order_by(ImportLog.timestamp.desc(), ImportLog.id.desc()).limit(limit):
+        try:
+            stats = json.loads(log.stage_stats) if log.stage_stats else {}
+        except ValueError:
+            stats = {}
+        stage_seconds = stats.get("seconds") or {
+            # Imports logged before stage_stats existed
+            name: value for name, value in (
+                ("download", log.download_seconds), ("parse", log.parse_seconds), ("load", log.load_seconds)
+            ) if value is not None
+        }
+        results.append(ImportStageReport(
+            import_log_id=log.id,
+            source=log.source,
+            timestamp=log.timestamp,
+            status=log.status,
+            records_added=log.records_added or 0,
+            records_updated=log.records_updated or 0,
+            records_removed=log.records_removed or 0,
+            stage_seconds=stage_seconds,
+            run_seconds=stats.get("run_seconds", {}),
+            counters=stats.get("counters", {}),
+            total_seconds=stats.get("total_seconds"),
+            profile=stats.get("profile"),
+        ))
+    return results
@@ -0,0 +1,122 @@
+import csv
+import io
+import tempfile
+from typing import Iterator, Optional, Tuple
+from openpyxl import Workbook
+from src.db.session import SessionLocal
+from src.db.models import ScreeningResult, ScreeningMatch, SanctionRecord, MatchStatus
+
+EXPORT_COLUMNS = [
+    "result_id", "input_name", "match_status",
+    "sanction_id", "list_type", "sanction_name", "matched_name", "match_score",
+    "entity_type", "program", "nationality", "birth_date",
+]
+
+# Rows fetched per round trip from the server-side cursor
+YIELD_PER = 2000
+# Excel caps a sheet at 1,048,576 rows (one is used by the header)
+XLSX_MAX_DATA_ROWS = 1048575
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def iter_export_rows(batch_id: int, status: Optional[MatchStatus] = None) -> Iterator[Tuple]:
+    """
+    Yields one tuple per (result, match) pair of a batch, in result id order.
+    Results without matches yield a single row with empty match columns.
+
+    Uses its own session and a server-side cursor (stream_results + yield_per),
+    so memory stays constant regardless of batch size and the session outlives
+    the request handler that returned the StreamingResponse.
+    """
+    db = SessionLocal()
+    try:
+        q = (
+            db.query(
+                ScreeningResult.id,
+                ScreeningResult.input_name,
+                ScreeningResult.match_status,
+                ScreeningMatch.sanction_id,
+                SanctionRecord.list_type,
+                SanctionRecord.original_name,
+                ScreeningMatch.match_name,
+                ScreeningMatch.match_score,
+                SanctionRecord.entity_type,
+                SanctionRecord.program,
+                SanctionRecord.nationality,
+                SanctionRecord.birth_date,
+            )
+            .outerjoin(ScreeningMatch, ScreeningMatch.screening_result_id == ScreeningResult.id)
+            .outerjoin(SanctionRecord, SanctionRecord.id == ScreeningMatch.sanction_id)
+            .filter(ScreeningResult.batch_id == batch_id)
+        )
+        if status:
+            q = q.filter(ScreeningResult.match_status == status)
+        q = (
+            q.order_by(ScreeningResult.id, ScreeningMatch.id)
+            .execution_options(stream_results=True)
+            .yield_per(YIELD_PER)
+        )
+        for row in q:
+            row = list(row)
+            if isinstance(row[2], MatchStatus):
+                row[2] = row[2].value
+            yield tuple(row)
+    finally:
+        db.close()
+
+
+def stream_csv(batch_id: int, status: Optional[MatchStatus] = None) -> Iterator[bytes]:
+    """Encodes export rows as CSV, flushing every YIELD_PER rows."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    # Send the header straight away so the download starts immediately
+    yield buffer.getvalue().encode("utf-8")
+    buffer.seek(0)
+    buffer.truncate()
+
+    pending = 0
+    for row in iter_export_rows(batch_id, status):
+        writer.writerow(row)
+        pending += 1
+        if pending >= YIELD_PER:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    if pending:
+        yield buffer.getvalue().encode("utf-8")
+
+
+def stream_xlsx(batch_id: int, status: Optional[MatchStatus] = None, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """
+    Writes export rows with a write-only workbook and streams the file.
+
+    openpyxl's write-only mode spools rows to disk, so memory stays constant.
+    An XLSX is a zip whose directory is written last, so the bytes can only be
+    sent once the workbook is saved; large batches roll over to extra sheets.
+    """
+    wb = Workbook(write_only=True)
+    ws = None
+    rows_in_sheet = XLSX_MAX_DATA_ROWS
+    sheet_no = 0
+    for row in iter_export_rows(batch_id, status):
+        if rows_in_sheet >= XLSX_MAX_DATA_ROWS:
+            sheet_no += 1
+            ws = wb.create_sheet(title="Results" if sheet_no == 1 else f"Results {sheet_no}")
+            ws.append(EXPORT_COLUMNS)
+            rows_in_sheet = 0
+        ws.append(row)
+        rows_in_sheet += 1
+    if ws is None:
+        ws = wb.create_sheet(title="Results")
+        ws.append(EXPORT_COLUMNS)
+
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
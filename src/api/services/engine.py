@@ -3,10 +3,45 @@ import json
 from sqlalchemy.orm import Session
 from src.db.models import SanctionRecord, MatchDecision, MatchStatus
 from src.core.matching import NameMatcher
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 import time
+import os
+import sys
+import logging
 import numpy as np
 
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Memory budget for one cdist score matrix (chunk x corpus, uint8)
+BATCH_SEARCH_MEMORY_MB = int(os.getenv("BATCH_SEARCH_MEMORY_MB", "256"))
+# Upper bound on names per chunk, so progress and timings stay granular on small corpora
+BATCH_SEARCH_MAX_CHUNK = int(os.getenv("BATCH_SEARCH_MAX_CHUNK", "5000"))
+# rapidfuzz cdist threads; -1 uses all cores
+BATCH_SEARCH_WORKERS = int(os.getenv("BATCH_SEARCH_WORKERS", "-1"))
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unsupported."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes on Linux
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 1)
+
+def _type_matches(wanted: Optional[str], entity_type: Optional[str]) -> bool:
+    """Whether a record of `entity_type` can be the 'individual'/'company' wanted; unknown types pass."""
+    if not wanted or not entity_type or entity_type.lower() == "unknown":
+        return True
+    is_individual = entity_type.lower() in ("individual", "person")
+    return is_individual == (wanted == "individual")
+
+
 class SearchEngine:
     _instance = None
 
@@ -19,16 +54,22 @@ class SearchEngine:
     def __init__(self):
         if self.initialized:
             return
-        self.names: List[str] = []        # Normalized names for RapidFuzz
+        self.names: List[str] = []        # Normalized names for RapidFuzz, unique per cluster
         self.ids: List[str] = []          # Corresponding IDs
+        self.shared_names: Dict[int, Tuple[str, ...]] = {} # Name index -> IDs, for names several records of a cluster carry
         self.records: Dict[str, SanctionRecord] = {} # Map ID -> Record
         self.decisions: Dict[str, MatchDecision] = {} # Map "normalized_search_term" -> Decision
+        self.last_batch_stats: Dict = {}  # Timing/memory of the most recent batch_search
         self.initialized = True
 
     def load_data(self, db: Session):
         """
         Loads all active sanctions and user decisions into memory.
         Call this on startup and after daily updates.
+
+        Records of one cross-list cluster (SanctionRecord.cluster_id) share
+        their names: a name published by several lists for the same entity is
+        scored once and the hit is fanned out to each of those records.
         """
         print("Loading Sanctions Data into Memory...")
         start = time.time()
@@ -40,15 +81,17 @@ class SearchEngine:
             
             self.names = []
             self.ids = []
+            self.shared_names = {}
             self.records = {}
+            cluster_names: Dict[str, Dict[str, List[str]]] = {}  # cluster -> name -> record IDs
             
             for s in sanctions:
                 self.records[s.id] = s
+                names = cluster_names.setdefault(s.cluster_id or s.id, {})
                 
                 # 1. Add Primary Name
                 if s.normalized_name:
-                    self.names.append(s.normalized_name)
-                    self.ids.append(s.id)
+                    names.setdefault(s.normalized_name, []).append(s.id)
                 
                 # 2. Add Aliases
                 if s.alias_names:
@@ -72,18 +115,26 @@ class SearchEngine:
                             for alias in aliases:
                                 norm_alias = NameMatcher.normalize_name(alias)
                                 if norm_alias and norm_alias != s.normalized_name:
-                                    self.names.append(norm_alias)
-                                    self.ids.append(s.id)
+                                    owners = names.setdefault(norm_alias, [])
+                                    if s.id not in owners:
+                                        owners.append(s.id)
                     except Exception:
                         # Ignore alias parsing errors to keep loading safe
                         pass
 
+            for names in cluster_names.values():
+                for name, owners in names.items():
+                    if len(owners) > 1:
+                        self.shared_names[len(self.names)] = tuple(owners)
+                    self.names.append(name)
+                    self.ids.append(owners[0])
+
             # 2. Load Decisions (Memory)
             decisions = db.query(MatchDecision).all()
             self.decisions = {d.search_term_normalized: d for d in decisions}
             
             print(
-                f"Loaded {len(self.records)} active sanctions, "
+                f"Loaded {len(self.records)} active sanctions in {len(cluster_names)} clusters, "
                 f"{len(self.names)} names (primary + aliases), "
                 f"{len(self.decisions)} decisions in {time.time() - start:.2f}s"
             )
@@ -126,14 +177,15 @@ class SearchEngine:
         for match_name, score, idx in results:
             if score < threshold:
                 continue
-            record_id = self.ids[idx]
-            record = self.records.get(record_id)
-            matches.append({
-                "record": record,
-                "score": score,
-                "status": MatchStatus.PENDING,
-                "auto_resolved": False
-            })
+            for record_id in self._name_owners(idx):
+                record = self.records.get(record_id)
+                matches.append({
+                    "record": record,
+                    "score": score,
+                    "status": MatchStatus.PENDING,
+                    "auto_resolved": False,
+                    "cluster_id": getattr(record, "cluster_id", None) or record_id
+                })
         # Group by list_type and keep only the top match per list
         top_matches = {}
         for m in matches:
@@ -145,9 +197,32 @@ class SearchEngine:
                 top_matches[list_type] = m
         return list(top_matches.values())
 
-    def batch_search(self, names: List[str], threshold: int = 85) -> List[Dict]:
+    def _name_owners(self, idx: int) -> Tuple[str, ...]:
+        """IDs of the records carrying name `idx` (several when lists of one cluster share it)."""
+        return self.shared_names.get(idx) or (self.ids[idx],)
+
+    def batch_chunk_size(self) -> int:
+        """
+        Number of query names per cdist call, derived from the memory budget and
+        the live corpus size (one uint8 score per query x corpus name).
+        """
+        corpus = max(len(self.names), 1)
+        budget_bytes = BATCH_SEARCH_MEMORY_MB * 1024 * 1024
+        return max(1, min(BATCH_SEARCH_MAX_CHUNK, budget_bytes // corpus))
+
+    def batch_search(self, names: List[str], threshold: int = 85,
+                     entity_types: Optional[List[Optional[str]]] = None) -> List[Dict]:
         """
         Performs batch optimized search.
+
+        `entity_types` optionally gives, per name, the type wanted ('individual'
+        or 'company', None for any); hits of another type are dropped before the
+        top match per list is chosen.
+
+        Scores are computed in chunks sized to fit BATCH_SEARCH_MEMORY_MB. cdist
+        runs with score_cutoff and a uint8 matrix across BATCH_SEARCH_WORKERS
+        threads; the few cells at or above threshold are then re-scored exactly
+        so reported scores are unchanged.
         """
         # If no sanctions loaded, return no matches
         if not self.names:
@@ -158,47 +233,64 @@ class SearchEngine:
             } for name in names]
 
         results = []
-        chunk_size = 500 # Process 500 names at a time against 80k sanctions
+        chunk_size = self.batch_chunk_size()
+        chunk_timings = []
+        start = time.time()
         
         for i in range(0, len(names), chunk_size):
+            chunk_start = time.time()
             chunk = names[i:i+chunk_size]
             
             # Normalize chunk names to match the normalized names in self.names
             normalized_chunk = [NameMatcher.normalize_name(n) for n in chunk]
             
             # Calculate distance matrix
-            # Returns (len(chunk), len(self.names)) matrix of scores
+            # Returns (len(chunk), len(self.names)) matrix of rounded scores,
+            # zero wherever the score is below threshold
             matrix = rapidfuzz.process.cdist(
                 normalized_chunk, 
                 self.names, 
                 scorer=rapidfuzz.fuzz.token_set_ratio,
-                dtype=np.float32
+                score_cutoff=threshold,
+                dtype=np.uint8,
+                workers=BATCH_SEARCH_WORKERS
             )
             
+            # Candidate cells for the whole chunk in one pass
+            rows, cols = np.nonzero(matrix >= threshold)
+            del matrix
+            candidates: Dict[int, List[int]] = {}
+            for j, idx in zip(rows.tolist(), cols.tolist()):
+                candidates.setdefault(j, []).append(idx)
+            
             # Find all matches above threshold for each query in the chunk
             for j, input_name in enumerate(chunk):
-                row_scores = matrix[j]
-                # Get indices where score >= threshold
-                match_indices = np.where(row_scores >= threshold)[0]
-                
-                if len(match_indices) == 0:
+                matches = []
+                for idx in candidates.get(j, ()):
+                    # Exact score for the candidate (the matrix holds rounded values)
+                    score = float(rapidfuzz.fuzz.token_set_ratio(normalized_chunk[j], self.names[idx]))
+                    if score < threshold:
+                        continue
+                    matched_name = self.names[idx] # The specific name that matched
+                    wanted = entity_types[i + j] if entity_types else None
+                    for record_id in self._name_owners(idx):
+                        record = self.records.get(record_id)
+                        if wanted and not _type_matches(wanted, getattr(record, "entity_type", None)):
+                            continue
+                        matches.append({
+                            "record": record,
+                            "score": score,
+                            "matched_name": matched_name,
+                            "cluster_id": getattr(record, "cluster_id", None) or record_id
+                        })
+
+                if not matches:
                     results.append({
                         "input_name": input_name,
                         "match_status": MatchStatus.NO_MATCH,
                         "matches": []
                     })
                 else:
-                    matches = []
-                    for idx in match_indices:
-                        score = float(row_scores[idx])
-                        record_id = self.ids[idx]
-                        record = self.records.get(record_id)
-                        matched_name = self.names[idx] # The specific name that matched
-                        matches.append({
-                            "record": record,
-                            "score": score,
-                            "matched_name": matched_name
-                        })
                     # Group by list_type and keep only the top match per list
                     top_matches = {}
                     for m in matches:
@@ -216,6 +308,19 @@ class SearchEngine:
                         "match_status": MatchStatus.PENDING,
                         "matches": top_matches_list
                     })
+            chunk_timings.append(time.time() - chunk_start)
+
+        self.last_batch_stats = {
+            "names": len(names),
+            "corpus_size": len(self.names),
+            "chunk_size": chunk_size,
+            "chunks": len(chunk_timings),
+            "total_seconds": round(time.time() - start, 3),
+            "max_chunk_seconds": round(max(chunk_timings), 3) if chunk_timings else 0.0,
+            "avg_chunk_seconds": round(sum(chunk_timings) / len(chunk_timings), 3) if chunk_timings else 0.0,
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+        logger.info(f"batch_search stats: {self.last_batch_stats}")
         return results
 
     def status(self):
@@ -226,19 +331,26 @@ class SearchEngine:
             sanctions_loaded = len(self.names)
             unique_records = len(self.records)
             decisions_loaded = len(self.decisions)
+            shared_names = len(self.shared_names)
         except Exception:
             sanctions_loaded = 0
             unique_records = 0
             decisions_loaded = 0
+            shared_names = 0
 
         return {
             "engine_initialized": self.initialized,
             "sanctions_loaded": sanctions_loaded,
             "unique_records": unique_records,
             "decisions_loaded": decisions_loaded,
+            "shared_cluster_names": shared_names,
             "scorer": "rapidfuzz.fuzz.token_set_ratio",
             "threshold_default": 85,
-            "chunk_size": 500,
+            "chunk_size": self.batch_chunk_size(),
+            "memory_budget_mb": BATCH_SEARCH_MEMORY_MB,
+            "workers": BATCH_SEARCH_WORKERS,
+            "last_batch": self.last_batch_stats,
+            "peak_rss_mb": _peak_rss_mb(),
             "vectorized_batch": True,
             "include_aliases": True
         }
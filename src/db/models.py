@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Text, Enum
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Float, ForeignKey, Text, Enum, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from src.db.session import Base
 import enum
@@ -39,6 +39,10 @@ class SanctionRecord(Base):
     # For tracking changes
     first_seen = Column(DateTime, default=datetime.utcnow)
     last_seen = Column(DateTime, default=datetime.utcnow)
+    # SHA-256 of the canonical parsed record (see etl.loader.content_hash)
+    content_hash = Column(String(64), nullable=True)
+    # Records of the same entity on other lists share it (see etl.clusters); None while inactive
+    cluster_id = Column(String, nullable=True, index=True)
 
 class ImportLog(Base):
     __tablename__ = "import_logs"
@@ -49,8 +53,27 @@ class ImportLog(Base):
     records_added = Column(Integer, default=0)
     records_updated = Column(Integer, default=0)
     records_removed = Column(Integer, default=0)
-    status = Column(String) # SUCCESS, FAILED, IN_PROGRESS
+    status = Column(String) # SUCCESS, FAILED, IN_PROGRESS, SKIPPED_UNCHANGED
     error_message = Column(Text, nullable=True)
+    # Per-source stage timings (seconds); download is None for local files
+    download_seconds = Column(Float, nullable=True)
+    parse_seconds = Column(Float, nullable=True)
+    load_seconds = Column(Float, nullable=True)
+    # JSON: {"seconds": {stage: s}, "counters": {...}, "run_seconds": {...}} (see SanctionLoader.run_update)
+    stage_stats = Column(Text, nullable=True)
+
+class SourceFetchState(Base):
+    """Validators of the last successfully imported download of each list, for conditional GETs."""
+    __tablename__ = "source_fetch_state"
+
+    source = Column(String, primary_key=True) # EU, UK, US, US_NON_SDN
+    url = Column(String)
+    etag = Column(String, nullable=True)
+    last_modified = Column(String, nullable=True)
+    sha256 = Column(String(64), nullable=True)
+    size_bytes = Column(Integer, nullable=True)
+    checked_at = Column(DateTime, default=datetime.utcnow)
+    changed_at = Column(DateTime, nullable=True)
 
 class ChangeLog(Base):
     __tablename__ = "change_logs"
@@ -63,9 +86,18 @@ class ChangeLog(Base):
     field_changed = Column(String, nullable=True) # e.g., "original_name"
     old_value = Column(Text, nullable=True)
     new_value = Column(Text, nullable=True)
+    # Large values: JSON [position, removed, inserted] edits instead of old/new (src/etl/change_log.py)
+    value_patch = Column(Text, nullable=True)
     
     import_log = relationship("ImportLog")
 
+    __table_args__ = (
+        Index("ix_change_logs_import_log_id_id", "import_log_id", "id"),
+        Index("ix_change_logs_record_id_id", "record_id", "id"),
+        Index("ix_change_logs_field_changed_id", "field_changed", "id"),
+        Index("ix_change_logs_change_type_id", "change_type", "id"),
+    )
+
 class MatchDecision(Base):
     __tablename__ = "match_decisions"
 
@@ -113,11 +145,43 @@ class ScreeningBatch(Base):
     flagged_count = Column(Integer)
     status = Column(String) # PROCESSING, COMPLETED, FAILED
 
+    # Per-status counters, maintained when results are written so that
+    # totals for the results page never require a COUNT(*) over the batch.
+    pending_count = Column(Integer, default=0)
+    true_match_count = Column(Integer, default=0)
+    false_positive_count = Column(Integer, default=0)
+    no_match_count = Column(Integer, default=0)
+
+    # Number of input rows whose results are committed; processing resumes here
+    checkpoint_offset = Column(Integer, default=0)
+
+    # Refreshed by the worker processing the batch at every checkpoint; a batch
+    # whose heartbeat is older than the lease can be claimed by another worker
+    heartbeat_at = Column(DateTime, nullable=True)
+
+    def status_count(self, status: MatchStatus) -> int:
+        return getattr(self, f"{MatchStatus(status).value.lower()}_count") or 0
+
+    def increment_status_counts(self, counts: dict):
+        for status, n in counts.items():
+            attr = f"{MatchStatus(status).value.lower()}_count"
+            setattr(self, attr, (getattr(self, attr) or 0) + n)
+
+class ScreeningBatchFile(Base):
+    """Uploaded file kept until its batch completes, so processing can resume after a restart."""
+    __tablename__ = "screening_batch_files"
+
+    batch_id = Column(Integer, ForeignKey("screening_batches.id"), primary_key=True)
+    filename = Column(String)
+    content = Column(LargeBinary)
+    stored_at = Column(DateTime, default=datetime.utcnow)
+
 class ScreeningResult(Base):
     __tablename__ = "screening_results"
 
     id = Column(Integer, primary_key=True, index=True)
     batch_id = Column(Integer, ForeignKey("screening_batches.id"))
+    row_index = Column(Integer, nullable=True) # Position in the uploaded file; idempotency key with batch_id
     input_name = Column(String)
     match_status = Column(Enum(MatchStatus), default=MatchStatus.PENDING)
     
@@ -125,11 +189,19 @@ class ScreeningResult(Base):
     matches = relationship("ScreeningMatch", back_populates="result", cascade="all, delete-orphan")
     batch = relationship("ScreeningBatch")
 
+    # Keyset pagination runs over (batch_id, id), optionally narrowed by status.
+    # The trigram index for input_name search is Postgres-only and lives in the migration.
+    __table_args__ = (
+        Index("ix_screening_results_batch_id_id", "batch_id", "id"),
+        Index("ix_screening_results_batch_id_status_id", "batch_id", "match_status", "id"),
+        Index("uq_screening_results_batch_id_row_index", "batch_id", "row_index", unique=True),
+    )
+
 class ScreeningMatch(Base):
     __tablename__ = "screening_matches"
 
     id = Column(Integer, primary_key=True, index=True)
-    screening_result_id = Column(Integer, ForeignKey("screening_results.id"))
+    screening_result_id = Column(Integer, ForeignKey("screening_results.id"), index=True)
     sanction_id = Column(String, ForeignKey("sanctions.id"))
     match_score = Column(Float)
     match_name = Column(String) # The specific name/alias that matched
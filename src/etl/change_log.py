@@ -0,0 +1,106 @@
+"""
+Buffered ChangeLog writing for the SQL importer.
+
+Change rows are collected as plain dicts and inserted with one executemany
+per CHANGE_LOG_BATCH_SIZE rows instead of one ORM object each. A change to a
+large value (remark, alias list, ...) is stored as a compact JSON patch in
+`value_patch` instead of the full old and new strings: a list of
+[position, removed, inserted] edits against the old value. The patch keeps
+the removed text, so it can be applied in either direction (apply_patch).
+"""
+import difflib
+import json
+import os
+from datetime import datetime
+
+from src.db.models import ChangeLog
+
+# Change rows inserted per statement
+CHANGE_LOG_BATCH_SIZE = int(os.getenv("CHANGE_LOG_BATCH_SIZE", "5000"))
+
+# Values this long (either side) are logged as a patch when that is shorter
+PATCH_MIN_CHARS = int(os.getenv("CHANGE_LOG_PATCH_MIN_CHARS", "200"))
+
+
+def make_patch(old: str, new: str) -> str:
+    """JSON list of [position in old, removed text, inserted text] edits turning old into new."""
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    edits = [
+        [i1, old[i1:i2], new[j1:j2]]
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes() if tag != "equal"
+    ]
+    return json.dumps(edits, ensure_ascii=False, separators=(",", ":"))
+
+
+def apply_patch(value: str, patch: str, reverse: bool = False) -> str:
+    """The new value from the old one, or with reverse=True the old value from the new one."""
+    parts = []
+    pos = 0      # position in the value being read
+    shift = 0    # new position - old position, for reverse
+    for old_pos, removed, inserted in json.loads(patch):
+        if reverse:
+            start, take, put = old_pos + shift, inserted, removed
+            shift += len(inserted) - len(removed)
+        else:
+            start, take, put = old_pos, removed, inserted
+        parts.append(value[pos:start])
+        parts.append(put)
+        pos = start + len(take)
+    parts.append(value[pos:])
+    return "".join(parts)
+
+
+def encode_change(old_value, new_value):
+    """(old_value, new_value, value_patch) as stored for one changed field."""
+    old_value = str(old_value) if old_value else None
+    new_value = str(new_value) if new_value else None
+    if old_value and new_value and max(len(old_value), len(new_value)) >= PATCH_MIN_CHARS:
+        patch = make_patch(old_value, new_value)
+        if len(patch) < len(old_value) + len(new_value):
+            return None, None, patch
+    return old_value, new_value, None
+
+
+class ChangeLogWriter:
+    """Collects ChangeLog rows and inserts them in batches on the session's connection."""
+
+    def __init__(self, db, batch_size: int = None):
+        self.db = db
+        self.batch_size = batch_size or CHANGE_LOG_BATCH_SIZE
+        self.rows = []
+        self.written = 0
+        self.timer = None  # optional StageTimer (src/etl/profiling.py): flushes count as "change_log"
+
+    def add(self, import_log_id, record_id, change_type, field_changed=None,
+            old_value=None, new_value=None, value_patch=None, timestamp=None):
+        self.rows.append({
+            "import_log_id": import_log_id,
+            "timestamp": timestamp or datetime.utcnow(),
+            "record_id": record_id,
+            "change_type": change_type,
+            "field_changed": field_changed,
+            "old_value": old_value,
+            "new_value": new_value,
+            "value_patch": value_patch,
+        })
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def add_update(self, import_log_id, record_id, field_changed, old_value, new_value, timestamp=None):
+        """UPDATED row for one field; large values are stored as a patch."""
+        old_value, new_value, value_patch = encode_change(old_value, new_value)
+        self.add(import_log_id, record_id, "UPDATED", field_changed, old_value, new_value, value_patch, timestamp)
+
+    def flush(self):
+        if not self.rows:
+            return
+        if self.timer is None:
+            self._insert()
+        else:
+            with self.timer.stage("change_log"):
+                self._insert()
+
+    def _insert(self):
+        self.db.execute(ChangeLog.__table__.insert(), self.rows)
+        self.written += len(self.rows)
+        self.rows = []
@@ -0,0 +1,82 @@
+"""
+Cross-list entity clusters: the records several lists (EU, UK, OFAC SDN,
+OFAC consolidated) publish for the same person or organisation share a
+cluster_id. The loader recomputes them after each import; the search engine
+scores the names of a cluster once and fans the hit out to its records.
+
+Records are linked by
+  - the same UN reference number, or
+  - the same normalized name and entity type and, for individuals, the
+    same year of birth (organisations, vessels and aircraft by name alone).
+A name key links records only if it picks at most one record per list, so
+two people of the same name on one list are never merged through it.
+The cluster id is the smallest record id of the cluster.
+"""
+import re
+from typing import Dict, Iterable, Optional, Tuple
+
+INDIVIDUAL_TYPES = {"individual", "person"}
+
+# Record columns build_clusters reads, in order
+CLUSTER_COLUMNS = ["id", "list_type", "un_id", "normalized_name", "birth_date", "entity_type"]
+
+_YEAR = re.compile(r"\b(1[89]\d\d|20\d\d)\b")
+
+
+def birth_year(value: Optional[str]) -> Optional[str]:
+    """Year of a birth date in any of the lists' formats (1952-10-07, 07/10/1952, 7 Oct 1952)."""
+    match = _YEAR.search(value or "")
+    return match.group(1) if match else None
+
+
+def _keys(list_type, un_id, normalized_name, birth_date, entity_type):
+    un_id = (un_id or "").strip().upper()
+    if un_id:
+        yield ("un", un_id), False
+    if not normalized_name:
+        return
+    kind = (entity_type or "").strip().lower()
+    if kind in INDIVIDUAL_TYPES:
+        year = birth_year(birth_date)
+        if year:
+            yield ("person", normalized_name, year), True
+    elif kind and kind != "unknown":
+        yield ("name", normalized_name, kind), True
+
+
+def build_clusters(rows: Iterable[Tuple]) -> Dict[str, str]:
+    """
+    rows: (id, list_type, un_id, normalized_name, birth_date, entity_type)
+    tuples (CLUSTER_COLUMNS). Returns {record id: cluster id} for every row.
+    """
+    parent: Dict[str, str] = {}
+
+    def find(record_id):
+        root = record_id
+        while parent[root] != root:
+            root = parent[root]
+        while parent[record_id] != root:
+            parent[record_id], record_id = root, parent[record_id]
+        return root
+
+    groups: Dict[tuple, list] = {}
+    for record_id, list_type, un_id, normalized_name, birth_date, entity_type in rows:
+        parent[record_id] = record_id
+        for key, per_list in _keys(list_type, un_id, normalized_name, birth_date, entity_type):
+            groups.setdefault(key, []).append((record_id, list_type if per_list else None))
+
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        lists = [list_type for _, list_type in members if list_type is not None]
+        if len(lists) != len(set(lists)):
+            continue  # ambiguous name key: several records of one list
+        first = find(members[0][0])
+        for record_id, _ in members[1:]:
+            root = find(record_id)
+            if root != first:
+                # The smaller id becomes the root, so it is the cluster id
+                first, root = min(first, root), max(first, root)
+                parent[root] = first
+
+    return {record_id: find(record_id) for record_id in parent}
@@ -1,246 +1,316 @@
+from sqlalchemy import Column, MetaData, String, Table, Text, and_, bindparam, case, false, func, literal, or_, select, true, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from src.db.models import SanctionRecord, MatchDecision, ImportLog, ChangeLog
 from src.etl.parsers import EUParser, UKParser, USParser
+from src.etl.change_log import ChangeLogWriter, PATCH_MIN_CHARS
+from src.etl.clusters import CLUSTER_COLUMNS, build_clusters
 from src.core.matching import NameMatcher
+from src.etl.profiling import StageTimer, profiled
+from src.etl.record_cache import load_or_parse, parser_version
+import src.etl.parsers as parsers_module
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
 from datetime import datetime
+import csv
+import hashlib
+import io
+import json
+import multiprocessing
 import logging
+import os
+import time
+from pathlib import Path
 
 logger = logging.getLogger(__name__)
 
+# Parser processes; 0 means one per source, capped at the CPU count
+PARSE_WORKERS = int(os.getenv("ETL_PARSE_WORKERS", "0"))
+
+# Parsed records are cached here per source and payload hash (see
+# src/etl/record_cache.py); set to an empty string to always parse
+RECORD_CACHE_DIR = os.getenv("RECORD_CACHE_DIR", str(Path(__file__).resolve().parents[2] / "data" / "cache"))
+
+PARSER_CLASSES = {
+    "EU": EUParser,
+    "UK": UKParser,
+    "US": USParser,
+    "US_NON_SDN": USParser
+}
+
+
+# Parsed fields that define a record's content; a change in any of them is an update
+DIFF_FIELDS = [
+    "original_name", "entity_type", "gender", "url", "un_id",
+    "remark", "function", "program", "nationality", "birth_date",
+]
+# normalized_name is derived, but hashing it makes a normalizer change refresh stored rows
+HASH_FIELDS = DIFF_FIELDS + ["alias_names", "normalized_name"]
+# Fields with an UPDATED ChangeLog row per change (alias lists are usually logged as a patch)
+LOGGED_FIELDS = DIFF_FIELDS + ["alias_names"]
+
+# Existing records loaded per query when field-level diffing is needed
+DIFF_BATCH_SIZE = 500
+
+# "bulk" stages each source and applies it with set-based SQL (PostgreSQL and
+# SQLite); "orm" diffs record by record in Python
+LOAD_MODE = os.getenv("ETL_LOAD_MODE", "bulk").lower()
+BULK_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# Columns copied from a parsed record into the sanctions table
+RECORD_COLUMNS = [
+    "list_type", "original_name", "normalized_name", "alias_names", "program", "nationality",
+    "birth_date", "entity_type", "gender", "url", "un_id", "remark", "function", "content_hash",
+]
+
+# Per-connection staging table for one source's parsed records
+staging_metadata = MetaData()
+staging_table = Table(
+    "sanctions_staging", staging_metadata,
+    Column("id", String, primary_key=True),
+    *[Column(name, Text if name in ("alias_names", "remark") else String) for name in RECORD_COLUMNS],
+    prefixes=["TEMPORARY"],
+)
+
+
+def content_hash(record_dict: dict) -> str:
+    """SHA-256 of the canonical parsed record (None and "" are the same value)."""
+    canonical = json.dumps([record_dict.get(f) or "" for f in HASH_FIELDS], ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def parse_source(list_type: str, file_path: str):
+    """
+    Parses one source file into record dicts with `normalized_name` and
+    `content_hash` filled in. Runs in a worker process, so it returns plain
+    data: (records, timer) with "parse" and "normalize" stages. The parser
+    output is cached per payload; the derived fields are always recomputed.
+    """
+    timer = StageTimer()
+    parse = lambda: PARSER_CLASSES[list_type]().parse(file_path)
+    with timer.stage("parse"):
+        if RECORD_CACHE_DIR:
+            # A payload parsed before (e.g. a retried import) is read back instead
+            records, _, cache_hit = load_or_parse(
+                RECORD_CACHE_DIR, list_type, "sql", file_path, parse, parser_version(parsers_module)
+            )
+            timer.count("parse_cache_hit", int(cache_hit))
+            if cache_hit:
+                logger.info(f"[{list_type}] Parsed records read from cache")
+        else:
+            records = list(parse())
+    with timer.stage("normalize"):
+        for record_dict in records:
+            record_dict["normalized_name"] = NameMatcher.normalize_name(record_dict.get("original_name", ""))
+            record_dict["content_hash"] = content_hash(record_dict)
+    timer.count("records", len(records))
+    return records, timer
+
+
+def _differs(old, new, fields):
+    """SQL condition: any of `fields` differs between two column sets (NULL and "" are equal)."""
+    return or_(*[func.coalesce(old[f], "") != func.coalesce(new[f], "") for f in fields])
+
+
+def _timed(fetch):
+    started = time.perf_counter()
+    result = fetch()
+    return result, time.perf_counter() - started
+
+
 class SanctionLoader:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, mode: str = None):
         self.db = db
         # CRITICAL: Prevent SQLAlchemy from expiring objects after commit.
         # This prevents reloading every object from DB in the next loop iteration.
         self.db.expire_on_commit = False
-        self.parsers = {
-            "EU": EUParser(),
-            "UK": UKParser(),
-            "US": USParser(),
-            "US_NON_SDN": USParser()
-        }
+        dialect = db.get_bind().dialect.name
+        self.bulk = (mode or LOAD_MODE) == "bulk" and dialect in BULK_DIALECTS
+        self.dialect_insert = BULK_DIALECTS.get(dialect)
+        self.change_log = ChangeLogWriter(db)
+        self.import_logs = {}  # of the last run_update
+        self.timers = {}       # list_type -> StageTimer of the last run_update
+        self.run_timer = StageTimer()  # stages shared by all sources (removals, clusters, engine reload)
+        self.timer = self.run_timer    # stage timer of the source being loaded
 
     def run_update(self, file_paths: dict):
         """
         file_paths: dict like {"EU": "path/to/eu.xml", "UK": "path/to/uk.xml", ...}
+        A value may also be a zero-argument callable returning the path (e.g. a
+        download); callables run concurrently on threads. A callable returning
+        None means the source is unchanged: it is logged SKIPPED_UNCHANGED and
+        its records are left as they are.
+
+        Sources are parsed concurrently in a process pool, each as soon as its
+        file is available. This session is the only writer: each source is
+        loaded as soon as its parse finishes, so total time is close to that of
+        the slowest source. Download, parse and load times are kept per source
+        on its ImportLog.
+
+        In bulk mode each source is applied by _load_source_bulk, including
+        deactivation of its missing records; existing rows are never loaded
+        into Python.
+
+        Per-source stage timings and counters (download, parse, normalize,
+        diff, db_write, change_log, ...) are stored as JSON in
+        ImportLog.stage_stats. With IMPORT_PROFILE set the run is also
+        profiled (see src/etl/profiling.py).
+        """
+        with profiled("sql_import") as profile:
+            stats = self._run_update(file_paths)
+        if profile["path"]:
+            stats["profile"] = profile["path"]
+            self.record_run_stage(profile=profile["path"])
+        return stats
+
+    def record_run_stage(self, stage: str = None, seconds: float = None, profile: str = None):
         """
-        logger.info("Starting Sanctions Update...")
+        Adds a run-wide stage (e.g. the engine reload after the import) or the
+        profile path to the stage_stats of the last run's loaded sources.
+        """
+        if stage:
+            self.run_timer.add(stage, seconds)
+        for list_type, log in self.import_logs.items():
+            if log.status == "SUCCESS":
+                log.stage_stats = json.dumps(self._stage_stats(list_type, profile))
+        self.db.commit()
+
+    def _stage_stats(self, list_type: str, profile: str = None) -> dict:
+        stats = self.timers[list_type].as_dict()
+        if self.import_logs[list_type].status == "SUCCESS":
+            stats["run_seconds"] = self.run_timer.as_dict()["seconds"]
+        if profile:
+            stats["profile"] = profile
+        return stats
+
+    def _run_update(self, file_paths: dict):
+        logger.info(f"Starting Sanctions Update ({'bulk' if self.bulk else 'orm'} load)...")
         
-        # 1. Load all current records from DB (not just active ones)
-        # This ensures we can reactivate previously inactive records
-        # Map ID -> SanctionRecord object
-        current_records = {
-            r.id: r for r in self.db.query(SanctionRecord).all()
+        # 1. Load the identity of all current records (not just active ones)
+        # This ensures we can reactivate previously inactive records.
+        # Only (id, list_type, content_hash, is_active) rows: unchanged records
+        # are recognised by hash without building ORM objects.
+        current_records = {} if self.bulk else {
+            r.id: r for r in self.db.query(
+                SanctionRecord.id, SanctionRecord.list_type, SanctionRecord.content_hash, SanctionRecord.is_active
+            )
         }
         
         seen_ids = set()
+        loaded = set()
         
-        # Initialize ImportLogs for each source
-        import_logs = {}
-        for list_type in file_paths.keys():
-            log = ImportLog(
-                source=list_type,
-                status="IN_PROGRESS",
-                timestamp=datetime.utcnow()
-            )
-            self.db.add(log)
-            self.db.flush() # Get ID
-            import_logs[list_type] = log
-
-        # 2. Process each source
-        for list_type, file_path in file_paths.items():
-            parser = self.parsers.get(list_type)
-            if not parser:
-                logger.warning(f"No parser for {list_type}")
-                continue
-                
-            logger.info(f"Processing {list_type} from {file_path}...")
-            current_log = import_logs[list_type]
-            
-            # Batch list for bulk updating last_seen
-            ids_to_update_last_seen = []
-
-            try:
-                count = 0
-                for record_dict in parser.parse(file_path):
-                    count += 1
-                    
-                    # Batch execution (BUT NO COMMIT)
-                    if count % 2000 == 0:
-                        # 1. Perform bulk update for last_seen
-                        if ids_to_update_last_seen:
-                            self.db.query(SanctionRecord).filter(
-                                SanctionRecord.id.in_(ids_to_update_last_seen)
-                            ).update(
-                                {SanctionRecord.last_seen: datetime.utcnow()}, 
-                                synchronize_session=False
-                            )
-                            ids_to_update_last_seen = []
-                        
-                        # 2. Log progress (NO COMMIT to avoid expiration)
-                        msg = f"[{list_type}] Processed {count} records..."
-                        logger.info(msg)
-                        print(msg, flush=True)
-
-                    record_id = record_dict["id"]
-                    seen_ids.add(record_id)
-                    
-                    normalized_name = NameMatcher.normalize_name(record_dict.get("original_name", ""))
-                    
-                    if record_id in current_records:
-                        # Update existing
-                        existing = current_records[record_id]
-                        
-                        # Reactivate if previously inactive
-                        was_inactive = not existing.is_active
-                        if was_inactive:
-                            existing.is_active = True
-                            existing.last_updated = datetime.utcnow()
-                            current_log.records_updated += 1
-                        
-                        # Check for changes
-                        changes = []
-                        fields_to_check = [
-                            ("original_name", record_dict.get("original_name")),
-                            ("entity_type", record_dict.get("entity_type")),
-                            ("gender", record_dict.get("gender")),
-                            ("url", record_dict.get("url")),
-                            ("un_id", record_dict.get("un_id")),
-                            ("remark", record_dict.get("remark")),
-                            ("function", record_dict.get("function")),
-                            ("program", record_dict.get("program")),
-                            ("nationality", record_dict.get("nationality")),
-                            ("birth_date", record_dict.get("birth_date"))
-                        ]
-                        
-                        is_changed = False
-                        for field, new_val in fields_to_check:
-                            old_val = getattr(existing, field)
-                            # Simple equality check (handle None vs "")
-                            if (old_val or "") != (new_val or ""):
-                                is_changed = True
-                                changes.append((field, old_val, new_val))
-                                setattr(existing, field, new_val)
-                        
-                        # Always update normalized name if original changed
-                        if existing.normalized_name != normalized_name:
-                            existing.normalized_name = normalized_name
-                            # We don't necessarily log normalized name change as it's derived
-                        
-                        # Update alias_names if changed
-                        if existing.alias_names != record_dict.get("alias_names"):
-                            is_changed = True
-                            # changes.append(("alias_names", "...", "...")) # Too verbose to log full JSON diff?
-                            existing.alias_names = record_dict.get("alias_names")
-
-                        if is_changed:
-                            existing.last_updated = datetime.utcnow()
-                            existing.last_seen = datetime.utcnow()
-                            if not was_inactive:  # Don't double-count if we already counted reactivation
-                                current_log.records_updated += 1
-                            
-                            # Log changes
-                            for field, old_v, new_v in changes:
-                                change_log = ChangeLog(
-                                    import_log_id=current_log.id,
-                                    record_id=record_id,
-                                    change_type="UPDATED",
-                                    field_changed=field,
-                                    old_value=str(old_v) if old_v else None,
-                                    new_value=str(new_v) if new_v else None
-                                )
-                                self.db.add(change_log)
-                        else:
-                            # Optimization: Don't update object one-by-one.
-                            # Add to batch list for bulk update.
-                            if not was_inactive:  # Only batch if we didn't already update
-                                ids_to_update_last_seen.append(record_id)
+        # Initialize ImportLogs for each source (one flush assigns all IDs)
+        import_logs = {
+            list_type: ImportLog(source=list_type, status="IN_PROGRESS", timestamp=datetime.utcnow())
+            for list_type in file_paths.keys()
+        }
+        self.db.add_all(import_logs.values())
+        self.db.flush()
+        self.import_logs = import_logs
+        self.timers = timers = {list_type: StageTimer() for list_type in file_paths}
+        self.run_timer = run_timer = StageTimer()
+
+        # 2. Download/parse concurrently, load each source as it becomes ready
+        parse_workers = PARSE_WORKERS or min(len(file_paths), os.cpu_count() or 1)
+        # spawn: forking a process that runs scheduler/server threads is unsafe
+        mp_context = multiprocessing.get_context("spawn")
+        with ThreadPoolExecutor(max_workers=max(len(file_paths), 1)) as downloads, \
+                ProcessPoolExecutor(max_workers=max(parse_workers, 1), mp_context=mp_context) as parsers:
+            pending = {}
+            for list_type, source in file_paths.items():
+                if list_type not in PARSER_CLASSES:
+                    logger.warning(f"No parser for {list_type}")
+                    continue
+                if callable(source):
+                    pending[downloads.submit(_timed, source)] = ("download", list_type)
+                else:
+                    logger.info(f"Processing {list_type} from {source}...")
+                    pending[parsers.submit(parse_source, list_type, source)] = ("parse", list_type)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, list_type = pending.pop(future)
+                    current_log = import_logs[list_type]
+                    timer = timers[list_type]
+                    try:
+                        if stage == "download":
+                            file_path, current_log.download_seconds = future.result()
+                            timer.add("download", current_log.download_seconds)
+                            if file_path is None:
+                                # Payload identical to the last import: nothing to parse or diff
+                                current_log.status = "SKIPPED_UNCHANGED"
+                                logger.info(f"[{list_type}] Unchanged since last import, skipped")
+                                continue
+                            logger.info(f"Processing {list_type} from {file_path}...")
+                            pending[parsers.submit(parse_source, list_type, file_path)] = ("parse", list_type)
+                            continue
+
+                        records, parse_timer = future.result()
+                        timer.seconds.update(parse_timer.seconds)
+                        timer.counters.update(parse_timer.counters)
+                        current_log.parse_seconds = parse_timer.seconds["parse"] + parse_timer.seconds["normalize"]
+                        started = time.perf_counter()
+                        self.timer = self.change_log.timer = timer
+                        written = self.change_log.written
+                        # Savepoint: a source that fails half-way leaves no partial changes
+                        with self.db.begin_nested(), timer.stage("diff"):
+                            if self.bulk:
+                                self._load_source_bulk(list_type, records, current_log)
                             else:
-                                existing.last_seen = datetime.utcnow()
-                            
-                    else:
-                        # Insert new
-                        new_record = SanctionRecord(
-                            id=record_id,
-                            list_type=list_type,
-                            original_name=record_dict["original_name"],
-                            normalized_name=normalized_name,
-                            alias_names=record_dict.get("alias_names"),
-                            program=record_dict.get("program"),
-                            nationality=record_dict.get("nationality"),
-                            birth_date=record_dict.get("birth_date"),
-                            entity_type=record_dict.get("entity_type"),
-                            gender=record_dict.get("gender"),
-                            url=record_dict.get("url"),
-                            un_id=record_dict.get("un_id"),
-                            remark=record_dict.get("remark"),
-                            function=record_dict.get("function"),
-                            is_active=True,
-                            first_seen=datetime.utcnow(),
-                            last_seen=datetime.utcnow()
+                                self._load_source(list_type, records, current_records, seen_ids, current_log)
+                            self.change_log.flush()
+                        with timer.stage("db_write"):
+                            self.db.commit()
+                        current_log.load_seconds = time.perf_counter() - started
+                        timer.count("change_log_rows", self.change_log.written - written)
+                        loaded.add(list_type)
+                        logger.info(
+                            f"[{list_type}] {len(records)} records: download {current_log.download_seconds or 0:.1f}s, "
+                            f"parse {current_log.parse_seconds:.1f}s, load {current_log.load_seconds:.1f}s"
                         )
-                        self.db.add(new_record)
-                        current_log.records_added += 1
-                        
-                        # Log Addition
-                        change_log = ChangeLog(
-                            import_log_id=current_log.id,
-                            record_id=record_id,
-                            change_type="ADDED",
-                            new_value=f"Name: {record_dict.get('original_name')}"
-                        )
-                        self.db.add(change_log)
-            
-                # Final flush for this file
-                if ids_to_update_last_seen:
-                    self.db.query(SanctionRecord).filter(
-                        SanctionRecord.id.in_(ids_to_update_last_seen)
-                    ).update(
-                        {SanctionRecord.last_seen: datetime.utcnow()}, 
-                        synchronize_session=False
-                    )
-                    ids_to_update_last_seen = []
-                self.db.commit()
-            
-            except Exception as e:
-                logger.error(f"Error processing {list_type}: {e}")
-                current_log.status = "FAILED"
-                current_log.error_message = str(e)
+                    except Exception as e:
+                        self.change_log.rows = []  # rolled back with the savepoint
+                        logger.error(f"Error processing {list_type}: {e}")
+                        current_log.status = "FAILED"
+                        current_log.error_message = str(e)
         
-        # 3. Mark missing as inactive
+        # 3. Mark missing as inactive (ORM mode; bulk mode did it per source)
         # We need to attribute removals to the correct source log
-        for record_id, record in current_records.items():
-            if record_id not in seen_ids:
-                record.is_active = False
-                record.last_updated = datetime.utcnow()
-                
-                # Find which log this belongs to
-                # If we have a log for this record's list_type, use it
-                if record.list_type in import_logs:
-                    log = import_logs[record.list_type]
-                    log.records_removed += 1
-                    
-                    change_log = ChangeLog(
-                        import_log_id=log.id,
-                        record_id=record_id,
-                        change_type="REMOVED",
-                        old_value=f"Name: {record.original_name}"
-                    )
-                    self.db.add(change_log)
-                else:
-                    # If we are not updating this source today, we shouldn't mark it inactive?
-                    # But run_update assumes we are updating everything provided in file_paths.
-                    # If file_paths covers all sources, this is fine.
-                    pass
+        # Only for sources that loaded successfully: a failed download or parse
+        # must not deactivate that whole list.
+        self.timer = self.change_log.timer = run_timer
+        removed_ids = [
+            record_id for record_id, record in current_records.items()
+            if record_id not in seen_ids and record.is_active and record.list_type in loaded
+        ]
+        for i in range(0, len(removed_ids), DIFF_BATCH_SIZE):
+            chunk = removed_ids[i:i + DIFF_BATCH_SIZE]
+            with run_timer.stage("db_write"):
+                names = dict(self.db.query(SanctionRecord.id, SanctionRecord.original_name).filter(SanctionRecord.id.in_(chunk)))
+                self.db.query(SanctionRecord).filter(SanctionRecord.id.in_(chunk)).update(
+                    {SanctionRecord.is_active: False, SanctionRecord.last_updated: datetime.utcnow()},
+                    synchronize_session=False
+                )
+            for record_id in chunk:
+                log = import_logs[current_records[record_id].list_type]
+                log.records_removed += 1
+                self.change_log.add(log.id, record_id, "REMOVED", old_value=f"Name: {names.get(record_id)}")
+        self.change_log.flush()
+
+        # 4. Link records of the same entity across lists for the search engine
+        if loaded:
+            with run_timer.stage("clusters"):
+                self._update_clusters()
 
         # Finalize logs
         total_new = 0
         total_updated = 0
         total_inactive = 0
         
-        for log in import_logs.values():
+        for list_type, log in import_logs.items():
             if log.status == "IN_PROGRESS":
                 log.status = "SUCCESS"
+            log.stage_stats = json.dumps(self._stage_stats(list_type))
             total_new += log.records_added
             total_updated += log.records_updated
             total_inactive += log.records_removed
@@ -250,5 +320,307 @@ class SanctionLoader:
         return {
             "new": total_new,
             "updated": total_updated,
-            "inactive": total_inactive
+            "inactive": total_inactive,
+            "sources": {list_type: log.status for list_type, log in import_logs.items()}
         }
+
+    def _load_source(self, list_type: str, records, current_records: dict, seen_ids: set, current_log: ImportLog):
+        """
+        Upserts one source's parsed records (the caller commits).
+
+        Records whose content_hash matches and that are active only get a bulk
+        last_seen bump. The rest (changed, reactivated, or hashed before) are
+        loaded in batches and diffed field by field.
+        """
+        timer = self.timer
+        # Batch list for bulk updating last_seen
+        ids_to_update_last_seen = []
+        to_diff = []
+
+        count = 0
+        for record_dict in records:
+            count += 1
+            
+            # Batch execution (BUT NO COMMIT)
+            if count % 2000 == 0:
+                # 1. Perform bulk update for last_seen
+                with timer.stage("db_write"):
+                    self._touch_last_seen(ids_to_update_last_seen)
+                ids_to_update_last_seen = []
+                
+                # 2. Log progress (NO COMMIT to avoid expiration)
+                msg = f"[{list_type}] Processed {count} records..."
+                logger.info(msg)
+                print(msg, flush=True)
+
+            record_id = record_dict["id"]
+            seen_ids.add(record_id)
+            
+            current = current_records.get(record_id)
+            if current is not None:
+                if current.is_active and current.content_hash == record_dict["content_hash"]:
+                    ids_to_update_last_seen.append(record_id)
+                    timer.count("unchanged")
+                else:
+                    to_diff.append(record_dict)
+                    if len(to_diff) >= DIFF_BATCH_SIZE:
+                        self._apply_changes(to_diff, current_log)
+                        to_diff = []
+            else:
+                # Insert new
+                new_record = SanctionRecord(
+                    id=record_id,
+                    list_type=list_type,
+                    original_name=record_dict["original_name"],
+                    normalized_name=record_dict["normalized_name"],
+                    alias_names=record_dict.get("alias_names"),
+                    program=record_dict.get("program"),
+                    nationality=record_dict.get("nationality"),
+                    birth_date=record_dict.get("birth_date"),
+                    entity_type=record_dict.get("entity_type"),
+                    gender=record_dict.get("gender"),
+                    url=record_dict.get("url"),
+                    un_id=record_dict.get("un_id"),
+                    remark=record_dict.get("remark"),
+                    function=record_dict.get("function"),
+                    content_hash=record_dict["content_hash"],
+                    is_active=True,
+                    first_seen=datetime.utcnow(),
+                    last_seen=datetime.utcnow()
+                )
+                self.db.add(new_record)
+                current_log.records_added += 1
+                
+                # Log Addition
+                self.change_log.add(current_log.id, record_id, "ADDED", new_value=f"Name: {record_dict.get('original_name')}")
+
+        # Final flush for this file
+        if to_diff:
+            self._apply_changes(to_diff, current_log)
+        with timer.stage("db_write"):
+            self._touch_last_seen(ids_to_update_last_seen)
+            self.db.flush()
+
+    def _load_source_bulk(self, list_type: str, records, current_log: ImportLog):
+        """
+        Applies one source with set-based SQL (the caller commits).
+
+        The parsed records are staged in a temporary table; ChangeLog rows and
+        counters come from INSERT ... SELECT / counts against the live table,
+        one UPDATE bumps last_seen, one INSERT ... ON CONFLICT DO UPDATE
+        applies adds, changes and reactivations, and one UPDATE deactivates
+        this list's records missing from the staging table.
+        """
+        now = datetime.utcnow()
+        timer = self.timer
+        conn = self.db.connection()
+        staged = staging_table
+        live = SanctionRecord.__table__
+        change_logs = ChangeLog.__table__
+        log_columns = ["import_log_id", "timestamp", "record_id", "change_type", "field_changed", "old_value", "new_value"]
+
+        def change_rows(change_type, record_id, field_changed, old_value, new_value):
+            return select(
+                literal(current_log.id), literal(now, live.c.last_seen.type), record_id,
+                literal(change_type), field_changed, old_value, new_value,
+            )
+
+        # 1. Stage (first occurrence of a duplicated id wins)
+        rows = {}
+        for record_dict in records:
+            if record_dict["id"] not in rows:
+                record_dict["list_type"] = list_type
+                rows[record_dict["id"]] = (record_dict["id"],) + tuple(record_dict.get(name) for name in RECORD_COLUMNS)
+        staged.drop(conn, checkfirst=True)
+        staged.create(conn)
+        self._stage_rows(conn, list(rows.values()))
+
+        joined = staged.join(live, live.c.id == staged.c.id)
+        is_new = ~select(live.c.id).where(live.c.id == staged.c.id).exists()
+
+        # 2. ChangeLog rows and counters, read before the live table changes
+        logged = 0
+        with timer.stage("change_log"):
+            logged += conn.execute(change_logs.insert().from_select(log_columns, change_rows(
+                "ADDED", staged.c.id, literal(None, String), literal(None, Text),
+                literal("Name: ") + func.coalesce(staged.c.original_name, "None"),
+            ).where(is_new))).rowcount
+            for field in LOGGED_FIELDS:
+                # Short values are copied in SQL; large ones go through the writer as patches
+                short = and_(
+                    func.coalesce(func.length(live.c[field]), 0) < PATCH_MIN_CHARS,
+                    func.coalesce(func.length(staged.c[field]), 0) < PATCH_MIN_CHARS,
+                )
+                differs = _differs(live.c, staged.c, [field])
+                logged += conn.execute(change_logs.insert().from_select(log_columns, change_rows(
+                    "UPDATED", staged.c.id, literal(field),
+                    func.nullif(live.c[field], ""), func.nullif(staged.c[field], ""),
+                ).select_from(joined).where(differs, short))).rowcount
+                large = select(staged.c.id, live.c[field], staged.c[field]).select_from(joined).where(differs, ~short)
+                for record_id, old_value, new_value in conn.execute(large).all():
+                    self.change_log.add_update(current_log.id, record_id, field, old_value, new_value, timestamp=now)
+
+        was_inactive = func.coalesce(live.c.is_active, false()) == false()
+        current_log.records_added += conn.execute(
+            select(func.count()).select_from(staged).where(is_new)
+        ).scalar()
+        current_log.records_updated += conn.execute(
+            select(func.count()).select_from(joined).where(
+                or_(was_inactive, _differs(live.c, staged.c, DIFF_FIELDS + ["alias_names"]))
+            )
+        ).scalar()
+
+        # 3. Everything still published was seen now; rows whose hash matches
+        # and that are active need nothing else
+        with timer.stage("db_write"):
+            conn.execute(update(live).where(live.c.id.in_(select(staged.c.id))).values(last_seen=now))
+        unchanged = select(live.c.id).where(
+            live.c.id == staged.c.id, live.c.is_active == true(), live.c.content_hash == staged.c.content_hash
+        ).exists()
+
+        # 4. Adds, changes and reactivations in one statement; list_type stays
+        # with the list that first published the id
+        upsert = self.dialect_insert(live).from_select(
+            ["id"] + RECORD_COLUMNS + ["is_active", "first_seen", "last_seen", "last_updated"],
+            # The WHERE also lets SQLite parse INSERT ... SELECT ... ON CONFLICT
+            select(staged, true(), literal(now, live.c.first_seen.type), literal(now, live.c.last_seen.type),
+                   literal(now, live.c.last_updated.type)).where(~unchanged),
+        )
+        changed = or_(was_inactive, _differs(live.c, upsert.excluded, DIFF_FIELDS + ["alias_names"]))
+        upsert = upsert.on_conflict_do_update(
+            index_elements=[live.c.id],
+            set_={
+                **{name: upsert.excluded[name] for name in RECORD_COLUMNS if name != "list_type"},
+                "is_active": true(),
+                "last_updated": case((changed, upsert.excluded.last_updated), else_=live.c.last_updated),
+            },
+        )
+        with timer.stage("db_write"):
+            conn.execute(upsert)
+
+        # 5. Deactivate this list's records that are no longer published
+        missing = and_(
+            live.c.list_type == list_type,
+            live.c.is_active == true(),
+            live.c.id.not_in(select(staged.c.id)),
+        )
+        with timer.stage("change_log"):
+            logged += conn.execute(change_logs.insert().from_select(log_columns, change_rows(
+                "REMOVED", live.c.id, literal(None, String),
+                literal("Name: ") + func.coalesce(live.c.original_name, "None"), literal(None, Text),
+            ).where(missing))).rowcount
+        with timer.stage("db_write"):
+            current_log.records_removed += conn.execute(
+                update(live).where(missing).values(is_active=False, last_updated=now)
+            ).rowcount
+
+        staged.drop(conn)
+        timer.count("staged", len(rows))
+        timer.count("change_log_rows", logged)  # rows written in SQL; the writer's rows are added by the caller
+        timer.count("unchanged", len(rows) - current_log.records_added - current_log.records_updated)
+        logger.info(
+            f"[{list_type}] Bulk load: {len(rows)} staged, {current_log.records_added} added, "
+            f"{current_log.records_updated} updated, {current_log.records_removed} removed"
+        )
+
+    @staticmethod
+    def _stage_rows(conn, rows):
+        """Fills the staging table: COPY on psycopg2, a plain DBAPI executemany otherwise."""
+        if not rows:
+            return
+        columns = ", ".join(c.name for c in staging_table.columns)
+        if conn.dialect.driver == "psycopg2":
+            buffer = io.StringIO()
+            # Quoted "" is an empty string, an unquoted empty field is NULL
+            csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC).writerows(rows)
+            buffer.seek(0)
+            with conn.connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY {staging_table.name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        elif conn.dialect.paramstyle == "qmark":
+            placeholders = ", ".join("?" for _ in staging_table.columns)
+            conn.exec_driver_sql(f"INSERT INTO {staging_table.name} ({columns}) VALUES ({placeholders})", rows)
+        else:
+            names = [c.name for c in staging_table.columns]
+            conn.execute(staging_table.insert(), [dict(zip(names, row)) for row in rows])
+
+    def _update_clusters(self):
+        """Recomputes the cross-list clusters of the active records (etl.clusters); writes only changed ids."""
+        live = SanctionRecord.__table__
+        rows = self.db.execute(
+            select(*[live.c[name] for name in CLUSTER_COLUMNS], live.c.is_active, live.c.cluster_id)
+        ).all()
+        clusters = build_clusters(tuple(row)[:len(CLUSTER_COLUMNS)] for row in rows if row.is_active)
+        changes = [
+            {"b_id": row.id, "b_cluster": clusters.get(row.id)}
+            for row in rows if clusters.get(row.id) != row.cluster_id
+        ]
+        if changes:
+            self.db.execute(
+                update(live).where(live.c.id == bindparam("b_id")).values(cluster_id=bindparam("b_cluster")),
+                changes,
+            )
+        linked = len(clusters) - len(set(clusters.values()))
+        logger.info(f"Clusters: {len(clusters)} active records in {len(clusters) - linked} clusters, "
+                    f"{len(changes)} cluster ids updated")
+
+    def _touch_last_seen(self, record_ids):
+        if record_ids:
+            self.db.query(SanctionRecord).filter(
+                SanctionRecord.id.in_(record_ids)
+            ).update(
+                {SanctionRecord.last_seen: datetime.utcnow()}, 
+                synchronize_session=False
+            )
+
+    def _apply_changes(self, record_dicts, current_log: ImportLog):
+        """Field-level diff of parsed records against their rows, loaded in one query."""
+        existing_by_id = {
+            r.id: r for r in self.db.query(SanctionRecord).filter(
+                SanctionRecord.id.in_([rd["id"] for rd in record_dicts])
+            )
+        }
+        for record_dict in record_dicts:
+            record_id = record_dict["id"]
+            existing = existing_by_id[record_id]
+            
+            # Reactivate if previously inactive
+            was_inactive = not existing.is_active
+            if was_inactive:
+                existing.is_active = True
+                existing.last_updated = datetime.utcnow()
+                current_log.records_updated += 1
+            
+            # Check for changes
+            changes = []
+            is_changed = False
+            for field in DIFF_FIELDS:
+                new_val = record_dict.get(field)
+                old_val = getattr(existing, field)
+                # Simple equality check (handle None vs "")
+                if (old_val or "") != (new_val or ""):
+                    is_changed = True
+                    changes.append((field, old_val, new_val))
+                    setattr(existing, field, new_val)
+            
+            # Always update normalized name if original changed
+            if existing.normalized_name != record_dict["normalized_name"]:
+                existing.normalized_name = record_dict["normalized_name"]
+                # We don't necessarily log normalized name change as it's derived
+            
+            # Update alias_names if changed (logged as a patch once the list is long)
+            if (existing.alias_names or "") != (record_dict.get("alias_names") or ""):
+                is_changed = True
+                changes.append(("alias_names", existing.alias_names, record_dict.get("alias_names")))
+                existing.alias_names = record_dict.get("alias_names")
+
+            existing.content_hash = record_dict["content_hash"]
+            existing.last_seen = datetime.utcnow()
+
+            if is_changed:
+                existing.last_updated = datetime.utcnow()
+                if not was_inactive:  # Don't double-count if we already counted reactivation
+                    current_log.records_updated += 1
+                
+                # Log changes
+                for field, old_v, new_v in changes:
+                    self.change_log.add_update(current_log.id, record_id, field, old_v, new_v)
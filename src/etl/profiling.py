@@ -0,0 +1,122 @@
+"""
+Stage timing and optional profiling for the importers (the SQL loader and
+the Cloud Function pipeline). Each side imports its own identical copy,
+functions/profiling.py and src/etl/profiling.py; see test_shared_modules.py.
+
+StageTimer accumulates seconds per named stage and plain counters. Stages
+nest and are exclusive: time spent in an inner stage (e.g. a change-log
+flush during the diff) is counted there and not again in the outer one.
+`iterate()` times a generator stage, so in a chain like parse -> prepare ->
+diff each stage gets only its own share of the time.
+
+With IMPORT_PROFILE=cprofile (or pyinstrument, if installed) `profiled()`
+also writes a profile of the wrapped run to IMPORT_PROFILE_DIR.
+"""
+import cProfile
+import io
+import os
+import pstats
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+
+# '', 'cprofile' or 'pyinstrument'
+PROFILE = os.getenv('IMPORT_PROFILE', '').strip().lower()
+PROFILE_DIR = os.getenv('IMPORT_PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'import_profiles'))
+
+
+class StageTimer:
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.counters = defaultdict(int)
+        self._stack = []  # time spent in inner stages, per open stage
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            inner = self._stack.pop()
+            self.seconds[name] += elapsed - inner
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    def iterate(self, name, iterable):
+        """Yields from `iterable`, counting the time spent producing each item as stage `name`."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def add(self, name, seconds):
+        if seconds:
+            self.seconds[name] += seconds
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def as_dict(self):
+        return {
+            'seconds': {name: round(value, 3) for name, value in self.seconds.items()},
+            'counters': dict(self.counters),
+            'total_seconds': round(sum(self.seconds.values()), 3),
+        }
+
+
+@contextmanager
+def profiled(name, mode=None, directory=None):
+    """
+    Profiles the block when `mode` (default IMPORT_PROFILE) is set. Yields a
+    dict whose 'path' is the report that is written when the block finishes
+    (None when not profiling).
+    """
+    mode = PROFILE if mode is None else mode
+    result = {'path': None}
+    if not mode:
+        yield result
+        return
+
+    directory = directory or PROFILE_DIR
+    os.makedirs(directory, exist_ok=True)
+    base = os.path.join(directory, f"{name}_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}")
+
+    profiler = None
+    if mode == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler()
+        except ImportError:
+            print('[WARN] pyinstrument is not installed; profiling with cProfile')
+            mode = 'cprofile'
+    if profiler is None:
+        profiler = cProfile.Profile()
+    result['path'] = base + ('.html' if mode == 'pyinstrument' else '.prof')
+
+    if mode == 'pyinstrument':
+        profiler.start()
+    else:
+        profiler.enable()
+    try:
+        yield result
+    finally:
+        if mode == 'pyinstrument':
+            profiler.stop()
+            with open(result['path'], 'w', encoding='utf-8') as f:
+                f.write(profiler.output_html())
+        else:
+            profiler.disable()
+            profiler.dump_stats(result['path'])
+            summary = io.StringIO()
+            pstats.Stats(profiler, stream=summary).sort_stats('cumulative').print_stats(40)
+            with open(base + '.txt', 'w', encoding='utf-8') as f:
+                f.write(summary.getvalue())
+        print(f'[OK] Profile written to {result["path"]}')
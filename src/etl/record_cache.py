@@ -0,0 +1,212 @@
+"""
+Parsed-record cache: one file per source and payload, used by the SQL
+loader (schema 'sql', src/etl/parsers.py) and by local tools
+(tools/parse_all.py writes schema 'firestore' from functions/parse_*.py for
+check_overlap.py). The Firestore importers do not read it: the Functions
+deploy ships only functions/, and they parse the downloads themselves. Each
+schema comes from its own parser set, so a list is parsed once per schema.
+
+A cache file holds the records one parser produced for one XML payload,
+stored column by column:
+
+    MAGIC | uint32 header length | header JSON | column blocks
+
+The header names the source, the parser schema ('sql' or 'firestore'), the
+SHA-256 of the XML payload, the row count and, per column, the offset/length
+of its block and the rows that lack the key (or, for sparse columns, the
+rows that have it). A block is the column's values as one zlib-compressed
+JSON array. Reading a column maps the file and decodes only that block, so
+e.g. ids and names can be pulled without touching the rest.
+
+Files are named <source>.<schema>.<payload hash>-<parser version>.rcache,
+so an unchanged download is served from the cache instead of being parsed
+again, and editing a parser invalidates its entries.
+"""
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+import zlib
+from datetime import datetime
+
+MAGIC = b'SDRC\x01'
+SUFFIX = '.rcache'
+
+_LEN = struct.Struct('<I')
+_MISSING = object()  # record has no such key
+
+
+def payload_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parser_version(*modules):
+    """Short hash of the parser modules' source, so a parser change invalidates the cache."""
+    digest = hashlib.sha256()
+    for module in modules:
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:8]
+
+
+def cache_path(cache_dir, source, schema, payload_hash, version=''):
+    return os.path.join(cache_dir, f'{source}.{schema}.{payload_hash[:16]}{"-" + version if version else ""}{SUFFIX}')
+
+
+def latest_cache(cache_dir, source, schema=None):
+    """Most recently written cache file for a source (any payload), or None."""
+    paths = glob.glob(os.path.join(cache_dir, f'{source}.{schema or "*"}.*{SUFFIX}'))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def _encode_column(records, name):
+    """zlib-compressed JSON array of the column, plus the rows that lack the key."""
+    values = []
+    missing = []
+    for i, rec in enumerate(records):
+        if name in rec:
+            values.append(rec[name])
+        else:
+            values.append(None)
+            missing.append(i)
+    data = json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return missing, zlib.compress(data, 6)
+
+
+def write_records(path, records, source, schema, payload_hash, version=''):
+    """Writes `records` (a list of dicts) as a cache file; returns the row count."""
+    names = list(dict.fromkeys(name for rec in records for name in rec))
+    blocks = []
+    columns = []
+    offset = 0
+    for name in names:
+        missing, block = _encode_column(records, name)
+        column = {'name': name, 'offset': offset, 'length': len(block)}
+        if len(missing) * 2 > len(records):
+            # Sparse column (e.g. 'error'): list the rows that have it instead
+            missing = set(missing)
+            column['present'] = [i for i in range(len(records)) if i not in missing]
+        else:
+            column['missing'] = missing
+        columns.append(column)
+        blocks.append(block)
+        offset += len(block)
+    header = json.dumps({
+        'source': source,
+        'schema': schema,
+        'payload_sha256': payload_hash,
+        'parser_version': version,
+        'rows': len(records),
+        'created_at': datetime.utcnow().isoformat(),
+        'columns': columns,
+    }).encode('utf-8')
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_LEN.pack(len(header)))
+        f.write(header)
+        for block in blocks:
+            f.write(block)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+class RecordCache:
+    """Read access to one cache file; columns are decoded on demand."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        if self._buf[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'Not a record cache file: {path}')
+        header_len = _LEN.unpack_from(self._buf, len(MAGIC))[0]
+        start = len(MAGIC) + _LEN.size
+        self.meta = json.loads(bytes(self._buf[start:start + header_len]).decode('utf-8'))
+        self._data_start = start + header_len
+        self._columns = {c['name']: c for c in self.meta['columns']}
+        self._decoded = {}
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._buf = b''
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def _values(self, name):
+        """Column values, with _MISSING for rows that lack the key."""
+        if name not in self._decoded:
+            col = self._columns[name]
+            start = self._data_start + col['offset']
+            with memoryview(self._buf) as view:
+                values = json.loads(zlib.decompress(view[start:start + col['length']]))
+            if 'present' in col:
+                present = set(col['present'])
+                values = [v if i in present else _MISSING for i, v in enumerate(values)]
+            for i in col.get('missing', ()):
+                values[i] = _MISSING
+            self._decoded[name] = values
+        return self._decoded[name]
+
+    def column(self, name):
+        """All values of one column (None where a record lacks it)."""
+        if name not in self._columns:
+            return [None] * len(self)
+        return [None if v is _MISSING else v for v in self._values(name)]
+
+    def records(self, columns=None):
+        """Yields the records as dicts, limited to `columns` when given."""
+        names = [n for n in (columns or self.columns) if n in self._columns]
+        cols = [self._values(n) for n in names]
+        for row in zip(*cols) if cols else ({} for _ in range(len(self))):
+            yield {n: v for n, v in zip(names, row) if v is not _MISSING}
+
+
+def load_or_parse(cache_dir, source, schema, xml_path, parse, version=''):
+    """
+    Records of `xml_path` for one parser schema: read from the cache when
+    this exact payload was parsed before by the same parser `version`,
+    otherwise `parse()` (an iterable of record dicts) is run and cached. Older cache files of the same source and
+    schema are removed. Returns (records, cache_path, cache_hit).
+    """
+    payload_hash = payload_sha256(xml_path)
+    path = cache_path(cache_dir, source, schema, payload_hash, version)
+    if os.path.exists(path):
+        try:
+            with RecordCache(path) as cache:
+                return list(cache.records()), path, True
+        except (ValueError, OSError, zlib.error) as e:
+            print(f'[WARN] Ignoring unreadable cache {path}: {e}')
+
+    records = list(parse())
+    write_records(path, records, source, schema, payload_hash, version)
+    for old in glob.glob(os.path.join(cache_dir, f'{source}.{schema}.*{SUFFIX}')):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return records, path, False
+
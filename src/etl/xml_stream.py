@@ -0,0 +1,137 @@
+"""
+Streaming helpers shared by the sanctions list parsers: the parse_* modules
+of the Cloud Functions and src/etl/parsers.py of the SQL loader.
+
+The module exists twice, identically, as functions/xml_stream.py and
+src/etl/xml_stream.py: the Functions deploy ships only functions/, and the
+SQL service does not import from it. Change both; test_shared_modules.py
+fails while they differ.
+
+Uses lxml when installed: iterparse(tag=...) only materialises events for the
+elements we ask for, and processed siblings are deleted from the tree so
+memory stays flat across the file. Falls back to xml.etree.ElementTree,
+tracking parents so processed elements can still be released.
+
+SANCTIONS_XML_BACKEND=etree forces the stdlib backend.
+
+The parsers take a file path or a ByteStream, so a download can be parsed
+while it arrives instead of being saved first.
+"""
+import hashlib
+import os
+import xml.etree.ElementTree as ET
+
+try:
+    from lxml import etree as LET
+except ImportError:
+    LET = None
+
+XML_BACKEND = os.getenv('SANCTIONS_XML_BACKEND', 'lxml' if LET is not None else 'etree').lower()
+
+
+def resolve_backend(backend=None):
+    backend = (backend or XML_BACKEND).lower()
+    if backend == 'lxml' and LET is None:
+        return 'etree'
+    return backend
+
+
+def local_name(tag):
+    if not isinstance(tag, str):
+        return ''
+    return tag.rpartition('}')[2]
+
+
+class ByteStream:
+    """
+    File-like reader over an iterator of byte chunks (e.g. an HTTP body).
+    Counts and hashes the bytes as they are pulled; root_attrib() buffers
+    just enough of the start to read the document element, and read()
+    serves that buffer again before pulling more chunks.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = bytearray()
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+
+    def _pull(self):
+        for chunk in self._chunks:
+            if chunk:
+                self._sha256.update(chunk)
+                self.size += len(chunk)
+                self._buf += chunk
+                return True
+        return False
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            while self._pull():
+                pass
+            n = len(self._buf)
+        while len(self._buf) < n and self._pull():
+            pass
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        return data
+
+    def root_attrib(self):
+        parser = ET.XMLPullParser(events=('start',))
+        fed = 0
+        while True:
+            if fed == len(self._buf) and not self._pull():
+                return {}
+            parser.feed(bytes(self._buf[fed:]))
+            fed = len(self._buf)
+            for _, elem in parser.read_events():
+                return dict(elem.attrib)
+
+    def hexdigest(self):
+        """SHA-256 of the whole body; reads (and drops) whatever the parser left unread."""
+        while self._pull():
+            self._buf.clear()
+        self._buf.clear()
+        return self._sha256.hexdigest()
+
+
+def root_attrib(xml_path):
+    """Attributes of the document element, read without parsing the rest of the file."""
+    if isinstance(xml_path, ByteStream):
+        return xml_path.root_attrib()
+    for _, elem in ET.iterparse(xml_path, events=('start',)):
+        return dict(elem.attrib)
+    return {}
+
+
+def iter_elements(xml_path, tags, backend=None):
+    """
+    Yields each element whose local name is in `tags` once it is fully parsed.
+
+    The element (and everything parsed before it) is released when the caller
+    asks for the next one, so do not keep references across iterations.
+    """
+    if resolve_backend(backend) == 'lxml':
+        ctx = LET.iterparse(xml_path, events=('end',), tag=['{*}' + t for t in tags])
+        for _, elem in ctx:
+            yield elem
+            elem.clear(keep_tail=True)
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+        del ctx
+        return
+
+    wanted = set(tags)
+    stack = []
+    for event, elem in ET.iterparse(xml_path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if local_name(elem.tag) in wanted:
+            yield elem
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
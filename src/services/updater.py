@@ -1,8 +1,14 @@
 import os
+import functools
+import hashlib
 import requests
 import tempfile
+import time
 import logging
+from datetime import datetime
+from typing import Dict, Optional
 from src.db.session import SessionLocal
+from src.db.models import SourceFetchState
 from src.etl.loader import SanctionLoader
 from src.api.services.engine import search_engine
 
@@ -47,42 +53,151 @@ def download_to_temp(url: str, suffix: str = ".xml") -> str:
                 pass
         raise
 
-def run_daily_update():
+def download_if_changed(url: str, state: Optional[Dict] = None, suffix: str = ".xml") -> Dict:
+    """
+    Conditional GET of one list.
+
+    `state` holds the validators of the last imported download ("etag",
+    "last_modified", "sha256"). They are sent as If-None-Match /
+    If-Modified-Since; a 304, or a 200 whose body hashes to the stored
+    SHA-256 (servers without validators), counts as unchanged and no file is
+    kept. Returns {"changed", "path", "etag", "last_modified", "sha256",
+    "size_bytes"}; when changed, the caller owns and must delete `path`.
+    """
+    state = state or {}
+    headers = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+
+    fd, path = tempfile.mkstemp(suffix=suffix)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            logger.info(f"Downloading {url} to {path} (conditional: {bool(headers)})...")
+            with requests.get(url, stream=True, timeout=120, headers=headers) as r:
+                if r.status_code == 304:
+                    result = {
+                        "changed": False,
+                        "path": None,
+                        "etag": r.headers.get("ETag") or state.get("etag"),
+                        "last_modified": r.headers.get("Last-Modified") or state.get("last_modified"),
+                        "sha256": state.get("sha256"),
+                        "size_bytes": state.get("size_bytes"),
+                    }
+                else:
+                    r.raise_for_status()
+                    for chunk in r.iter_content(chunk_size=65536):
+                        if chunk:
+                            tmp.write(chunk)
+                            digest.update(chunk)
+                            size += len(chunk)
+                    sha256 = digest.hexdigest()
+                    result = {
+                        "changed": sha256 != state.get("sha256"),
+                        "path": path,
+                        "etag": r.headers.get("ETag"),
+                        "last_modified": r.headers.get("Last-Modified"),
+                        "sha256": sha256,
+                        "size_bytes": size,
+                    }
+    except Exception as e:
+        logger.error(f"Failed to download {url}: {e}")
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+
+    if not result["changed"]:
+        if os.path.exists(path):
+            os.unlink(path)
+        result["path"] = None
+        logger.info(f"Unchanged since last import: {url}")
+    else:
+        logger.info(f"Finished downloading {url} ({size} bytes)")
+    return result
+
+def _load_fetch_states(db) -> Dict[str, Dict]:
+    return {
+        s.source: {
+            "url": s.url,
+            "etag": s.etag,
+            "last_modified": s.last_modified,
+            "sha256": s.sha256,
+            "size_bytes": s.size_bytes,
+        }
+        for s in db.query(SourceFetchState).all()
+    }
+
+def _save_fetch_states(db, urls: Dict[str, str], fetched: Dict[str, Dict], statuses: Dict[str, str]):
+    """Stores validators only for sources that imported (or were skipped as unchanged)."""
+    now = datetime.utcnow()
+    for key, result in fetched.items():
+        if statuses.get(key) not in ("SUCCESS", "SKIPPED_UNCHANGED"):
+            continue
+        state = db.get(SourceFetchState, key) or SourceFetchState(source=key)
+        state.url = urls[key]
+        state.etag = result["etag"]
+        state.last_modified = result["last_modified"]
+        state.sha256 = result["sha256"]
+        state.size_bytes = result["size_bytes"]
+        state.checked_at = now
+        if result["changed"]:
+            state.changed_at = now
+        db.add(state)
+    db.commit()
+
+def run_daily_update(urls: Optional[Dict[str, str]] = None):
+    """
+    Downloads and imports the lists. `urls` defaults to SANCTIONS_LIST_URLS;
+    pass local URLs to run the whole pipeline against a stand-in server.
+    """
     logger.info("Starting daily sanctions update...")
+    urls = urls or SANCTIONS_LIST_URLS
     temp_files = {}
-    
+    fetched = {}
+
+    db = SessionLocal()
     try:
-        # 1. Download all files
-        for key, url in SANCTIONS_LIST_URLS.items():
-            try:
-                temp_path = download_to_temp(url)
-                temp_files[key] = temp_path
-            except Exception as e:
-                logger.error(f"Skipping {key} due to download error: {e}")
+        states = _load_fetch_states(db)
 
-        if not temp_files:
-            logger.error("No files downloaded. Aborting update.")
-            return
+        def fetch(key, url):
+            # Validators only apply to the URL they were recorded for
+            state = states.get(key) if states.get(key, {}).get("url") == url else None
+            result = download_if_changed(url, state)
+            fetched[key] = result
+            if result["path"]:
+                temp_files[key] = result["path"]
+            return result["path"]
 
-        # 2. Run Import
-        db = SessionLocal()
+        # 1. Download and import. The loader runs the downloads concurrently and
+        # parses each file as soon as it lands; a failed download marks that
+        # source's ImportLog FAILED and leaves its records untouched, an
+        # unchanged one is logged SKIPPED_UNCHANGED without parsing.
         try:
             loader = SanctionLoader(db)
-            stats = loader.run_update(temp_files)
+            stats = loader.run_update({
+                key: functools.partial(fetch, key, url)
+                for key, url in urls.items()
+            })
             logger.info(f"Update completed. Stats: {stats}")
+            _save_fetch_states(db, urls, fetched, stats["sources"])
             
-            # 3. Reload Search Engine
-            logger.info("Reloading in-memory search engine...")
-            search_engine.load_data(db)
-            logger.info("Search engine reloaded.")
+            # 2. Reload Search Engine (only if some list actually changed)
+            if any(status == "SUCCESS" for status in stats["sources"].values()):
+                logger.info("Reloading in-memory search engine...")
+                started = time.perf_counter()
+                search_engine.load_data(db)
+                loader.record_run_stage("engine_reload", time.perf_counter() - started, stats.get("profile"))
+                logger.info("Search engine reloaded.")
             
         except Exception as e:
             logger.error(f"Error during database update: {e}")
-        finally:
-            db.close()
 
     finally:
-        # 4. Cleanup Temp Files
+        db.close()
+        # 3. Cleanup Temp Files
         for path in temp_files.values():
             if os.path.exists(path):
                 try:
@@ -0,0 +1,31 @@
+"""
+Compact change-log encoding: large values are stored as a reversible patch.
+Runs without a database:
+
+    python test_change_log_patch.py
+"""
+from src.etl.change_log import apply_patch, encode_change, make_patch
+
+OLD = "Designated under Regulation 269/2014. " * 10 + "Owner of OOO Alpha."
+NEW = "Designated under Regulation 269/2014. " * 10 + "Former owner of OOO Alpha and OOO Beta."
+
+
+def test_round_trip():
+    patch = make_patch(OLD, NEW)
+    assert apply_patch(OLD, patch) == NEW
+    assert apply_patch(NEW, patch, reverse=True) == OLD
+    assert apply_patch("", make_patch("", "abc")) == "abc"
+
+
+def test_encode_change():
+    old_value, new_value, patch = encode_change(OLD, NEW)
+    assert old_value is None and new_value is None and len(patch) < len(NEW)
+    # Short values and adds/removals keep the full strings
+    assert encode_change("Ivan", "Ivan P.") == ("Ivan", "Ivan P.", None)
+    assert encode_change(None, NEW) == (None, NEW, None)
+
+
+if __name__ == '__main__':
+    test_round_trip()
+    test_encode_change()
+    print('Change log patch checks passed.')
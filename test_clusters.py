@@ -0,0 +1,43 @@
+"""
+Cross-list entity clusters (src/etl/clusters.py). Runs without a database:
+
+    python test_clusters.py
+"""
+from src.etl.clusters import birth_year, build_clusters
+
+
+def test_links():
+    clusters = build_clusters([
+        # Same person, dates in EU and UK formats
+        ('EU_1', 'EU', '', 'ivan petrov', '1960-01-02', 'Individual'),
+        ('UK_9', 'UK', None, 'ivan petrov', '02/01/1960', 'Individual'),
+        # Same name, other birth year: a different person
+        ('US_5', 'US', '', 'ivan petrov', '2 Jan 1961', 'Individual'),
+        # UN reference number, whatever the names
+        ('US_7', 'US', 'QDi.1', 'alpha trading', '', 'Entity'),
+        ('UK_2', 'UK', 'qdi.1 ', 'alfa trading', '', 'Entity'),
+        # Two "acme" entities on EU: the name cannot tell which one UK means
+        ('EU_3', 'EU', '', 'acme', '', 'Entity'),
+        ('EU_4', 'EU', '', 'acme', '', 'Entity'),
+        ('UK_5', 'UK', '', 'acme', '', 'Entity'),
+        # Same name, different kind
+        ('EU_6', 'EU', '', 'ocean star', '', 'Entity'),
+        ('UK_6', 'UK', '', 'ocean star', '', 'Vessel'),
+    ])
+    assert clusters['UK_9'] == clusters['EU_1'] == 'EU_1'
+    assert clusters['US_5'] == 'US_5'
+    assert clusters['US_7'] == clusters['UK_2'] == 'UK_2'
+    assert len({clusters['EU_3'], clusters['EU_4'], clusters['UK_5']}) == 3
+    assert clusters['EU_6'] != clusters['UK_6']
+
+
+def test_birth_year():
+    assert birth_year('07 Oct 1952') == '1952'
+    assert birth_year('circa 1970-1972') == '1970'
+    assert birth_year(None) is None
+
+
+if __name__ == '__main__':
+    test_links()
+    test_birth_year()
+    print('Cluster checks passed.')
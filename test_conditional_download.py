@@ -0,0 +1,122 @@
+"""
+Conditional download / unchanged-skip checks against a local stand-in for the
+list servers. Runs without network access or a real database:
+
+    python test_conditional_download.py
+"""
+import hashlib
+import http.server
+import os
+import threading
+from email.utils import formatdate
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.db.session import Base
+from src.db.models import ImportLog, SanctionRecord
+from src.etl.loader import SanctionLoader
+from src.services.updater import download_if_changed
+
+PAYLOADS = {
+    "/etag.xml": b"<export>version 1</export>",
+    "/plain.xml": b"<export>no validators</export>",
+}
+LAST_MODIFIED = formatdate(0, usegmt=True)
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Serves PAYLOADS; /etag.xml honours If-None-Match / If-Modified-Since, /plain.xml sends no validators."""
+
+    requests_seen = []
+
+    def do_GET(self):
+        body = PAYLOADS[self.path]
+        self.requests_seen.append((self.path, dict(self.headers)))
+        if self.path == "/etag.xml":
+            etag = '"%s"' % hashlib.sha256(body).hexdigest()[:16]
+            if self.headers.get("If-None-Match") == etag or (
+                not self.headers.get("If-None-Match") and self.headers.get("If-Modified-Since") == LAST_MODIFIED
+            ):
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", LAST_MODIFIED)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def test_conditional_get():
+    server, base = start_server()
+    try:
+        first = download_if_changed(base + "/etag.xml")
+        assert first["changed"] and first["etag"] and os.path.exists(first["path"])
+        os.unlink(first["path"])
+
+        # Same validators -> 304, nothing kept
+        again = download_if_changed(base + "/etag.xml", first)
+        assert not again["changed"] and again["path"] is None
+        assert StandInHandler.requests_seen[-1][1].get("If-None-Match") == first["etag"]
+
+        # Content changed on the server -> full download
+        PAYLOADS["/etag.xml"] = b"<export>version 2</export>"
+        changed = download_if_changed(base + "/etag.xml", first)
+        assert changed["changed"] and changed["sha256"] != first["sha256"]
+        os.unlink(changed["path"])
+    finally:
+        server.shutdown()
+
+
+def test_hash_fallback_without_validators():
+    server, base = start_server()
+    try:
+        first = download_if_changed(base + "/plain.xml")
+        assert first["changed"] and first["etag"] is None
+        os.unlink(first["path"])
+
+        # No ETag/Last-Modified: the body is downloaded but recognised by its SHA-256
+        again = download_if_changed(base + "/plain.xml", first)
+        assert not again["changed"] and again["path"] is None
+        assert again["sha256"] == first["sha256"]
+    finally:
+        server.shutdown()
+
+
+def test_loader_skips_unchanged_source():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    db.add(SanctionRecord(id="EU_1", list_type="EU", original_name="Test Person", is_active=True))
+    db.commit()
+
+    stats = SanctionLoader(db).run_update({"EU": lambda: None})
+
+    assert stats["sources"] == {"EU": "SKIPPED_UNCHANGED"}
+    log = db.query(ImportLog).one()
+    assert log.status == "SKIPPED_UNCHANGED" and log.parse_seconds is None
+    # Records of a skipped list are neither re-parsed nor deactivated
+    assert db.query(SanctionRecord).filter(SanctionRecord.is_active == True).count() == 1
+    db.close()
+
+
+if __name__ == "__main__":
+    test_conditional_get()
+    test_hash_fallback_without_validators()
+    test_loader_skips_unchanged_source()
+    print("Conditional download checks passed.")
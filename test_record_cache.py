@@ -0,0 +1,59 @@
+"""
+Record cache round-trip and payload-keyed reuse. Runs without Firestore or a
+database:
+
+    python test_record_cache.py
+"""
+import os
+import tempfile
+
+from src.etl.record_cache import RecordCache, latest_cache, load_or_parse, write_records
+
+RECORDS = [
+    {'id': 'EU_1', 'main_name': 'Ivan Petrov', 'aliases': ['I. Petrov'], 'details': {'program': 'RUS'}, 'gender': None},
+    {'id': 'EU_2', 'main_name': 'Olga Ivanova', 'aliases': [], 'details': {'program': None}},
+    {'error': 'bad entry'},
+]
+
+
+def test_round_trip():
+    path = os.path.join(tempfile.mkdtemp(), 'EU.firestore.test.rcache')
+    write_records(path, RECORDS, 'EU', 'firestore', '0' * 64)
+    with RecordCache(path) as cache:
+        assert len(cache) == 3
+        # Missing keys stay missing, None stays None, nested values keep their type
+        assert list(cache.records()) == RECORDS
+        assert cache.column('id') == ['EU_1', 'EU_2', None]
+        assert list(cache.records(['main_name'])) == [{'main_name': 'Ivan Petrov'}, {'main_name': 'Olga Ivanova'}, {}]
+
+
+def test_reuse_by_payload():
+    tmp_dir = tempfile.mkdtemp()
+    xml_path = os.path.join(tmp_dir, 'EU.xml')
+    with open(xml_path, 'w') as f:
+        f.write('<export>v1</export>')
+    calls = []
+
+    def parse():
+        calls.append(1)
+        return iter(RECORDS)
+
+    first, path, hit = load_or_parse(tmp_dir, 'EU', 'firestore', xml_path, parse, 'p1')
+    assert not hit and first == RECORDS
+    again, _, hit = load_or_parse(tmp_dir, 'EU', 'firestore', xml_path, parse, 'p1')
+    assert hit and again == RECORDS and len(calls) == 1
+
+    # A new parser version or payload is parsed again and replaces the old entry
+    _, _, hit = load_or_parse(tmp_dir, 'EU', 'firestore', xml_path, parse, 'p2')
+    assert not hit and len(calls) == 2
+    with open(xml_path, 'w') as f:
+        f.write('<export>v2</export>')
+    _, newest, hit = load_or_parse(tmp_dir, 'EU', 'firestore', xml_path, parse, 'p2')
+    assert not hit and not os.path.exists(path)
+    assert latest_cache(tmp_dir, 'EU', 'firestore') == newest
+
+
+if __name__ == '__main__':
+    test_round_trip()
+    test_reuse_by_payload()
+    print('Record cache checks passed.')
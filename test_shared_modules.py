@@ -0,0 +1,28 @@
+"""
+Modules both pipelines need are kept as identical copies in functions/ and
+src/etl/: the Functions deploy ships only functions/ (firebase.json), and
+the SQL service does not import from it. Fails when a copy was changed
+without the other:
+
+    python test_shared_modules.py
+"""
+import filecmp
+import os
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# File names present in both functions/ and src/etl/
+SHARED_MODULES = ['profiling.py', 'xml_stream.py']
+
+
+def test_copies_are_identical():
+    for name in SHARED_MODULES:
+        functions_copy = os.path.join(ROOT, 'functions', name)
+        etl_copy = os.path.join(ROOT, 'src', 'etl', name)
+        assert filecmp.cmp(functions_copy, etl_copy, shallow=False), \
+            f"functions/{name} and src/etl/{name} differ; apply the change to both"
+
+
+if __name__ == '__main__':
+    test_copies_are_identical()
+    print('Shared module checks passed.')
@@ -0,0 +1,54 @@
+"""
+Import stage timing and profiling (src/etl/profiling.py, mirrored in functions/). Runs without a database:
+
+    python test_stage_timer.py
+"""
+import os
+import tempfile
+import time
+
+from src.etl.profiling import StageTimer, profiled
+
+
+def test_nested_stages_are_exclusive():
+    timer = StageTimer()
+    with timer.stage('diff'):
+        time.sleep(0.02)
+        with timer.stage('change_log'):
+            time.sleep(0.05)
+    assert timer.seconds['change_log'] >= 0.05
+    assert 0.02 <= timer.seconds['diff'] < 0.05
+
+
+def test_iterate_counts_only_producer_time():
+    timer = StageTimer()
+
+    def slow():
+        for i in range(3):
+            time.sleep(0.01)
+            yield i
+
+    for item in timer.iterate('parse', slow()):
+        time.sleep(0.02)  # consumer time is not parse time
+    assert 0.03 <= timer.seconds['parse'] < 0.06
+    timer.count('records', 3)
+    stats = timer.as_dict()
+    assert stats['counters'] == {'records': 3}
+    assert stats['total_seconds'] == stats['seconds']['parse']
+
+
+def test_profiled_writes_report():
+    with tempfile.TemporaryDirectory() as directory:
+        with profiled('test', mode='cprofile', directory=directory) as profile:
+            sum(range(1000))
+        assert profile['path'].endswith('.prof') and os.path.exists(profile['path'])
+        with profiled('test', mode='') as profile:
+            pass
+        assert profile['path'] is None
+
+
+if __name__ == '__main__':
+    test_nested_stages_are_exclusive()
+    test_iterate_counts_only_producer_time()
+    test_profiled_writes_report()
+    print('Stage timer checks passed.')
@@ -0,0 +1,171 @@
+"""
+Benchmark the cold start of each Cloud Functions entry point: every
+measurement runs in a fresh interpreter, as a new instance would.
+
+Per entry point it reports
+  import_seconds        importing the module that defines the function
+  modules_loaded        modules that import pulled in
+  options_seconds       answering a first OPTIONS (CORS/health) request
+  client_init_seconds   creating the Firestore client the function uses
+                        (firestore_clients.py; no request is sent)
+  slowest_imports       the top-level imports with the largest cumulative
+                        time (python -X importtime)
+as the median of --repeat runs.
+
+To compare with another checkout, point --functions-dir at its functions
+directory (e.g. after `git worktree add /tmp/before HEAD~1`); entry points
+it cannot import are reported with their error.
+
+Usage:
+    python tools/benchmark_cold_start.py
+    python tools/benchmark_cold_start.py --repeat 10 --json cold_start.json
+    python tools/benchmark_cold_start.py --functions-dir /tmp/before/functions
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FUNCTIONS_DIR = os.path.join(ROOT, 'functions')
+
+# (name, module, function, Firestore client it uses)
+ENTRY_POINTS = [
+    ('download_sanctions_lists', 'main', 'download_sanctions_lists', 'admin'),
+    ('admin_dashboard_api', 'main', 'admin_dashboard_api', 'admin'),
+    ('search_sanctions', 'search_api_main', 'search_sanctions', 'cloud'),
+    ('batch_screening', 'batch_screening_api', 'batch_screening', 'cloud'),
+    ('two_stage_import', 'import_sanctions_two_stage', None, 'admin'),
+]
+
+# Runs in the fresh interpreter; prints one JSON line
+PROBE = r'''
+import importlib, json, sys, time
+functions_dir, module_name, function_name, client = sys.argv[1:5]
+sys.path.insert(0, functions_dir)
+result = {}
+print('probe: import', file=sys.stderr, flush=True)
+before = set(sys.modules)
+started = time.perf_counter()
+module = importlib.import_module(module_name)
+result['import_seconds'] = time.perf_counter() - started
+result['modules_loaded'] = len(set(sys.modules) - before)
+
+if function_name != '-':
+    try:
+        from flask import Request
+        from werkzeug.test import EnvironBuilder
+        request = Request(EnvironBuilder(method='OPTIONS').get_environ())
+        started = time.perf_counter()
+        getattr(module, function_name)(request)
+        result['options_seconds'] = time.perf_counter() - started
+    except Exception as e:
+        result['options_error'] = f"{type(e).__name__}: {e}"
+
+try:
+    import firestore_clients
+    factory = firestore_clients.admin_db if client == 'admin' else firestore_clients.cloud_db
+    started = time.perf_counter()
+    factory()
+    result['client_init_seconds'] = time.perf_counter() - started
+except Exception as e:
+    result['client_init_error'] = f"{type(e).__name__}: {e}"
+print(json.dumps(result))
+'''
+
+
+def slowest_imports(stderr, top):
+    """Top-level imports of the entry point from -X importtime output, by cumulative microseconds"""
+    imports = []
+    # Interpreter start-up imports come before the probe's marker
+    stderr = stderr.split('probe: import', 1)[-1]
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        try:
+            _, cumulative, name = line[len('import time:'):].split('|')
+        except ValueError:
+            continue
+        if name.startswith('  '):
+            continue  # nested import, already in its parent's cumulative time
+        imports.append((int(cumulative), name.strip()))
+    imports.sort(reverse=True)
+    return [{'module': name, 'cumulative_ms': round(us / 1000, 1)} for us, name in imports[:top]]
+
+
+def probe(functions_dir, module, function, client, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', PROBE, functions_dir, module, function or '-', client]
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+    completed = subprocess.run(command, capture_output=True, text=True, cwd=functions_dir, env=env, timeout=300)
+    lines = [line for line in completed.stdout.splitlines() if line.startswith('{')]
+    if completed.returncode != 0 or not lines:
+        error = (completed.stderr.strip().splitlines() or ['no output'])[-1]
+        return {'error': error}, completed.stderr
+    return json.loads(lines[-1]), completed.stderr
+
+
+def benchmark(functions_dir, repeat, top):
+    report = {}
+    for name, module, function, client in ENTRY_POINTS:
+        runs = []
+        for i in range(repeat):
+            result, stderr = probe(functions_dir, module, function, client, importtime=(i == 0))
+            if 'error' in result:
+                report[name] = {'module': module, 'error': result['error']}
+                break
+            if i == 0:
+                slowest = slowest_imports(stderr, top)
+                # -X importtime slows the first run down; it is not counted
+                result, _ = probe(functions_dir, module, function, client)
+            runs.append(result)
+        else:
+            entry = {'module': module, 'runs': len(runs)}
+            for key in ('import_seconds', 'options_seconds', 'client_init_seconds', 'modules_loaded'):
+                values = [run[key] for run in runs if key in run]
+                if values:
+                    median = statistics.median(values)
+                    entry[key] = int(median) if key == 'modules_loaded' else round(median, 4)
+            for key in ('options_error', 'client_init_error'):
+                if key in runs[0]:
+                    entry[key] = runs[0][key]
+            entry['slowest_imports'] = slowest
+            report[name] = entry
+        entry = report[name]
+        if 'error' in entry:
+            print(f"{name:26} ERROR {entry['error']}")
+        else:
+            client_init = (f"{entry['client_init_seconds']}s" if 'client_init_seconds' in entry
+                           else f"ERROR {entry.get('client_init_error')}")
+            print(f"{name:26} import {entry['import_seconds']}s, {entry['modules_loaded']} modules, "
+                  f"client {client_init}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--functions-dir', default=FUNCTIONS_DIR)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=8, help='Slowest imports listed per entry point')
+    parser.add_argument('--json', help='Write the report here')
+    args = parser.parse_args()
+
+    report = {
+        'python': sys.version.split()[0],
+        'functions_dir': os.path.abspath(args.functions_dir),
+        'repeat': args.repeat,
+        'entry_points': benchmark(os.path.abspath(args.functions_dir), args.repeat, args.top),
+    }
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
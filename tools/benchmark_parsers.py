@@ -0,0 +1,320 @@
+"""
+Benchmark the sanctions XML parsers on the lxml and ElementTree backends.
+
+Reports throughput and peak memory for each source/backend pair. Each run
+happens in a fresh process so peak RSS is not polluted by earlier runs.
+
+Uses the real files when given (or found in data/sanctions/), otherwise
+generates synthetic files shaped and sized like the published EU, UK and OFAC
+exports.
+
+Usage:
+    python tools/benchmark_parsers.py
+    python tools/benchmark_parsers.py --eu data/sanctions/EU.xml --uk data/sanctions/UK.xml --us data/sanctions/US_SDN_SIMPLE.xml
+    python tools/benchmark_parsers.py --pipeline functions --scale 0.5 --json out.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+SAN_DIR = os.path.join(ROOT, 'data', 'sanctions')
+DEFAULT_FILES = {
+    'EU': os.path.join(SAN_DIR, 'EU.xml'),
+    'UK': os.path.join(SAN_DIR, 'UK.xml'),
+    'US': os.path.join(SAN_DIR, 'US_SDN_SIMPLE.xml'),
+}
+# Approximate sizes of the published exports, in MB
+REAL_SIZES_MB = {'EU': 25, 'UK': 18, 'US': 15}
+
+FIRST = ['Ali', 'Ivan', 'Maria', 'Chen', 'Omar', 'Olga', 'Kim', 'Hassan', 'Sergei', 'Fatima', 'Jose', 'Anna']
+LAST = ['Petrov', 'Hussein', 'Kim', 'Ivanova', 'Al-Rashid', 'Smirnov', 'Wang', 'Kuznetsov', 'Haddad', 'Garcia']
+COMPANY = ['Trading', 'Shipping', 'Holdings', 'Energy', 'Bank', 'Industries', 'Logistics', 'Petroleum']
+COUNTRIES = [('RU', 'RUSSIAN FEDERATION'), ('IR', 'IRAN'), ('KP', 'NORTH KOREA'), ('SY', 'SYRIA'), ('BY', 'BELARUS')]
+PROGRAMS = ['RUS', 'IRN', 'PRK', 'SYR', 'BLR', 'UKR']
+
+
+def _esc(s):
+    return s.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('"', '&quot;')
+
+
+def _person(rnd):
+    return rnd.choice(FIRST), rnd.choice(LAST)
+
+
+def _eu_entity(rnd, i):
+    is_person = rnd.random() < 0.6
+    code = 'person' if is_person else 'enterprise'
+    parts = [f'<sanctionEntity designationDetails="" unitedNationId="{"QDi." + str(i) if rnd.random() < 0.2 else ""}" '
+             f'euReferenceNumber="EU.{i}.{rnd.randint(10, 99)}" logicalId="{i}">']
+    if rnd.random() < 0.5:
+        parts.append(f'<remark>{_esc("Listed pursuant to " + rnd.choice(PROGRAMS) + " measures. " * rnd.randint(1, 6))}</remark>')
+    for _ in range(rnd.randint(1, 2)):
+        parts.append(f'<regulation regulationType="amendment" organisationType="council" publicationDate="2022-03-01" '
+                     f'programme="{rnd.choice(PROGRAMS)}" logicalId="{rnd.randint(1, 9999)}">'
+                     f'<publicationUrl>https://eur-lex.europa.eu/legal-content/EN/TXT/?uri=OJ:L:2022:{rnd.randint(1, 999)}</publicationUrl></regulation>')
+    parts.append(f'<subjectType code="{code}" classificationCode="{"P" if is_person else "E"}"/>')
+    for n in range(rnd.randint(1, 8)):
+        if is_person:
+            first, last = _person(rnd)
+            whole = f'{first} {last}'
+            gender = rnd.choice(['M', 'F', ''])
+        else:
+            first, last = '', ''
+            whole = f'{rnd.choice(LAST)} {rnd.choice(COMPANY)} {rnd.randint(1, 999)}'
+            gender = ''
+        parts.append(f'<nameAlias firstName="{first}" middleName="" lastName="{last}" wholeName="{_esc(whole)}" '
+                     f'function="{"Minister" if is_person and rnd.random() < 0.2 else ""}" gender="{gender}" '
+                     f'title="" nameLanguage="" strong="{"true" if n == 0 else "false"}" logicalId="{rnd.randint(1, 99999)}">'
+                     f'<regulationSummary regulationType="amendment" publicationDate="2022-03-01" numberTitle="2022/1" '
+                     f'publicationUrl="https://eur-lex.europa.eu/x"/></nameAlias>')
+    if is_person:
+        for _ in range(rnd.randint(0, 2)):
+            iso, desc = rnd.choice(COUNTRIES)
+            parts.append(f'<citizenship region="" countryIso2Code="{iso}" countryDescription="{desc}" logicalId="{rnd.randint(1, 99999)}"/>')
+        for _ in range(rnd.randint(0, 2)):
+            y = rnd.randint(1940, 1990)
+            parts.append(f'<birthdate circa="false" calendarType="GREGORIAN" city="" zipCode="" region="" place="" '
+                         f'birthdate="{y}-0{rnd.randint(1, 9)}-1{rnd.randint(0, 9)}" dayOfMonth="1" monthOfYear="1" year="{y}" '
+                         f'countryIso2Code="RU" countryDescription="RUSSIAN FEDERATION" logicalId="{rnd.randint(1, 99999)}"/>')
+    for _ in range(rnd.randint(0, 2)):
+        iso, desc = rnd.choice(COUNTRIES)
+        parts.append(f'<address city="Moscow" street="Street {rnd.randint(1, 99)}" poBox="" zipCode="" region="" place="" '
+                     f'asAtListingTime="false" countryIso2Code="{iso}" countryDescription="{desc}" logicalId="{rnd.randint(1, 99999)}"/>')
+    parts.append('</sanctionEntity>\n')
+    return ''.join(parts)
+
+
+def _uk_designation(rnd, i):
+    kind = rnd.choice(['Individual', 'Individual', 'Entity', 'Ship'])
+    parts = ['<Designation>', '<LastUpdated>2024-01-01T00:00:00</LastUpdated>',
+             f'<UniqueID>{rnd.choice(PROGRAMS)}{i:05d}</UniqueID>', '<OFSIGroupID>1</OFSIGroupID>',
+             f'<UNReferenceNumber>{"QDi." + str(i) if rnd.random() < 0.2 else ""}</UNReferenceNumber>', '<Names>']
+    for n in range(rnd.randint(1, 6)):
+        if kind == 'Individual':
+            first, last = _person(rnd)
+            parts.append(f'<Name><Name1>{first}</Name1><Name6>{last}</Name6>'
+                         f'<NameType>{"Primary Name" if n == 0 else "Alias"}</NameType></Name>')
+        else:
+            parts.append(f'<Name><Name6>{rnd.choice(LAST)} {rnd.choice(COMPANY)} {rnd.randint(1, 999)}</Name6>'
+                         f'<NameType>{"Primary Name" if n == 0 else "Alias"}</NameType></Name>')
+    parts.append('</Names>')
+    parts.append(f'<RegimeName>{rnd.choice(PROGRAMS)}</RegimeName>')
+    parts.append(f'<IndividualEntityShip>{kind}</IndividualEntityShip>')
+    parts.append('<DesignationSource>UK</DesignationSource><SanctionsImposed>Asset freeze|Travel Ban</SanctionsImposed>')
+    parts.append(f'<OtherInformation>{_esc("Other information. " * rnd.randint(1, 10))}</OtherInformation>')
+    parts.append(f'<UKStatementofReasons>{_esc("Statement of reasons for designation. " * rnd.randint(1, 15))}</UKStatementofReasons>')
+    if rnd.random() < 0.7:
+        parts.append('<Addresses>')
+        for _ in range(rnd.randint(1, 2)):
+            parts.append(f'<Address><AddressLine1>Street {rnd.randint(1, 99)}</AddressLine1>'
+                         f'<AddressCountry>{rnd.choice(COUNTRIES)[1].title()}</AddressCountry></Address>')
+        parts.append('</Addresses>')
+    if kind == 'Individual':
+        parts.append('<IndividualDetails><Individual><DOBs>')
+        for _ in range(rnd.randint(0, 2)):
+            parts.append(f'<DOB>{rnd.randint(10, 28)}/0{rnd.randint(1, 9)}/{rnd.randint(1940, 1990)}</DOB>')
+        parts.append('</DOBs><Nationalities><Nationality>Russia</Nationality></Nationalities>')
+        parts.append(f'<Genders><Gender>{rnd.choice(["Male", "Female"])}</Gender></Genders></Individual></IndividualDetails>')
+    parts.append('</Designation>\n')
+    return ''.join(parts)
+
+
+def _us_entry(rnd, i):
+    kind = rnd.choice(['Individual', 'Individual', 'Entity', 'Vessel'])
+    parts = [f'<sdnEntry><uid>{i}</uid>']
+    if kind == 'Individual':
+        first, last = _person(rnd)
+        parts.append(f'<firstName>{first}</firstName><lastName>{last}</lastName>')
+    else:
+        parts.append(f'<lastName>{rnd.choice(LAST).upper()} {rnd.choice(COMPANY).upper()} {i}</lastName>')
+    if rnd.random() < 0.1:
+        parts.append('<title>Director</title>')
+    parts.append(f'<sdnType>{kind}</sdnType><programList>')
+    for _ in range(rnd.randint(1, 2)):
+        parts.append(f'<program>{rnd.choice(PROGRAMS)}-EO14024</program>')
+    parts.append('</programList>')
+    if rnd.random() < 0.6:
+        parts.append('<idList>')
+        for k in range(rnd.randint(1, 3)):
+            id_type = rnd.choice(['Passport', 'Gender', 'Registration ID', 'Tax ID No.'])
+            number = rnd.choice(['Male', 'Female']) if id_type == 'Gender' else str(rnd.randint(10 ** 6, 10 ** 9))
+            parts.append(f'<id><uid>{i * 10 + k}</uid><idType>{id_type}</idType><idNumber>{number}</idNumber></id>')
+        parts.append('</idList>')
+    if rnd.random() < 0.7:
+        parts.append('<akaList>')
+        for k in range(rnd.randint(1, 5)):
+            parts.append(f'<aka><uid>{i * 10 + k}</uid><type>a.k.a.</type><category>strong</category>'
+                         f'<lastName>{rnd.choice(LAST)}</lastName><firstName>{rnd.choice(FIRST)}</firstName></aka>')
+        parts.append('</akaList>')
+    if rnd.random() < 0.7:
+        parts.append('<addressList>')
+        for k in range(rnd.randint(1, 2)):
+            parts.append(f'<address><uid>{i * 10 + k}</uid><city>City</city><country>{rnd.choice(COUNTRIES)[1].title()}</country></address>')
+        parts.append('</addressList>')
+    if kind == 'Individual' and rnd.random() < 0.8:
+        parts.append('<dateOfBirthList>')
+        for k in range(rnd.randint(1, 2)):
+            parts.append(f'<dateOfBirthItem><uid>{i * 10 + k}</uid><dateOfBirth>{rnd.randint(10, 28)} Jan {rnd.randint(1940, 1990)}</dateOfBirth>'
+                         f'<mainEntry>{"true" if k == 0 else "false"}</mainEntry></dateOfBirthItem>')
+        parts.append('</dateOfBirthList>')
+    if rnd.random() < 0.3:
+        parts.append(f'<remarks>{_esc("Linked To: SOME COMPANY. " * rnd.randint(1, 4))}</remarks>')
+    parts.append('</sdnEntry>\n')
+    return ''.join(parts)
+
+
+SYNTHETIC = {
+    'EU': ('<?xml version="1.0" encoding="UTF-8"?>\n<export xmlns="http://eu.europa.ec/fpi/fsd/export" '
+           'generationDate="2024-01-01T00:00:00.000+01:00" globalFileId="1">\n', '</export>\n', _eu_entity),
+    'UK': ('<?xml version="1.0" encoding="utf-8"?>\n<Designations xmlns:xsd="http://www.w3.org/2001/XMLSchema">\n'
+           '<DateGenerated>2024-01-01T00:00:00</DateGenerated>\n', '</Designations>\n', _uk_designation),
+    'US': ('<?xml version="1.0" standalone="yes"?>\n<sdnList xmlns="https://sanctionslistservice.ofac.treas.gov/api/PublicationPreview/exports/XML">\n'
+           '<publshInformation><Publish_Date>01/01/2024</Publish_Date><Record_Count>0</Record_Count></publshInformation>\n',
+           '</sdnList>\n', _us_entry),
+}
+
+
+def generate_synthetic(source, path, size_mb, seed=42, records=None):
+    """
+    Writes a synthetic export of roughly `size_mb` megabytes and returns the
+    record count. With `records`, writes exactly that many records instead.
+    """
+    header, footer, make = SYNTHETIC[source]
+    rnd = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    written = 0
+    count = 0
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(header)
+        while (count < records) if records is not None else (written < target):
+            count += 1
+            chunk = make(rnd, count)
+            f.write(chunk)
+            written += len(chunk)
+        f.write(footer)
+    return count
+
+
+def _rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == 'darwin' else rss / 1024
+
+
+def _run_one(pipeline, source, path, backend, queue):
+    """Parses one file in this (fresh) process and reports timings and memory."""
+    if pipeline == 'src':
+        from src.etl.parsers import EUParser, UKParser, USParser
+        parser = {'EU': EUParser, 'UK': UKParser, 'US': USParser}[source](backend=backend)
+        baseline = _rss_mb()
+        started = time.perf_counter()
+        records = sum(1 for _ in parser.parse(path))
+        elapsed = time.perf_counter() - started
+    else:
+        from functions.parse_eu import parse_eu_to_jsonl
+        from functions.parse_uk import parse_uk_to_jsonl
+        from functions.parse_us_simple import parse_us_simple_to_jsonl
+        out_path = os.path.join(tempfile.mkdtemp(), f'{source}.jsonl')
+        baseline = _rss_mb()
+        started = time.perf_counter()
+        if source == 'EU':
+            parse_eu_to_jsonl(path, out_path, backend=backend)
+        elif source == 'UK':
+            parse_uk_to_jsonl(path, out_path, backend=backend)
+        else:
+            parse_us_simple_to_jsonl(path, out_path, 'US_SDN_SIMPLE', backend=backend)
+        elapsed = time.perf_counter() - started
+        with open(out_path, encoding='utf-8') as f:
+            records = sum(1 for _ in f)
+        os.remove(out_path)
+    peak = _rss_mb()
+    queue.put({
+        'records': records,
+        'seconds': elapsed,
+        'peak_rss_mb': peak,
+        'peak_rss_delta_mb': (peak - baseline) if peak is not None and baseline is not None else None,
+    })
+
+
+def run_benchmark(files, pipeline, backends, repeat):
+    ctx = mp.get_context('spawn')
+    results = []
+    for source, path in files.items():
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        for backend in backends:
+            best = None
+            for _ in range(repeat):
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_run_one, args=(pipeline, source, path, backend, queue))
+                proc.start()
+                run = queue.get()
+                proc.join()
+                if best is None or run['seconds'] < best['seconds']:
+                    best = run
+            best.update({
+                'source': source,
+                'backend': backend,
+                'pipeline': pipeline,
+                'file_mb': round(size_mb, 2),
+                'records_per_s': round(best['records'] / best['seconds'], 1) if best['seconds'] else None,
+                'mb_per_s': round(size_mb / best['seconds'], 2) if best['seconds'] else None,
+            })
+            results.append(best)
+            print(f"{pipeline:<9} {source:<3} {backend:<6} {best['records']:>7} recs  {best['seconds']:7.2f}s  "
+                  f"{best['records_per_s']:>9} rec/s  {best['mb_per_s']:>6} MB/s  "
+                  f"peak RSS {best['peak_rss_mb'] or 0:7.1f} MB (+{best['peak_rss_delta_mb'] or 0:.1f})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark sanctions XML parser backends')
+    parser.add_argument('--eu', help='EU XML file (default: data/sanctions/EU.xml or synthetic)')
+    parser.add_argument('--uk', help='UK XML file (default: data/sanctions/UK.xml or synthetic)')
+    parser.add_argument('--us', help='OFAC SDN XML file (default: data/sanctions/US_SDN_SIMPLE.xml or synthetic)')
+    parser.add_argument('--scale', type=float, default=1.0, help='Synthetic file size relative to the real exports')
+    parser.add_argument('--pipeline', choices=['src', 'functions', 'both'], default='both')
+    parser.add_argument('--backends', default='lxml,etree', help='Comma-separated backends to compare')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per combination; the fastest is reported')
+    parser.add_argument('--json', help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    tmp_dir = tempfile.mkdtemp(prefix='parser_bench_')
+    files = {}
+    for source, given in (('EU', args.eu), ('UK', args.uk), ('US', args.us)):
+        path = given or (DEFAULT_FILES[source] if os.path.exists(DEFAULT_FILES[source]) else None)
+        if not path:
+            path = os.path.join(tmp_dir, f'{source}_synthetic.xml')
+            count = generate_synthetic(source, path, REAL_SIZES_MB[source] * args.scale)
+            print(f'Generated synthetic {source}: {count} records, {os.path.getsize(path) / (1024 * 1024):.1f} MB')
+        files[source] = path
+
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    pipelines = ['src', 'functions'] if args.pipeline == 'both' else [args.pipeline]
+    results = []
+    for pipeline in pipelines:
+        results.extend(run_benchmark(files, pipeline, backends, args.repeat))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print('Wrote', args.json)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Benchmark batch screening against the Firestore emulator: the previous
+per-name scan (up to 5,000 sanctions_entities documents read and scored for
+every uploaded name) versus the in-memory index the function now uses
+(functions/search_index.py; the corpus is read once per instance), scoring
+each name against every record of the entity type and against the records
+the rapidfuzz prefilter keeps (batch_screening_api._candidates).
+
+Reports document reads and latency for each. Refuses to run unless
+FIRESTORE_EMULATOR_HOST is set, because it seeds the collection; with
+--in-memory it builds the index from the synthetic records instead and
+times only the index paths.
+
+Usage:
+    firebase emulators:start --only firestore
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python tools/benchmark_screening.py --records 20000 --names 1000
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python tools/benchmark_screening.py --skip-seed --json out.json
+    python tools/benchmark_screening.py --in-memory --records 30000 --names 1000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FUNCTIONS_DIR = os.path.join(ROOT, 'functions')
+if FUNCTIONS_DIR not in sys.path:
+    sys.path.insert(0, FUNCTIONS_DIR)
+
+from benchmark_parsers import COMPANY, COUNTRIES, FIRST, PROGRAMS  # noqa: E402
+
+COLLECTION = 'sanctions_entities'
+LEGACY_SCAN_LIMIT = 5000
+
+
+# Surnames are built from syllables so that, as in the real lists, almost
+# every record has a name of its own
+SYLLABLES = ['ka', 'ro', 'vi', 'ne', 'sha', 'dor', 'mi', 'lev', 'tan', 'bek', 'za', 'ur',
+             'hal', 'ov', 'rin', 'sa', 'mu', 'ko', 'til', 'bar', 'den', 'yu', 'fa', 'gor']
+
+
+def _surname(rnd):
+    return ''.join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))).capitalize()
+
+
+def _name(rnd, entity_type):
+    if entity_type == 'individual':
+        return f"{rnd.choice(FIRST)} {_surname(rnd)}"
+    return f"{_surname(rnd)} {rnd.choice(COMPANY)}"
+
+
+def _typo(rnd, name):
+    name = list(name)
+    name[rnd.randrange(len(name))] = rnd.choice('aeiouy')
+    return ''.join(name)
+
+
+def synthetic_entities(count, seed=42):
+    rnd = random.Random(seed)
+    for i in range(count):
+        entity_type = 'individual' if rnd.random() < 0.5 else 'company'
+        name = _name(rnd, entity_type)
+        # The lists carry a few aliases per record: transliterations, former names
+        aliases = [_typo(rnd, name) if rnd.random() < 0.5 else _name(rnd, entity_type)
+                   for _ in range(rnd.choice([0, 0, 1, 2, 3, 5]))]
+        yield {
+            'id': f"BENCH-{i:06d}",
+            'sanction_source': rnd.choice(['EU', 'UK', 'US_SDN_SIMPLE']),
+            'main_name': name,
+            'aliases': aliases,
+            'entity_type': entity_type,
+            'country': rnd.choice(COUNTRIES)[1],
+            'details': {'programs': [rnd.choice(PROGRAMS)]},
+        }
+
+
+def seed(db, count, seed_value):
+    batch, pending = db.batch(), 0
+    for record in synthetic_entities(count, seed_value):
+        batch.set(db.collection(COLLECTION).document(record['id']), record)
+        pending += 1
+        if pending == 500:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+
+
+def screening_names(count, seed_value, records=None, entity_type='individual'):
+    """
+    Names as uploaded: half are names of the first `records` synthetic
+    records of entity_type, some with a typo, the rest unrelated
+    """
+    rnd = random.Random(seed_value + 1)
+    listed = [r['main_name'] for r in synthetic_entities(records or count, seed_value)
+              if r['entity_type'] == entity_type]
+    names = []
+    for _ in range(count):
+        if rnd.random() < 0.5:
+            name = rnd.choice(listed)
+            names.append(_typo(rnd, name) if rnd.random() < 0.5 else name)
+        else:
+            names.append(_name(rnd, entity_type))
+    return names
+
+
+def legacy_screen(db, names, entity_type, threshold):
+    """The per-name scan batch_screening_api used before the index"""
+    from matching import match_name
+    reads = 0
+    results = []
+    for name in names:
+        docs = (db.collection(COLLECTION).where('entity_type', '==', entity_type)
+                .limit(LEGACY_SCAN_LIMIT).stream())
+        matches = []
+        for doc in docs:
+            reads += 1
+            data = doc.to_dict()
+            score = match_name(name.lower().strip(), data, entity_type=entity_type, use_phonetic=True)
+            if score >= threshold:
+                matches.append((round(score, 2), data.get('id')))
+        matches.sort(key=lambda x: x[0], reverse=True)
+        results.append(matches[:5])
+    return results, reads
+
+
+def load_index(db):
+    """The index a cold instance holds, built from the seeded documents (no snapshot is published)"""
+    import search_index
+    return search_index.SearchIndex.from_documents(search_index._entity_docs(db))
+
+
+def index_screen(index, names, entity_type, threshold, prefilter=True):
+    """batch_screening_api's path once the index is loaded"""
+    from batch_screening_api import _candidates, _screen_name
+    from matching import get_matcher
+
+    matcher = get_matcher()
+    queries = [matcher.query_features(name.lower().strip(), entity_type) for name in names]
+    positions = index.candidates(entity_type=entity_type)
+    if prefilter:
+        candidates = _candidates(queries, threshold, index, positions)
+    else:
+        candidates = [positions] * len(queries)
+    return [[(m['confidence'], m['id']) for m in _screen_name(query, threshold, index, candidates[i])]
+            for i, query in enumerate(queries)]
+
+
+def _timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, round(time.perf_counter() - started, 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--names', type=int, default=200)
+    parser.add_argument('--entity-type', default='individual', choices=['individual', 'company'])
+    parser.add_argument('--threshold', type=int, default=80)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-seed', action='store_true', help='Use the documents already in the emulator')
+    parser.add_argument('--skip-legacy', action='store_true', help='Only time the index path')
+    parser.add_argument('--in-memory', action='store_true',
+                        help='Build the index from the synthetic records, without the emulator')
+    parser.add_argument('--json', help='Write the report here')
+    args = parser.parse_args()
+
+    names = screening_names(args.names, args.seed, args.records, args.entity_type)
+    report = {'records': args.records, 'names': len(names), 'entity_type': args.entity_type,
+              'threshold': args.threshold}
+
+    if args.in_memory:
+        import search_index
+        rows = [search_index._row(record) for record in synthetic_entities(args.records, args.seed)]
+        index, load_seconds = _timed(search_index.SearchIndex, rows)
+        db = None
+    else:
+        if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+            sys.exit('FIRESTORE_EMULATOR_HOST is not set; this benchmark only runs against the emulator')
+
+        from google.cloud import firestore
+        db = firestore.Client(project=os.environ.get('GCLOUD_PROJECT', 'demo-sanctions'))
+
+        if not args.skip_seed:
+            started = time.perf_counter()
+            seed(db, args.records, args.seed)
+            print(f"Seeded {args.records} documents in {time.perf_counter() - started:.1f}s")
+        index, load_seconds = _timed(load_index, db)
+
+    full_results, full_seconds = _timed(index_screen, index, names, args.entity_type, args.threshold,
+                                        prefilter=False)
+    index_results, index_seconds = _timed(index_screen, index, names, args.entity_type, args.threshold)
+    report['index'] = {'load_seconds': load_seconds, 'document_reads': len(index) + 1 if db else 0,
+                       'every_record_seconds': full_seconds, 'prefiltered_seconds': index_seconds}
+    report['prefilter_same_matches'] = full_results == index_results
+
+    if db is not None and not args.skip_legacy:
+        started = time.perf_counter()
+        legacy_results, reads = legacy_screen(db, names, args.entity_type, args.threshold)
+        report['legacy'] = {'seconds': round(time.perf_counter() - started, 3), 'document_reads': reads}
+        # Only comparable while the legacy scan saw the whole entity type
+        report['same_matches'] = legacy_results == index_results
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Remove the search_tokens arrays from sanctions_entities documents.
+
+The import no longer writes them (quick search uses token_postings) and
+documents only lose them when their record changes. This drops them from
+every document at once. Publish the search index (python
+functions/search_index.py) first so the postings exist.
+
+Usage:
+    python tools/drop_search_tokens.py            # dry run: count documents
+    python tools/drop_search_tokens.py --apply
+"""
+import argparse
+
+from google.cloud import firestore
+
+COLLECTION = 'sanctions_entities'
+BATCH_SIZE = 500
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apply', action='store_true', help='Delete the field (default: only count)')
+    args = parser.parse_args()
+
+    db = firestore.Client()
+    batch, pending, found = db.batch(), 0, 0
+    for snap in db.collection(COLLECTION).select(['search_tokens']).stream():
+        if 'search_tokens' not in (snap.to_dict() or {}):
+            continue
+        found += 1
+        if args.apply:
+            batch.update(snap.reference, {'search_tokens': firestore.DELETE_FIELD})
+            pending += 1
+            if pending == BATCH_SIZE:
+                batch.commit()
+                batch, pending = db.batch(), 0
+                print(f"  {found} documents updated...")
+    if args.apply and pending:
+        batch.commit()
+    print(f"{found} documents {'updated' if args.apply else 'carry search_tokens'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,379 @@
+"""
+Load test for the Cloud Functions against the Firestore emulator: cost
+(document reads and writes per operation), latency percentiles and peak
+memory, written as a JSON report so optimizations can be compared run to
+run.
+
+The emulator stands in for the project. It is seeded by the import itself,
+from parsed JSONL fixtures (<SOURCE>.jsonl as written by tools/parse_all.py,
+data/parsed by default, or --synthetic N records per list). Then:
+
+    import_initial     stage_1_validation + stage_2_commit into the empty emulator
+    import_unchanged   the same fixtures again (manifest diff, no entity writes)
+    publish_index      search_index.publish_snapshot (token postings, snapshot
+                       upload; the upload needs the Storage emulator,
+                       STORAGE_EMULATOR_HOST)
+    search_sync        search_sanctions mode=sync (warm in-memory index)
+    search_stream      search_sanctions mode=stream (quick + deep phases; the
+                       former search_status polling)
+    search_quick_cold  search_sanctions mode=quick with no index loaded
+                       (token postings path)
+    batch_screening    batch_screening with a CSV upload
+
+The HTTP functions are driven through functions_framework test clients;
+the import has no local HTTP entry point (download_sanctions_lists fetches
+the live lists), so its two stages are called directly.
+
+Reads and writes are counted by wrapping the google-cloud-firestore client
+(document gets, get_all, query streams, batch commits), as Firestore bills
+them: a query that returns nothing costs one read. Peak memory is the
+tracemalloc peak of each operation (--trace-memory; slows every operation
+down) and the process peak RSS after it.
+
+Refuses to run unless FIRESTORE_EMULATOR_HOST is set.
+
+Usage:
+    firebase emulators:start --only firestore,storage
+    FIRESTORE_EMULATOR_HOST=localhost:8080 STORAGE_EMULATOR_HOST=http://localhost:9199 \\
+        python tools/load_test_functions.py --synthetic 5000 --reset --json load_test.json
+    FIRESTORE_EMULATOR_HOST=localhost:8080 python tools/load_test_functions.py --fixtures data/parsed --requests 200
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+FUNCTIONS_DIR = os.path.join(ROOT, 'functions')
+for path in (FUNCTIONS_DIR, os.path.dirname(os.path.abspath(__file__))):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+SOURCES = ['EU', 'UK', 'US_SDN_SIMPLE', 'US_NON_SDN_SIMPLE']
+PERCENTILES = (50, 90, 95, 99)
+
+
+class FirestoreMeter:
+    """Counts billed document reads and writes of every google-cloud-firestore client in the process."""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self._lock = threading.Lock()
+        self._installed = False
+
+    def add(self, reads=0, writes=0):
+        with self._lock:
+            self.reads += reads
+            self.writes += writes
+
+    def snapshot(self):
+        with self._lock:
+            return self.reads, self.writes
+
+    def _counted(self, iterable):
+        n = 0
+        for item in iterable:
+            n += 1
+            yield item
+        self.add(reads=max(n, 1))
+
+    def install(self):
+        if self._installed:
+            return
+        from google.cloud.firestore_v1 import batch, client, document, query
+        meter = self
+
+        # Some client versions implement DocumentReference.get with get_all
+        inside_get = threading.local()
+
+        get = document.DocumentReference.get
+        def document_get(self, *args, **kwargs):
+            meter.add(reads=1)
+            inside_get.active = True
+            try:
+                return get(self, *args, **kwargs)
+            finally:
+                inside_get.active = False
+        document.DocumentReference.get = document_get
+
+        get_all = client.Client.get_all
+        def client_get_all(self, references, *args, **kwargs):
+            references = list(references)
+            if not getattr(inside_get, 'active', False):
+                meter.add(reads=len(references))
+            return get_all(self, references, *args, **kwargs)
+        client.Client.get_all = client_get_all
+
+        stream = query.Query.stream
+        def query_stream(self, *args, **kwargs):
+            return meter._counted(stream(self, *args, **kwargs))
+        query.Query.stream = query_stream
+        if hasattr(query.Query, 'get'):
+            def query_get(self, *args, **kwargs):
+                return list(query_stream(self, *args, **kwargs))
+            query.Query.get = query_get
+
+        commit = batch.WriteBatch.commit
+        def batch_commit(self, *args, **kwargs):
+            meter.add(writes=len(getattr(self, '_write_pbs', [])))
+            return commit(self, *args, **kwargs)
+        batch.WriteBatch.commit = batch_commit
+        self._installed = True
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / 1024 / (1024 if sys.platform == 'darwin' else 1), 1)
+
+
+def summarize(latencies_ms):
+    if not latencies_ms:
+        return {}
+    ordered = sorted(latencies_ms)
+    result = {f'p{p}': round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 2) for p in PERCENTILES}
+    result['mean'] = round(statistics.fmean(ordered), 2)
+    result['max'] = round(ordered[-1], 2)
+    return result
+
+
+class Recorder:
+    def __init__(self, meter, trace_memory=False):
+        self.meter = meter
+        self.trace_memory = trace_memory
+        self.operations = {}
+
+    @contextmanager
+    def operation(self, name):
+        """Collects the calls of one operation; yields a function that runs and times one call."""
+        latencies, errors = [], []
+        reads_before, writes_before = self.meter.snapshot()
+        if self.trace_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+
+        def call(fn, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                return None
+            finally:
+                latencies.append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        try:
+            yield call
+        finally:
+            seconds = time.perf_counter() - started
+            peak = None
+            if self.trace_memory:
+                peak = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 1)
+                tracemalloc.stop()
+            reads, writes = self.meter.snapshot()
+            calls = max(len(latencies), 1)
+            self.operations[name] = {
+                'calls': len(latencies),
+                'errors': len(errors),
+                'first_errors': errors[:3],
+                'seconds': round(seconds, 3),
+                'latency_ms': summarize(latencies),
+                'reads': reads - reads_before,
+                'writes': writes - writes_before,
+                'reads_per_call': round((reads - reads_before) / calls, 1),
+                'writes_per_call': round((writes - writes_before) / calls, 1),
+                'traced_peak_mb': peak,
+                'process_peak_rss_mb': _peak_rss_mb(),
+            }
+            print(f"[{datetime.now()}] [OK] {name}: {len(latencies)} calls, "
+                  f"p50 {self.operations[name]['latency_ms'].get('p50')} ms, "
+                  f"{self.operations[name]['reads_per_call']} reads/call, "
+                  f"{self.operations[name]['writes_per_call']} writes/call, {len(errors)} errors")
+
+
+def synthetic_fixtures(directory, records, seed):
+    """Parsed JSONL fixtures for EU, UK and US_SDN_SIMPLE from the synthetic generator"""
+    import parse_eu
+    import parse_uk
+    import parse_us_simple
+    from benchmark_parsers import generate_synthetic
+
+    parsers = {
+        'EU': ('EU', lambda path: parse_eu.iter_eu_records(path)),
+        'UK': ('UK', lambda path: parse_uk.iter_uk_records(path)),
+        'US_SDN_SIMPLE': ('US', lambda path: parse_us_simple.iter_us_simple_records(path, 'US_SDN_SIMPLE')),
+    }
+    files = {}
+    for source, (kind, parse) in parsers.items():
+        xml_path = os.path.join(directory, f'{source}.xml')
+        generate_synthetic(kind, xml_path, 0, seed=seed, records=records)
+        files[source] = os.path.join(directory, f'{source}.jsonl')
+        with open(files[source], 'w', encoding='utf-8') as f:
+            for record in parse(xml_path):
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return files
+
+
+def fixture_files(directory):
+    return {source: os.path.join(directory, f'{source}.jsonl') for source in SOURCES
+            if os.path.exists(os.path.join(directory, f'{source}.jsonl'))}
+
+
+def _line_count(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return sum(1 for _ in f)
+
+
+def fixture_names(files, count, seed):
+    """Query names: fixture names, half of them with one typo, and a few unrelated names"""
+    names = []
+    for path in files.values():
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record.get('main_name'):
+                    names.append(record['main_name'])
+    rnd = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        if not names or rnd.random() < 0.1:
+            queries.append(rnd.choice(['John Smith', 'Acme Trading Ltd', 'Maria Lopez']))
+            continue
+        name = list(rnd.choice(names))
+        if len(name) > 3 and rnd.random() < 0.5:
+            name[rnd.randrange(len(name))] = rnd.choice('aeiou')
+        queries.append(''.join(name))
+    return queries
+
+
+def reset_emulator(project):
+    import requests
+    host = os.environ['FIRESTORE_EMULATOR_HOST']
+    url = f"http://{host}/emulator/v1/projects/{project}/databases/(default)/documents"
+    requests.delete(url, timeout=30).raise_for_status()
+    print(f"[{datetime.now()}] [OK] Emulator data cleared")
+
+
+def test_client(source_file, target):
+    import functions_framework
+    return functions_framework.create_app(target=target, source=os.path.join(FUNCTIONS_DIR, source_file)).test_client()
+
+
+def checked(response):
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.get_data(as_text=True)[:200]}")
+    return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fixtures', default=os.path.join(ROOT, 'data', 'parsed'),
+                        help='Directory with <SOURCE>.jsonl parsed lists')
+    parser.add_argument('--synthetic', type=int, help='Generate fixtures with this many records per list instead')
+    parser.add_argument('--requests', type=int, default=100, help='Search requests per search operation')
+    parser.add_argument('--batch-requests', type=int, default=3, help='batch_screening uploads')
+    parser.add_argument('--batch-names', type=int, default=500, help='Names per batch_screening upload')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='Clear the emulator before seeding')
+    parser.add_argument('--skip-import', action='store_true', help='Use the documents already in the emulator')
+    parser.add_argument('--trace-memory', action='store_true', help='Record the tracemalloc peak per operation')
+    parser.add_argument('--json', help='Write the report here')
+    args = parser.parse_args()
+
+    if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+        sys.exit('FIRESTORE_EMULATOR_HOST is not set; this harness only runs against the emulator')
+    project = os.environ.setdefault('GCLOUD_PROJECT', 'sanction-defender-firebase')
+    # Keep import_sanctions_two_stage on the emulator (it drops the emulator variables otherwise)
+    os.environ['SANCTIONS_USE_EMULATOR'] = '1'
+
+    if args.synthetic:
+        files = synthetic_fixtures(tempfile.mkdtemp(prefix='load_test_'), args.synthetic, args.seed)
+    else:
+        files = fixture_files(args.fixtures)
+    if not files and not args.skip_import:
+        sys.exit(f'No <SOURCE>.jsonl fixtures in {args.fixtures}; run tools/parse_all.py or pass --synthetic N')
+
+    meter = FirestoreMeter()
+    meter.install()
+    recorder = Recorder(meter, args.trace_memory)
+
+    from google.cloud import firestore
+    db = firestore.Client(project=project)
+    if args.reset:
+        reset_emulator(project)
+
+    if not args.skip_import:
+        from import_sanctions_two_stage import stage_1_validation, stage_2_commit
+
+        def run_import():
+            reports = stage_1_validation(db=db, sources=list(files), parsed_files=files)
+            if not reports:
+                raise RuntimeError('validation failed')
+            stage_2_commit(reports, db=db)
+
+        for name in ('import_initial', 'import_unchanged'):
+            with recorder.operation(name) as call:
+                call(run_import)
+
+        import search_index
+        with recorder.operation('publish_index') as call:
+            call(search_index.publish_snapshot, db, f"load_test_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}")
+
+    import search_index
+    queries = fixture_names(files, args.requests, args.seed)
+    search = test_client('search_api_main.py', 'search_sanctions')
+
+    for mode in ('sync', 'stream'):
+        with recorder.operation(f'search_{mode}') as call:
+            for query in queries:
+                call(lambda: checked(search.get('/', query_string={'q': query, 'mode': mode})).get_data())
+
+    with recorder.operation('search_quick_cold') as call:
+        for query in queries:
+            search_index._index = None
+            call(lambda: checked(search.get('/', query_string={'q': query, 'mode': 'quick'})).get_data())
+
+    screening = test_client('batch_screening_api.py', 'batch_screening')
+    names = fixture_names(files, args.batch_names, args.seed + 1)
+    upload = '\n'.join(name.replace(',', ' ') for name in names).encode('utf-8')
+    with recorder.operation('batch_screening') as call:
+        for _ in range(args.batch_requests):
+            call(lambda: checked(screening.post('/', data={
+                'file': (io.BytesIO(upload), 'names.csv'), 'entity_type': 'individual', 'threshold': '80',
+            }, content_type='multipart/form-data')).get_data())
+
+    report = {
+        'generated_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'emulator': os.environ['FIRESTORE_EMULATOR_HOST'],
+        'fixtures': {source: _line_count(path) for source, path in files.items()},
+        'requests': args.requests,
+        'batch_names': args.batch_names,
+        'operations': recorder.operations,
+    }
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
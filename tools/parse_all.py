@@ -1,5 +1,7 @@
 """
-Runner script: parse EU and simple US files and write JSONL outputs to data/parsed/
+Runner script: parse EU and simple US files and write JSONL outputs to data/parsed/,
+plus a record cache file per source (see src/etl/record_cache.py) for tools
+such as check_overlap.py.
 """
 import os
 import sys
@@ -8,9 +10,11 @@ ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
 
+from functions import parse_eu, parse_uk, parse_us_simple, xml_stream
 from functions.parse_eu import parse_eu_to_jsonl
 from functions.parse_us_simple import parse_us_simple_to_jsonl
 from functions.parse_uk import parse_uk_to_jsonl
+from src.etl.record_cache import load_or_parse, parser_version
 
 BASE = os.path.join(os.path.dirname(__file__), '..')
 SAN_DIR = os.path.join(BASE, 'data', 'sanctions')
@@ -32,8 +36,14 @@ for xml, out, src in files:
     print(f'Parsing {xml} -> {out}')
     if src == 'EU':
         parse_eu_to_jsonl(xml, out)
+        parse = lambda: parse_eu.iter_eu_records(xml)
     elif src == 'UK':
         parse_uk_to_jsonl(xml, out)
+        parse = lambda: parse_uk.iter_uk_records(xml)
     else:
         parse_us_simple_to_jsonl(xml, out, src)
+        parse = lambda: parse_us_simple.iter_us_simple_records(xml, src)
+    version = parser_version(parse_eu, parse_uk, parse_us_simple, xml_stream)
+    _, cache_file, _ = load_or_parse(PARSED_DIR, src, 'firestore', xml, parse, version)
+    print(f'  cache: {cache_file}')
 print('All done')